@@ -0,0 +1,196 @@
+# acquisition_engine.py
+"""
+Single-process acquisition engine - hosts every serial/UDP sensor in one selector loop
+
+Instead of one interpreter per sensor (runall.py -> sensor_runner.py x N), this
+creates every GenericSensor subclass through create_sensor and multiplexes them:
+the loop blocks on all device fds at once and only steps the sensors that have
+data (plus a periodic tick so reconnects, FIFOs and polled devices keep going).
+Parsing and writing are untouched - each sensor still runs its own step().
+
+Blocking reconnects (init_serial sleeps while the device settles) run on a small
+thread pool so one unplugged sensor never stalls the others.
+"""
+
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import selectors
+from concurrent.futures import ThreadPoolExecutor
+
+from sensor_implementations import create_sensor
+from sensor_runner import build_sensor_config
+
+class AcquisitionEngine:
+    def __init__(self, config_file='sensor_config.json', sensor_names=None, tick=0.1):
+        """
+        Args:
+            config_file: Path to sensor configuration file
+            sensor_names: Only host these sensors (default: every enabled sensor_runner.py sensor)
+            tick: Max time between steps for sensors without fd activity (seconds)
+        """
+        self.config = self.load_config(config_file)
+        self.tick = tick
+        self.running = True
+        self.setup_logging()
+
+        self.sensors = {}
+        for name in self.config.get('sensors', {}):
+            sensor_config = self.config['sensors'][name]
+            if sensor_names and name not in sensor_names:
+                continue
+            if not sensor_config.get('enabled', True):
+                continue
+            # Only sensors that would otherwise go through sensor_runner.py (not the spectrometer)
+            if sensor_config.get('script', 'sensor_runner.py') != 'sensor_runner.py':
+                continue
+            try:
+                sensor = create_sensor(sensor_config['type'], name, build_sensor_config(self.config, name))
+            except Exception as e:
+                self.logger.error(f"Failed to create sensor {name}: {e}")
+                continue
+            # Everything is driven by our selector
+            sensor.event_driven = True
+            self.sensors[name] = sensor
+
+        self.selector = selectors.DefaultSelector()
+        self._registered = {}     # name -> fd currently registered
+        self._next_tick = {}      # name -> monotonic time of next forced step
+        self._reconnects = {}     # name -> Future of a pending reconnect
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.sensors)), thread_name_prefix='reconnect')
+
+        # Sensors installed their own SIGINT handlers in __init__; one handler for all of them
+        signal.signal(signal.SIGINT, self.signal_handler)
+        signal.signal(signal.SIGTERM, self.signal_handler)
+
+    def setup_logging(self):
+        """Setup logging configuration"""
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - Engine - %(levelname)s - %(message)s',
+            handlers=[logging.StreamHandler()]
+        )
+        self.logger = logging.getLogger('AcquisitionEngine')
+
+    def load_config(self, config_file):
+        """Load sensor configuration"""
+        try:
+            with open(config_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading config: {e}")
+            return {'sensors': {}}
+
+    def signal_handler(self, sig, frame):
+        """Handle shutdown signals"""
+        self.logger.info("Stopping acquisition engine...")
+        self.running = False
+        for sensor in self.sensors.values():
+            sensor.running = False
+
+    def _sync_registrations(self):
+        """Keep the selector in step with each sensor's current fd (it changes on reconnect)"""
+        for name, sensor in self.sensors.items():
+            fd = None if name in self._reconnects else sensor.fileno()
+            old = self._registered.get(name)
+            if fd == old:
+                continue
+            if old is not None:
+                try:
+                    self.selector.unregister(old)
+                except (KeyError, ValueError, OSError):
+                    pass
+                del self._registered[name]
+            if fd is not None:
+                try:
+                    self.selector.register(fd, selectors.EVENT_READ, name)
+                    self._registered[name] = fd
+                except (KeyError, ValueError, OSError) as e:
+                    self.logger.warning(f"Could not watch {name} fd {fd}: {e}")
+
+    def _collect_reconnects(self):
+        """Pick up finished background reconnects"""
+        for name, future in list(self._reconnects.items()):
+            if future.done():
+                del self._reconnects[name]
+                exc = future.exception()
+                if exc:
+                    self.sensors[name].logger.error(f"Reconnect error: {exc}")
+
+    def _service(self, name, sensor, now):
+        """Step one sensor, handing a blocking reconnect off to the pool"""
+        self._next_tick[name] = now + self.tick
+        if name in self._reconnects:
+            return
+        if sensor.due_for_reconnect():
+            self._reconnects[name] = self._pool.submit(sensor.reconnect)
+            return
+        try:
+            sensor.step(reconnect=False)
+        except Exception as e:
+            sensor.logger.error(f"Engine step error: {e}")
+
+    def run(self):
+        """Run every hosted sensor until stopped"""
+        self.logger.info(f"Hosting {len(self.sensors)} sensors: {', '.join(self.sensors)}")
+
+        for name, sensor in list(self.sensors.items()):
+            sensor.logger.info(f"Starting {sensor.name} data collection (engine)")
+            if not sensor.open_output():
+                self.logger.error(f"Dropping {name}: could not open output")
+                del self.sensors[name]
+
+        try:
+            while self.running and self.sensors:
+                self._collect_reconnects()
+                self._sync_registrations()
+
+                now = time.monotonic()
+                timeout = self.tick
+                if self._next_tick:
+                    timeout = max(0.0, min(timeout, min(self._next_tick.values()) - now))
+
+                ready = set()
+                if self._registered:
+                    for key, _ in self.selector.select(timeout):
+                        ready.add(key.data)
+                else:
+                    time.sleep(timeout)
+
+                now = time.monotonic()
+                for name, sensor in self.sensors.items():
+                    if name in ready or now >= self._next_tick.get(name, 0):
+                        self._service(name, sensor, now)
+
+        except Exception as e:
+            self.logger.error(f"Unexpected error in engine loop: {e}")
+        finally:
+            self._pool.shutdown(wait=True)
+            for sensor in self.sensors.values():
+                try:
+                    sensor.close_output()
+                except Exception as e:
+                    self.logger.error(f"Error closing {sensor.name}: {e}")
+            self.selector.close()
+            self.logger.info("Acquisition engine stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description='Single-process acquisition engine for all serial/UDP sensors')
+    parser.add_argument('--config', default='sensor_config.json', help='Path to sensor configuration file')
+    parser.add_argument('--sensors', help='Comma-separated sensor names to host (default: all enabled)')
+    parser.add_argument('--tick', type=float, default=0.1, help='Max seconds between steps for idle sensors')
+
+    args = parser.parse_args()
+    names = [n.strip().lower() for n in args.sensors.split(',')] if args.sensors else None
+
+    engine = AcquisitionEngine(config_file=args.config, sensor_names=names, tick=args.tick)
+    if not engine.sensors:
+        print("No sensors to run")
+        sys.exit(1)
+    engine.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+# batch_reparse.py
+"""
+Rebuild sensor CSVs from raw captures in bulk
+
+raw_capture.py reparse replays a capture through parse_data one line at a time,
+which runs no faster than the live code. This tool produces the same rows, but
+parses each file as a whole:
+
+- every complete line (and the rx time of the chunk that completed it) is found
+  with one newline scan over the concatenated capture
+- LDD, Cavity, MiniaethMA200 and POPS lines are split with one join/split over
+  the whole file, then cut into rows by their separator counts
+- Pump lines are matched by one multiline pass of PumpSensor.LINE_RE over the text
+- Timestamp text is formatted once per distinct second
+
+Other sensor types fall back to their own parse_data. Files are spread over a
+process pool (one file per process).
+
+    python batch_reparse.py                      # every output/*/*_raw_*.bin
+    python batch_reparse.py output/ldd --jobs 4
+    python batch_reparse.py flight.bin --verify  # also compare with parse_data
+
+Offline the Pump target_speed column is the config's initial_power (FIFO power
+changes aren't in the capture).
+"""
+
+import gc
+import os
+import re
+import sys
+import json
+import glob
+import time
+import logging
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from raw_capture import read_header, read_records, replay_config, replay_sensor, iter_parsed, reparsed_path
+from field_schema import has_rx_time, output_columns, row_converter
+from sensor_writers import create_writer
+
+logger = logging.getLogger('batch_reparse')
+
+def load_capture(path, per_record=False, udp=False):
+    """
+    (lines, epoch_ns, mono_ns) for every non-empty line the live sensor would have parsed.
+    Stream captures are split on newlines across records (a trailing partial line is
+    dropped, as it was never completed); readline/UDP captures are one line per record.
+    """
+    epochs, monos, payloads = read_records(path)
+    epochs = np.array(epochs, dtype=np.int64)
+    monos = np.array(monos, dtype=np.int64)
+
+    if udp:
+        lines = [p.decode('utf-8', errors='ignore').strip('\x00\r\n ') for p in payloads]
+        rec = np.arange(len(lines))
+    elif per_record:
+        lines = [p.decode('utf-8', errors='ignore').strip() for p in payloads]
+        rec = np.arange(len(lines))
+    else:
+        data = b''.join(payloads)
+        ends = np.cumsum([len(p) for p in payloads], dtype=np.int64)
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 0x0A)
+        # Each line is handed to the parser when the chunk holding its '\n' arrives
+        rec = np.searchsorted(ends, newlines, side='right')
+        pieces = data.split(b'\n')[:-1]
+        if data.isascii():
+            lines = [l.strip() for l in b'\n'.join(pieces).decode('ascii').split('\n')] if pieces else []
+        else:
+            lines = [l.decode('utf-8', errors='ignore').strip() for l in pieces]
+
+    keep = np.array([bool(l) for l in lines], dtype=bool)
+    idx = np.flatnonzero(keep)
+    lines = [lines[i] for i in idx]
+    return lines, epochs[rec[idx]] if len(idx) else epochs[:0], monos[rec[idx]] if len(idx) else monos[:0]
+
+def split_fields(lines, sep=','):
+    """
+    Split every line on sep with one join/split over the whole batch.
+    Returns rows of stripped fields, like [p.strip() for p in line.split(sep)].
+    """
+    if not lines:
+        return []
+    text = sep.join(lines)
+    flat = text.split(sep)
+    # Lines arrive stripped, so fields only need it with spaces/control chars around a separator
+    if (not text.isprintable() or f" {sep}" in text or f"{sep} " in text
+            or text[0].isspace() or text[-1].isspace()):
+        flat = [f.strip() for f in flat]
+    counts = np.fromiter((l.count(sep) + 1 for l in lines), dtype=np.int64, count=len(lines))
+    ends = np.cumsum(counts).tolist()
+    return [flat[e - c:e] for c, e in zip(counts.tolist(), ends)]
+
+def fit_columns(rows, expected):
+    """Pad/truncate rows in place to expected fields (the live Cavity/POPS behaviour)"""
+    if not expected:
+        return rows
+    for row in rows:
+        if len(row) < expected:
+            row += [""] * (expected - len(row))
+        elif len(row) > expected:
+            del row[expected:]
+    return rows
+
+def _is_chatter(line):
+    up = line.upper()
+    return up.startswith(("OK", "ERR", "IDENT")) or "COMMANDS" in up
+
+def parse_ldd(lines, config):
+    idx = [i for i, l in enumerate(lines)
+           if "," in l and not _is_chatter(l) and not l.startswith("ErrorNumber,ErrorInstance,ErrorParameter")]
+    return idx, split_fields([lines[i] for i in idx])
+
+def parse_cavity(lines, config):
+    idx = [i for i, l in enumerate(lines)
+           if "," in l and not _is_chatter(l) and not l.lower().startswith("ms,")]
+    rows = split_fields([lines[i] for i in idx])
+    if bool(config.get("expect_ms_field", True)):
+        ok = [j for j, row in enumerate(rows) if row[0].isdigit()]
+        idx = [idx[j] for j in ok]
+        rows = [rows[j] for j in ok]
+    # Row includes the Timestamp column
+    expected = len(config.get("column_names", []))
+    return idx, fit_columns(rows, expected - 1) if expected else rows
+
+def parse_ma200(lines, config):
+    # Same filter as MiniaethMA200Sensor.accept_line
+    idx = [i for i, l in enumerate(lines) if l.startswith("MA200-") and "," in l]
+    return idx, split_fields([lines[i] for i in idx])
+
+def parse_pops(lines, config):
+    rows = [row[3:] if len(row) > 3 else [] for row in split_fields(lines)]
+    expected = len(config.get("column_names", []))
+    return list(range(len(rows))), fit_columns(rows, expected - 1) if expected else rows
+
+def _pump_pattern():
+    # Same pattern, run over the whole text: \s may not cross a line, ^/$ match per line
+    from sensor_implementations import PumpSensor
+    pattern = PumpSensor.LINE_RE.pattern.replace(r"\s", r"[^\S\n]")
+    return re.compile(pattern, PumpSensor.LINE_RE.flags | re.MULTILINE)
+
+def parse_pump(lines, config):
+    if not lines:
+        return [], []
+    text = "\n".join(lines)
+    starts = np.cumsum([0] + [len(l) + 1 for l in lines[:-1]])
+    matches = [m for m in _pump_pattern().finditer(text) if m.group("rpm_a") or m.group("rpm_b")]
+    if not matches:
+        return [], []
+
+    idx = np.searchsorted(starts, [m.start() for m in matches], side='right') - 1
+    rpm = np.array([m.group("rpm_a") or m.group("rpm_b") for m in matches]).astype(np.float64).tolist()
+    temp = np.array([m.group("temp") for m in matches]).astype(np.float64).tolist()
+    hum = np.array([m.group("hum") for m in matches]).astype(np.float64).tolist()
+    pres = [m.group("pres") for m in matches]
+    pres = ["" if p.upper() == "ERR" else float(p) for p in pres]
+    power = float(config.get("initial_power", 40.0))
+    rows = [[r, p, t, h, power] for r, p, t, h in zip(rpm, pres, temp, hum)]
+    return idx, rows
+
+BATCH_PARSERS = {
+    'LDD': parse_ldd,
+    'Cavity': parse_cavity,
+    'MiniaethMA200': parse_ma200,
+    'POPS': parse_pops,
+    'Pump': parse_pump,
+}
+
+def timestamp_texts(epoch_ns):
+    """rx_timestamp() text for each epoch_ns, formatted once per distinct second"""
+    if not len(epoch_ns):
+        return []
+    seconds, inverse = np.unique(epoch_ns // 1_000_000_000, return_inverse=True)
+    texts = [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(int(s))) for s in seconds]
+    return [texts[i] for i in inverse.tolist()]
+
+def batch_rows(capture_path, sensor_config, header):
+    """Rows for a capture via the bulk parser for its type"""
+    sensor_type = sensor_config.get('type')
+    per_record = sensor_type == 'MiniaethMA200' or not sensor_config.get('batch_read', True)
+    lines, epochs, monos = load_capture(capture_path, per_record=per_record,
+                                        udp=header.get('transport') == 'udp')
+    idx, rows = BATCH_PARSERS[sensor_type](lines, sensor_config)
+    idx = np.asarray(idx, dtype=np.int64)
+    stamps = timestamp_texts(epochs[idx])
+    # Same finishing as GenericSensor.finish_row: Timestamp first, schema types, rx times last
+    for row, ts in zip(rows, stamps):
+        row.insert(0, ts)
+    convert = row_converter(sensor_config)
+    if convert:
+        rows = list(map(convert, rows))
+    if has_rx_time(sensor_config):
+        rows = [(*row, e, m) for row, e, m in zip(rows, epochs[idx].tolist(), monos[idx].tolist())]
+    return rows
+
+def slow_rows(capture_path, sensor_config, header):
+    """Rows via the sensor class's own parse_data, one line at a time"""
+    sensor = replay_sensor(sensor_config['type'], header['sensor'], sensor_config)
+    return list(iter_parsed(sensor, capture_path))
+
+def _same(a, b):
+    """Compare rows as the CSV would see them (float 2660.0 == '2660.0')"""
+    return len(a) == len(b) and all(list(map(str, x)) == list(map(str, y)) for x, y in zip(a, b))
+
+def reparse_file(job):
+    """Worker: parse one capture and write its CSV. Returns a result dict."""
+    capture_path, config, out_dir, fmt, verify = job
+    t0 = time.perf_counter()
+    try:
+        header = read_header(capture_path)
+        sensor_config = replay_config(config, header.get('sensor'), fmt)
+        # One big buffered write instead of the live flush cadence
+        sensor_config['output'].update({'flush_rows': 1 << 30, 'flush_interval': 1e9, 'fsync_interval': 0})
+
+        if sensor_config.get('type') in BATCH_PARSERS:
+            # Only acyclic lists/strings get built here; collector passes over them are pure overhead
+            gc.disable()
+            try:
+                rows = batch_rows(capture_path, sensor_config, header)
+            finally:
+                gc.enable()
+            method = 'batch'
+        else:
+            rows = slow_rows(capture_path, sensor_config, header)
+            method = 'parse_data'
+        parse_s = time.perf_counter() - t0
+
+        out_path = reparsed_path(capture_path)
+        if out_dir:
+            out_path = os.path.join(out_dir, os.path.basename(out_path))
+        writer = create_writer(out_path, output_columns(sensor_config), sensor_config, logger)
+        try:
+            for row in rows:
+                writer.writerow(row)
+        finally:
+            writer.close()
+
+        result = {'capture': capture_path, 'output': out_path, 'sensor': header.get('sensor'),
+                  'rows': len(rows), 'method': method, 'parse_s': round(parse_s, 3),
+                  'total_s': round(time.perf_counter() - t0, 3)}
+        if verify and method == 'batch':
+            result['verified'] = _same(rows, slow_rows(capture_path, sensor_config, header))
+        return result
+    except Exception as e:
+        return {'capture': capture_path, 'error': f"{type(e).__name__}: {e}"}
+
+def find_captures(paths):
+    """Capture files from file/directory arguments (default: output/*/*_raw_*.bin)"""
+    if not paths:
+        paths = ['output']
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(glob.glob(os.path.join(path, '**', '*_raw_*.bin'), recursive=True))
+        else:
+            found.extend(glob.glob(path))
+    return sorted(set(found))
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild sensor CSVs from raw captures in bulk')
+    parser.add_argument('paths', nargs='*', help='Capture files or directories (default: output/)')
+    parser.add_argument('--config', default='sensor_config.json', help='Path to sensor configuration file')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--out-dir', help='Write outputs here instead of next to each capture')
+    parser.add_argument('--format', default='csv', help='Output format(s), e.g. csv or csv,hdf5')
+    parser.add_argument('--verify', action='store_true', help='Check batch rows against parse_data (slow)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s batch_reparse: %(message)s')
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    captures = find_captures(args.paths)
+    if not captures:
+        logger.error("No raw captures found")
+        sys.exit(1)
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    fmt = args.format.split(',') if ',' in args.format else args.format
+    jobs = [(path, config, args.out_dir, fmt, args.verify) for path in captures]
+    workers = max(1, min(args.jobs, len(jobs)))
+    logger.info(f"Re-parsing {len(jobs)} captures with {workers} processes")
+
+    t0 = time.perf_counter()
+    failed = False
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(reparse_file, jobs):
+            if 'error' in result:
+                failed = True
+                logger.error(f"{result['capture']}: {result['error']}")
+                continue
+            line = (f"{result['sensor']}: {result['rows']} rows ({result['method']}, "
+                    f"{result['total_s']}s) -> {result['output']}")
+            if 'verified' in result:
+                line += " [matches parse_data]" if result['verified'] else " [DIFFERS from parse_data]"
+                failed = failed or not result['verified']
+            logger.info(line)
+        pool.close()
+        pool.join()
+    logger.info(f"Done in {time.perf_counter() - t0:.2f}s")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
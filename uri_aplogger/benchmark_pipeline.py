@@ -0,0 +1,500 @@
+# benchmark_pipeline.py
+"""
+End-to-end throughput/latency benchmark for the acquisition pipeline
+
+Drives each sensor class (through create_sensor, exactly as sensor_runner.py does)
+against sensor_simulator.py devices - ptys for serial sensors, UDP for POPS - at
+increasing line rates, and reports per rate:
+    lines/s offered and rows/s landed, loss
+    latency from byte arrival (the row's rx_epoch_ns) to the row being readable
+      in the sensor's CSV - includes the writer's flush policy, on purpose
+    CPU of the sensor thread (percent and microseconds per row)
+    bytes written per sample, per output format
+The highest rate reached (>= 90% of offered) with loss <= --max-loss and p99
+latency <= --max-latency is the sensor's max sustained rate; the ramp stops at
+the first rate that fails.
+
+A second stage runs all the sensors together in the acquisition engine and
+measures RealTimeMerger and VitalsExporter: how old each sensor's newest sample
+is when they pick it up (files vs shared-memory board), and what an update costs.
+
+The simulator runs in its own process so it doesn't share the GIL with the sensor.
+Everything happens in a temp directory; the board gets its own name.
+
+    python benchmark_pipeline.py --output bench.json
+    python benchmark_pipeline.py --sensors trisonica,pops --rates 10,100,1000 --duration 5
+    python benchmark_pipeline.py --output new.json --baseline bench.json   (exit 1 on regression)
+"""
+
+import os
+import sys
+import json
+import time
+import select
+import logging
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+
+from sensor_simulator import SensorSimulator, EMITTERS
+from sensor_implementations import create_sensor
+from sensor_runner import build_sensor_config
+from field_schema import RX_TIME_COLUMNS, output_columns
+from file_tail import FileTailer
+from latest_board import LatestBoard, board_enabled
+
+DEFAULT_RATES = [1, 10, 50, 200, 1000]
+
+# Simulator writes per second before lines are grouped into bursts
+MAX_WRITES_PER_S = 200
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def summarize_ms(values_ns):
+    """p50/p99/max in milliseconds"""
+    ms = [v / 1e6 for v in values_ns]
+    return {
+        'p50_ms': round(percentile(ms, 50), 3) if ms else None,
+        'p99_ms': round(percentile(ms, 99), 3) if ms else None,
+        'max_ms': round(max(ms), 3) if ms else None,
+        'samples': len(ms),
+    }
+
+def _simulator_worker(conn, config, names, rates, bursts):
+    sim = SensorSimulator(config, sensor_names=names, rates=rates, bursts=bursts)
+    conn.send(sim.open())
+    sim.start()
+    while True:
+        msg = conn.recv()
+        if msg == 'stats':
+            conn.send(sim.stats())
+        elif msg == 'stop':
+            sim.close()
+            conn.send(sim.stats())
+            return
+
+class SimulatorProcess:
+    """SensorSimulator in a child process, controlled over a pipe"""
+
+    def __init__(self, config, names, rates=None, bursts=None):
+        # spawn, not fork: the benchmark process already has threads running
+        ctx = multiprocessing.get_context('spawn')
+        self._conn, child = ctx.Pipe()
+        self._proc = ctx.Process(
+            target=_simulator_worker, args=(child, config, names, rates or {}, bursts or {}), daemon=True)
+
+    def start(self):
+        self._proc.start()
+        return self._conn.recv()
+
+    def stats(self):
+        self._conn.send('stats')
+        return self._conn.recv()
+
+    def stop(self):
+        try:
+            self._conn.send('stop')
+            stats = self._conn.recv()
+        except (EOFError, OSError):
+            stats = {}
+        self._proc.join(timeout=5)
+        return stats
+
+def pin_ports(config, ports):
+    """Config copy with each simulated serial sensor pointed at its pty"""
+    config = json.loads(json.dumps(config))
+    for name, port in ports.items():
+        if not str(port).startswith('udp://'):
+            config['sensors'][name]['port'] = port
+    return config
+
+class RowWatcher:
+    """Follows a sensor's CSV and records when each row became readable"""
+
+    def __init__(self, name, columns):
+        self.tailer = FileTailer()
+        self.tailer.add(name, f'output/{name}/{name}_data_*.csv')
+        self.name = name
+        self.rx_idx = columns.index(RX_TIME_COLUMNS[0]) if RX_TIME_COLUMNS[0] in columns else None
+        self.rows = []  # (rx_ns, seen_ns)
+
+    def poll(self, timeout=0.05):
+        fd = self.tailer.inotify.fileno() if self.tailer.inotify else None
+        if fd is not None:
+            select.select([fd], [], [], timeout)
+        else:
+            time.sleep(min(timeout, 0.005))
+        new_rows = self.tailer.read_new_rows().get(self.name, [])
+        seen = time.time_ns()
+        for row in new_rows:
+            rx = 0
+            if self.rx_idx is not None and self.rx_idx < len(row):
+                try:
+                    rx = int(row[self.rx_idx])
+                except ValueError:
+                    pass
+            self.rows.append((rx, seen))
+
+    def watch(self, seconds):
+        end = time.time() + seconds
+        while time.time() < end:
+            self.poll(min(0.05, max(0.0, end - time.time())))
+
+    def wait_first_row(self, timeout):
+        end = time.time() + timeout
+        while not self.rows and time.time() < end:
+            self.poll()
+        return bool(self.rows)
+
+    def close(self):
+        self.tailer.close()
+
+def output_bytes(name):
+    """{extension: bytes} of the sensor's data files in the current directory"""
+    sizes = {}
+    directory = os.path.join('output', name)
+    if not os.path.isdir(directory):
+        return sizes
+    for entry in os.scandir(directory):
+        if entry.name.startswith(f'{name}_data_'):
+            ext = os.path.splitext(entry.name)[1].lstrip('.') or 'none'
+            sizes[ext] = sizes.get(ext, 0) + entry.stat().st_size
+    return sizes
+
+def thread_cpu(thread):
+    """CPU seconds used so far by another thread (Linux)"""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (AttributeError, OSError):
+        return None
+
+def bench_sensor_rate(config, name, rate, duration, warmup_timeout=20.0):
+    """One sensor at one offered rate; returns the result dict"""
+    config = json.loads(json.dumps(config))
+    sensor_config = config['sensors'][name]
+    sensor_type = sensor_config['type']
+
+    # MA200 is polled: the rate is how often we send 'dr'
+    polled = EMITTERS[sensor_type].rate == 0
+    if polled:
+        sensor_config['poll_interval'] = 1.0 / rate
+        sim_rates = {}
+    else:
+        sim_rates = {name: rate}
+    burst = max(1, int(rate // MAX_WRITES_PER_S))
+
+    sim = SimulatorProcess(config, [name], sim_rates, {name: burst})
+    config = pin_ports(config, sim.start())
+    result = {'rate': rate, 'burst': burst}
+
+    sensor = create_sensor(sensor_type, name, build_sensor_config(config, name))
+    sensor.event_driven = True
+    watcher = RowWatcher(name, output_columns(config['sensors'][name]))
+    thread = threading.Thread(target=sensor.run, name=f'sensor-{name}', daemon=True)
+    thread.start()
+
+    def sent():
+        stats = sim.stats().get(name, {})
+        return stats.get('commands' if polled else 'data_lines', 0)
+
+    try:
+        if not watcher.wait_first_row(warmup_timeout):
+            result['error'] = f'no rows within {warmup_timeout:.0f}s'
+            return result
+        watcher.watch(0.5)
+
+        # Measurement window: rows are matched to it by their rx time, so rows
+        # still sitting in the writer's buffer at either edge are counted correctly
+        sent_start, cpu_start, t_start = sent(), thread_cpu(thread), time.time_ns()
+        watcher.watch(duration)
+        sent_end, cpu_end, t_end = sent(), thread_cpu(thread), time.time_ns()
+
+        # Let buffered rows from the window reach the file
+        flush_interval = float(config['sensors'][name].get('output', {}).get('flush_interval', 1.0))
+        watcher.watch(flush_interval + 0.5)
+
+        window = [(rx, seen) for rx, seen in watcher.rows if t_start <= rx < t_end]
+        elapsed = (t_end - t_start) / 1e9
+        offered = sent_end - sent_start
+        landed = len(window)
+
+        result.update({
+            'lines_offered': offered,
+            'rows_landed': landed,
+            'lines_per_s': round(offered / elapsed, 2),
+            'rows_per_s': round(landed / elapsed, 2),
+            'loss': round(max(0.0, 1 - landed / offered), 5) if offered else None,
+            'latency': summarize_ms([seen - rx for rx, seen in window]),
+        })
+        if cpu_start is not None and cpu_end is not None:
+            cpu = cpu_end - cpu_start
+            result['cpu_pct'] = round(100 * cpu / elapsed, 2)
+            result['cpu_us_per_row'] = round(1e6 * cpu / landed, 2) if landed else None
+    finally:
+        sim.stop()
+        sensor.running = False
+        thread.join(timeout=10)
+        watcher.close()
+
+    written = getattr(sensor, 'data_count', 0)
+    if written:
+        result['bytes_per_row'] = {ext: round(size / written, 1) for ext, size in output_bytes(name).items()}
+    return result
+
+def sustained(result, max_loss, max_latency_ms, min_rate_fraction=0.9):
+    if 'error' in result or result.get('loss') is None:
+        return False
+    # A polled device (MA200) can't lose lines, it just answers slower than asked
+    if result['lines_per_s'] < result['rate'] * min_rate_fraction:
+        return False
+    p99 = result['latency']['p99_ms']
+    return result['loss'] <= max_loss and p99 is not None and p99 <= max_latency_ms
+
+def bench_sensor(config, name, rates, duration, workdir, max_loss, max_latency_ms, log):
+    results = []
+    best = None
+    for rate in rates:
+        step_dir = os.path.join(workdir, f'{name}_{rate:g}')
+        os.makedirs(step_dir, exist_ok=True)
+        os.chdir(step_dir)
+        result = bench_sensor_rate(config, name, rate, duration)
+        result['sustained'] = sustained(result, max_loss, max_latency_ms)
+        results.append(result)
+        log.info(f"{name} @ {rate:g}/s: {json.dumps(result)}")
+        if not result['sustained']:
+            break
+        best = result.get('rows_per_s')
+    return {'rates': results, 'max_sustained_lines_per_s': best}
+
+def bench_consumers(config, names, duration, interval, workdir, log):
+    """Merger and vitals: age of each sensor's newest sample when picked up, and update cost"""
+    from acquisition_engine import AcquisitionEngine
+    from real_time_merger import RealTimeMerger
+    from vitals import VitalsExporter
+
+    step_dir = os.path.join(workdir, 'consumers')
+    os.makedirs(step_dir, exist_ok=True)
+    os.chdir(step_dir)
+
+    sim = SimulatorProcess(config, names)
+    config = pin_ports(config, sim.start())
+    with open('bench_config.json', 'w') as f:
+        json.dump(config, f)
+
+    engine = AcquisitionEngine('bench_config.json', sensor_names=names)
+    thread = threading.Thread(target=engine.run, name='engine', daemon=True)
+    thread.start()
+
+    consumers = {}
+    try:
+        time.sleep(5)  # connect + device settle (the Arduinos sleep 2 s more)
+        sources = ['files'] + (['board'] if board_enabled(config) else [])
+        for source in sources:
+            consumers[f'merger_{source}'] = RealTimeMerger('bench_config.json', output_interval=interval, source=source)
+            consumers[f'vitals_{source}'] = VitalsExporter('bench_config.json', output_interval=interval, source=source)
+
+        lags = {key: {} for key in consumers}
+        costs = {key: [] for key in consumers}
+        end = time.time() + duration
+        while time.time() < end:
+            time.sleep(interval)
+            for key, consumer in consumers.items():
+                t0 = time.perf_counter_ns()
+                if key.startswith('merger'):
+                    consumer.update_sensor_data()
+                    row = consumer.create_merged_row()
+                    costs[key].append(time.perf_counter_ns() - t0)
+                    now = time.time_ns()
+                    for sensor_name, fresh in consumer.has_new_data.items():
+                        rx = row.get(f'{sensor_name}_{RX_TIME_COLUMNS[0]}')
+                        if fresh and rx:
+                            lags[key].setdefault(sensor_name, []).append(now - int(rx))
+                else:
+                    before = dict(consumer.latest_rx_ns)
+                    consumer.update_sensor_data()
+                    consumer.get_vitals_row()
+                    costs[key].append(time.perf_counter_ns() - t0)
+                    now = time.time_ns()
+                    for sensor_name, rx in consumer.latest_rx_ns.items():
+                        if rx and rx != before.get(sensor_name):
+                            lags[key].setdefault(sensor_name, []).append(now - rx)
+
+        results = {}
+        for key in consumers:
+            all_lags = [v for values in lags[key].values() for v in values]
+            results[key] = {
+                'lag': summarize_ms(all_lags),
+                'lag_by_sensor': {s: summarize_ms(v) for s, v in sorted(lags[key].items())},
+                'update_cost': summarize_ms(costs[key]),
+            }
+            log.info(f"{key}: lag {results[key]['lag']}, update {results[key]['update_cost']}")
+        return results
+    finally:
+        for consumer in consumers.values():
+            if hasattr(consumer, 'tailer'):
+                consumer.tailer.close()
+            if getattr(consumer, 'board', None):
+                consumer.board.close()
+        engine.signal_handler(None, None)
+        thread.join(timeout=15)
+        sim.stop()
+
+def compare(baseline, current, tolerance):
+    """Regressions of current vs a baseline result file (list of messages)"""
+    problems = []
+    for name, cur in current.get('sensors', {}).items():
+        base = baseline.get('sensors', {}).get(name)
+        if not base:
+            continue
+        b, c = base.get('max_sustained_lines_per_s'), cur.get('max_sustained_lines_per_s')
+        if b and (c is None or c < b * (1 - tolerance)):
+            problems.append(f"{name}: max sustained {c} lines/s (baseline {b})")
+
+        base_rates = {r['rate']: r for r in base.get('rates', [])}
+        for r in cur.get('rates', []):
+            old = base_rates.get(r['rate'])
+            if not old:
+                continue
+            for key in ('cpu_us_per_row',):
+                if old.get(key) and r.get(key) and r[key] > old[key] * (1 + tolerance):
+                    problems.append(f"{name} @ {r['rate']:g}/s: {key} {r[key]} (baseline {old[key]})")
+            old_p99 = (old.get('latency') or {}).get('p99_ms')
+            new_p99 = (r.get('latency') or {}).get('p99_ms')
+            if old_p99 and new_p99 and new_p99 > old_p99 * (1 + tolerance):
+                problems.append(f"{name} @ {r['rate']:g}/s: p99 latency {new_p99} ms (baseline {old_p99})")
+
+    for key, cur in current.get('consumers', {}).items():
+        old = baseline.get('consumers', {}).get(key)
+        if not old:
+            continue
+        old_p99, new_p99 = old['lag']['p99_ms'], cur['lag']['p99_ms']
+        if old_p99 and new_p99 and new_p99 > old_p99 * (1 + tolerance):
+            problems.append(f"{key}: p99 lag {new_p99} ms (baseline {old_p99})")
+    return problems
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def load_bench_config(config_file, board_name):
+    """Flight config adjusted for benchmarking"""
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+    # Same verbosity as flight, but to a log file rather than our terminal
+    config['logging'] = {**config.get('logging', {}), 'console': False, 'file': True}
+    for sensor_config in config['sensors'].values():
+        sensor_config.pop('logging', None)
+        sensor_config['reconnect_delay'] = 0.2
+        sensor_config['settle_time'] = 0.2
+    config.setdefault('board', {})['name'] = board_name
+    return config
+
+def main():
+    parser = argparse.ArgumentParser(description='Acquisition pipeline throughput/latency benchmark')
+    parser.add_argument('--config', default='sensor_config.json', help='Path to sensor configuration file')
+    parser.add_argument('--sensors', help='Comma-separated sensor names (default: every simulated, enabled sensor)')
+    parser.add_argument('--rates', default=','.join(str(r) for r in DEFAULT_RATES),
+                        help='Comma-separated lines/s to ramp through')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds measured per rate')
+    parser.add_argument('--max-loss', type=float, default=0.001, help='Loss fraction still counted as sustained')
+    parser.add_argument('--max-latency', type=float, default=2000.0, help='p99 ms still counted as sustained')
+    parser.add_argument('--consumer-duration', type=float, default=20.0, help='Seconds for the merger/vitals stage (0 = skip)')
+    parser.add_argument('--consumer-interval', type=float, default=1.0, help='Merger/vitals update interval (s)')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON results file')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression vs baseline')
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    config_path = os.path.abspath(args.config)
+    workdir = tempfile.mkdtemp(prefix='apl_bench_')
+    board_name = f'apl_bench_{os.getpid()}'
+
+    # Merger/vitals/engine log through the root logger - their chatter goes to the file only
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.FileHandler(os.path.join(workdir, 'benchmark.log'))],
+    )
+    log = logging.getLogger('Benchmark')
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(asctime)s - Benchmark - %(levelname)s - %(message)s'))
+    log.addHandler(console)
+
+    config = load_bench_config(config_path, board_name)
+    board = LatestBoard.open(config, fresh=True) if board_enabled(config) else None
+
+    candidates = [n for n, c in config['sensors'].items()
+                  if c.get('type') in EMITTERS and c.get('script', 'sensor_runner.py') == 'sensor_runner.py']
+    names = [n.strip() for n in args.sensors.split(',')] if args.sensors else \
+        [n for n in candidates if config['sensors'][n].get('enabled', True)]
+    rates = [float(r) for r in args.rates.split(',')]
+
+    results = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'python': sys.version.split()[0],
+            'cpu_count': os.cpu_count(),
+            'git_revision': git_revision(),
+            'rates': rates,
+            'duration_s': args.duration,
+            'max_loss': args.max_loss,
+            'max_latency_ms': args.max_latency,
+            'output': config.get('output', {}),
+            'workdir': workdir,
+        },
+        'sensors': {},
+        'consumers': {},
+    }
+
+    try:
+        for name in names:
+            if name not in candidates:
+                log.warning(f"No simulator for {name}, skipping")
+                continue
+            log.info(f"Benchmarking {name}")
+            results['sensors'][name] = bench_sensor(
+                config, name, rates, args.duration, workdir, args.max_loss, args.max_latency, log)
+
+        if args.consumer_duration > 0 and names:
+            log.info("Benchmarking merger and vitals")
+            results['consumers'] = bench_consumers(
+                config, [n for n in names if n in candidates], args.consumer_duration,
+                args.consumer_interval, workdir, log)
+    finally:
+        if board:
+            board.close()
+            board.unlink()
+
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    log.info(f"Results written to {output_path}")
+
+    for name, r in results['sensors'].items():
+        log.info(f"  {name}: max sustained {r['max_sustained_lines_per_s']} lines/s")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            problems = compare(json.load(f), results, args.tolerance)
+        for p in problems:
+            log.warning(f"REGRESSION {p}")
+        if problems:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
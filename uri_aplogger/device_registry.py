@@ -0,0 +1,166 @@
+# device_registry.py
+"""
+Shared udev device index for serial port lookup
+
+find_device_port used to build a new pyudev.Context and walk every tty device on
+each reconnect attempt (every reconnect_delay, per sensor). The registry walks
+them once per process, indexes them by (vendor_id, model_id, serial_short), and
+keeps the index current from a pyudev Monitor on add/remove events. Port lookup
+is then a dict access, and sensors can subscribe to hear the moment their device
+(re)appears instead of waiting out reconnect_delay.
+
+If the netlink monitor can't be started (no permission, containers) the registry
+still works: a lookup that finds nothing re-enumerates, like the old code did.
+"""
+
+import threading
+import logging
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+def _device_ids(device):
+    """(vendor_id, model_id, serial_short), lower-cased"""
+    return (
+        device.get('ID_VENDOR_ID', '').lower(),
+        device.get('ID_MODEL_ID', '').lower(),
+        device.get('ID_SERIAL_SHORT', '').lower(),
+    )
+
+class DeviceRegistry:
+    """tty devices indexed by USB ids, kept current by a udev monitor"""
+
+    def __init__(self, logger=None, monitor=True):
+        if pyudev is None:
+            raise RuntimeError("pyudev not installed. Install with: pip install pyudev")
+
+        self.logger = logger or logging.getLogger('DeviceRegistry')
+        self.context = pyudev.Context()
+        self._lock = threading.Lock()
+        self._by_ids = {}     # (vendor, model) -> {node: serial_short}
+        self._nodes = {}      # node -> (vendor, model, serial_short)
+        self._listeners = []  # [(vendor, model, serial_short or None, callback)]
+        self.observer = None
+
+        # Start the monitor before enumerating so nothing plugged in between is missed
+        if monitor:
+            self.start_monitor()
+        self.enumerate()
+
+    @property
+    def monitoring(self):
+        return self.observer is not None
+
+    def start_monitor(self):
+        try:
+            mon = pyudev.Monitor.from_netlink(self.context)
+            mon.filter_by(subsystem='tty')
+            self.observer = pyudev.MonitorObserver(mon, callback=self._on_event, name='udev-monitor')
+            self.observer.daemon = True
+            self.observer.start()
+            self.logger.info("udev monitor started")
+        except Exception as e:
+            self.observer = None
+            self.logger.warning(f"udev monitor unavailable ({e}), ports will be re-enumerated on lookup misses")
+
+    def stop(self):
+        if self.observer:
+            try:
+                self.observer.stop()
+            except Exception:
+                pass
+            self.observer = None
+
+    def enumerate(self):
+        """(Re)build the index from a full tty scan"""
+        by_ids = {}
+        nodes = {}
+        for device in self.context.list_devices(subsystem='tty'):
+            node = device.device_node
+            vendor, model, serial_s = _device_ids(device)
+            if not node or not vendor or not model:
+                continue
+            by_ids.setdefault((vendor, model), {})[node] = serial_s
+            nodes[node] = (vendor, model, serial_s)
+        with self._lock:
+            self._by_ids = by_ids
+            self._nodes = nodes
+
+    def _add(self, node, vendor, model, serial_s):
+        with self._lock:
+            self._by_ids.setdefault((vendor, model), {})[node] = serial_s
+            self._nodes[node] = (vendor, model, serial_s)
+            listeners = [cb for v, m, s, cb in self._listeners
+                         if v == vendor and m == model and (not s or s == serial_s)]
+        for callback in listeners:
+            try:
+                callback(node)
+            except Exception as e:
+                self.logger.error(f"Device listener failed for {node}: {e}")
+
+    def _remove(self, node):
+        with self._lock:
+            ids = self._nodes.pop(node, None)
+            if ids:
+                nodes = self._by_ids.get(ids[:2], {})
+                nodes.pop(node, None)
+                if not nodes:
+                    self._by_ids.pop(ids[:2], None)
+
+    def _on_event(self, device):
+        """MonitorObserver callback (runs on the monitor thread)"""
+        node = device.device_node
+        if not node:
+            return
+        if device.action == 'add':
+            vendor, model, serial_s = _device_ids(device)
+            if vendor and model:
+                self.logger.info(f"Device added: {node} ({vendor}:{model} serial={serial_s})")
+                self._add(node, vendor, model, serial_s)
+        elif device.action == 'remove':
+            if node in self._nodes:
+                self.logger.info(f"Device removed: {node}")
+            self._remove(node)
+
+    def lookup(self, vendor_id, model_id, serial_short=None):
+        """[(node, serial_short)] of devices with these ids (and serial_short, if given)"""
+        key = (str(vendor_id).lower(), str(model_id).lower())
+        target_serial = str(serial_short).lower() if serial_short else None
+
+        def matches():
+            with self._lock:
+                nodes = self._by_ids.get(key, {})
+                return [(node, s) for node, s in nodes.items() if not target_serial or s == target_serial]
+
+        found = matches()
+        if not found and not self.monitoring:
+            # Without the monitor a miss may just be stale - rescan like the old code
+            self.enumerate()
+            found = matches()
+        return sorted(found)
+
+    def subscribe(self, vendor_id, model_id, serial_short, callback):
+        """Call callback(node) from the monitor thread whenever a matching device is added"""
+        entry = (str(vendor_id).lower(), str(model_id).lower(),
+                 str(serial_short).lower() if serial_short else None, callback)
+        with self._lock:
+            self._listeners.append(entry)
+        return entry
+
+    def unsubscribe(self, entry):
+        with self._lock:
+            if entry in self._listeners:
+                self._listeners.remove(entry)
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry(logger=None):
+    """The process-wide registry (sensors in the acquisition engine share one)"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DeviceRegistry(logger=logger)
+        return _registry
@@ -0,0 +1,140 @@
+# field_schema.py
+"""
+Per-sensor column type schemas
+
+A sensor's "schema" block in sensor_config.json gives a type per column name,
+with "*" as the default for columns that aren't listed:
+
+    "schema": {"*": "float64", "Timestamp": "str19", "status": "int32"}
+
+Types are numpy dtype strings or these aliases:
+    float / float64, float32, int / int64, int32, str (32 bytes), strN (N bytes)
+Columns with no schema (or no "*") are stored as 32-byte strings.
+
+Sensors with a schema also get a row converter, built once at startup: rows
+leave parse_data as strings and are turned into typed tuples (float / int / str,
+None where a field is empty or doesn't convert) before they're written, so the
+writers, board and merger get numbers instead of re-parsing text.
+
+Sensors run by sensor_runner.py also write two receive-time columns after their
+column_names: rx_epoch_ns (wall clock) and rx_mono_ns (time.monotonic_ns), both
+taken when the bytes were read from the port/socket and stored as int64. Turn
+them off per sensor with "rx_timestamps": false.
+"""
+
+import time
+from operator import itemgetter
+
+TYPE_ALIASES = {
+    'float': 'f8',
+    'float64': 'f8',
+    'float32': 'f4',
+    'int': 'i8',
+    'int64': 'i8',
+    'int32': 'i4',
+    'str': 'S32',
+}
+
+DEFAULT_TYPE = 'S32'
+
+RX_TIME_COLUMNS = ['rx_epoch_ns', 'rx_mono_ns']
+RX_TIME_TYPE = 'i8'
+
+def normalize_type(type_name):
+    """Schema type name -> numpy dtype string ('str19' -> 'S19', 'float' -> 'f8')"""
+    t = str(type_name).strip()
+    low = t.lower()
+    if low in TYPE_ALIASES:
+        return TYPE_ALIASES[low]
+    if low.startswith('str') and low[3:].isdigit():
+        return f'S{int(low[3:])}'
+    return t
+
+def column_types(column_names, schema=None):
+    """numpy dtype string for every column, in column order"""
+    schema = schema or {}
+    default = normalize_type(schema.get('*', DEFAULT_TYPE))
+    return [
+        normalize_type(schema[name]) if name in schema
+        else RX_TIME_TYPE if name in RX_TIME_COLUMNS
+        else default
+        for name in column_names
+    ]
+
+def type_kind(dtype_str):
+    """'f', 'i' or 'S' - which converter family a dtype string needs"""
+    d = dtype_str.lstrip('<>=|')
+    if d[:1] in ('f', 'd'):
+        return 'f'
+    if d[:1] in ('i', 'u', 'l', 'q'):
+        return 'i'
+    return 'S'
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+def to_text(value):
+    if value.__class__ is str:
+        return value
+    return '' if value is None else str(value)
+
+TYPED_CONVERTERS = {'f': to_float, 'i': to_int, 'S': to_text}
+
+def row_converter(sensor_config):
+    """
+    Function turning a parsed row into a typed tuple, one converter per column.
+    None if the sensor has no schema (rows are written as parsed).
+    Short rows are padded with None; fields past column_names are dropped.
+    """
+    schema = sensor_config.get('schema')
+    columns = sensor_config.get('column_names', [])
+    if not schema or not columns:
+        return None
+
+    n = len(columns)
+    converters = tuple(TYPED_CONVERTERS[type_kind(t)] for t in column_types(columns, schema))
+    # itemgetter picks (and truncates to) the schema's columns in one C call
+    pick = itemgetter(*range(n)) if n > 1 else (lambda row: (row[0],))
+    pad = (None,) * n
+
+    def convert(row):
+        if len(row) < n:
+            row = tuple(row) + pad[len(row):]
+        return tuple([conv(value) for conv, value in zip(converters, pick(row))])
+
+    return convert
+
+def has_rx_time(sensor_config):
+    """True if the sensor appends rx_epoch_ns/rx_mono_ns to its rows"""
+    return (bool(sensor_config.get('rx_timestamps', True))
+            and sensor_config.get('script', 'sensor_runner.py') == 'sensor_runner.py')
+
+def output_columns(sensor_config):
+    """Columns a sensor actually writes: column_names, plus the rx time columns"""
+    columns = list(sensor_config.get('column_names', []))
+    if has_rx_time(sensor_config):
+        columns += RX_TIME_COLUMNS
+    return columns
+
+def format_epoch_ns(epoch_ns):
+    """rx_epoch_ns -> local time text with milliseconds ('' if missing)"""
+    try:
+        epoch_ns = int(epoch_ns)
+    except (TypeError, ValueError):
+        return ''
+    if epoch_ns <= 0:
+        return ''
+    seconds, ns = divmod(epoch_ns, 1_000_000_000)
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds)) + f".{ns // 1_000_000:03d}"
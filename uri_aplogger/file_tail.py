@@ -0,0 +1,256 @@
+# file_tail.py
+"""
+Follow growing sensor CSVs without rescanning output/
+
+The merger used to glob every sensor's pattern and stat every match each second,
+then reopen the newest file and seek. That gets slower with every flight left in
+output/. FileTailer instead watches each sensor directory with inotify (through
+ctypes, Linux only - no extra packages), keeps one open handle on the active file,
+and only reads when a modify event says bytes were appended. A new file matching
+the pattern (sensor restarted) becomes the active file when it is created.
+
+Where inotify isn't available it falls back to the old glob + getmtime polling.
+"""
+
+import os
+import csv
+import glob
+import errno
+import struct
+import fnmatch
+import ctypes
+import ctypes.util
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+class Inotify:
+    """Minimal inotify wrapper (non-blocking fd, events as (wd, mask, name))"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify not supported on this platform")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read_events(self):
+        """All queued events; empty list if there are none"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return events
+                raise
+            if not data:
+                return events
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', errors='replace')
+                offset += length
+                events.append((wd, mask, name))
+
+    def close(self):
+        if self.fd is not None and self.fd >= 0:
+            os.close(self.fd)
+        self.fd = None
+
+class _Tail:
+    """State for one followed pattern"""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.directory = os.path.dirname(pattern) or '.'
+        self.name_glob = os.path.basename(pattern)
+        self.wd = None
+        self.path = None
+        self.handle = None
+        self.partial = b''
+        self.header = None
+        self.dirty = False
+
+    def open(self, path):
+        """Make path the active file, reading it from the start (header first)"""
+        self.close()
+        self.path = path
+        self.handle = open(path, 'rb')
+        self.partial = b''
+        self.header = None
+        self.dirty = True
+
+    def close(self):
+        if self.handle:
+            self.handle.close()
+        self.handle = None
+
+    def read_rows(self):
+        """CSV rows appended since the last call (complete lines only)"""
+        self.dirty = False
+        if not self.handle:
+            return []
+
+        # File was truncated/rewritten - start over
+        if os.fstat(self.handle.fileno()).st_size < self.handle.tell():
+            self.handle.seek(0)
+            self.partial = b''
+            self.header = None
+
+        data = self.handle.read()
+        if not data:
+            return []
+        data = self.partial + data
+        lines = data.split(b'\n')
+        self.partial = lines.pop()
+
+        rows = [row for row in csv.reader(line.decode('utf-8', errors='ignore') for line in lines) if row]
+        if self.header is None and rows:
+            self.header = rows.pop(0)
+        return rows
+
+class FileTailer:
+    """Follows the newest file matching each registered glob pattern"""
+
+    def __init__(self, use_inotify=True, logger=None):
+        self.logger = logger
+        self.tails = {}
+        self._by_wd = {}
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+            except OSError as e:
+                self._log('warning', f"inotify unavailable ({e}), falling back to polling")
+
+    def _log(self, level, msg):
+        if self.logger:
+            getattr(self.logger, level)(msg)
+
+    @property
+    def mode(self):
+        return 'inotify' if self.inotify else 'polling'
+
+    def add(self, key, pattern):
+        """Follow pattern under key; starts on the newest existing match, if any"""
+        tail = _Tail(pattern)
+        self.tails[key] = tail
+        latest = self._find_latest(pattern)
+        if latest:
+            tail.open(latest)
+        if self.inotify:
+            self._watch(tail)
+
+    def header(self, key):
+        tail = self.tails.get(key)
+        return tail.header if tail else None
+
+    def current_file(self, key):
+        tail = self.tails.get(key)
+        return tail.path if tail else None
+
+    def _find_latest(self, pattern):
+        try:
+            files = glob.glob(pattern)
+            return max(files, key=os.path.getmtime) if files else None
+        except OSError as e:
+            self._log('error', f"Error finding files for pattern {pattern}: {e}")
+            return None
+
+    def _watch(self, tail):
+        """Watch the tail's directory; it may not exist yet, so this is retried"""
+        if tail.wd is not None or not os.path.isdir(tail.directory):
+            return
+        try:
+            tail.wd = self.inotify.add_watch(tail.directory, IN_MODIFY | IN_CREATE | IN_MOVED_TO)
+            self._by_wd.setdefault(tail.wd, []).append(tail)
+            # Anything written before the watch existed
+            latest = self._find_latest(tail.pattern)
+            if latest and latest != tail.path:
+                tail.open(latest)
+            elif tail.handle:
+                tail.dirty = True
+        except OSError as e:
+            self._log('warning', f"Cannot watch {tail.directory}: {e}")
+
+    def _process_events(self):
+        for wd, mask, name in self.inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                # Lost events - just read everything once
+                for tail in self.tails.values():
+                    tail.dirty = True
+                continue
+            if mask & IN_IGNORED:
+                # Directory removed; re-watch once it comes back
+                for tail in self._by_wd.pop(wd, []):
+                    tail.wd = None
+                continue
+            for tail in self._by_wd.get(wd, []):
+                if not fnmatch.fnmatch(name, tail.name_glob):
+                    continue
+                path = os.path.join(tail.directory, name)
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # A sensor (re)started and began a new file
+                    if path != tail.path:
+                        tail.open(path)
+                elif mask & IN_MODIFY and path == tail.path:
+                    tail.dirty = True
+
+    def read_new_rows(self):
+        """{key: [rows appended since last call]} for every tail with new data"""
+        if self.inotify:
+            for tail in self.tails.values():
+                if tail.wd is None:
+                    self._watch(tail)
+            self._process_events()
+        else:
+            # Polling fallback: rescan for the newest file every call
+            for tail in self.tails.values():
+                latest = self._find_latest(tail.pattern)
+                if latest and latest != tail.path:
+                    tail.open(latest)
+                tail.dirty = tail.handle is not None
+
+        new_rows = {}
+        for key, tail in self.tails.items():
+            if not tail.dirty:
+                continue
+            try:
+                rows = tail.read_rows()
+            except OSError as e:
+                self._log('error', f"Error reading {key} file: {e}")
+                continue
+            if rows:
+                new_rows[key] = rows
+        return new_rows
+
+    def close(self):
+        for tail in self.tails.values():
+            tail.close()
+        if self.inotify:
+            self.inotify.close()
@@ -4,14 +4,23 @@ Generic Sensor Base Class - Fixed version
 """
 
 import serial
-import csv
+import select
 import signal
 import sys
 import time
+import threading
 from datetime import datetime
 import logging
 from pathlib import Path
 
+from sensor_writers import create_writer, output_settings
+from latest_board import LatestBoard, BoardPublisher
+from field_schema import RX_TIME_COLUMNS, has_rx_time, output_columns, row_converter
+from device_registry import get_registry
+from raw_capture import RawCapture
+from row_logging import RowLog, DEFAULT_SUMMARY_INTERVAL
+from status_channel import StatusReporter
+
 try:
     import pyudev
 except ImportError:
@@ -20,6 +29,9 @@ except ImportError:
 
 class GenericSensor:
     """Generic base class for all USB sensors"""
+
+    # Recorded in raw capture headers - 'udp' captures hold one message per record
+    transport = 'serial'
     
     def __init__(self, name, config):
         self.name = name
@@ -27,18 +39,56 @@ class GenericSensor:
         self.running = True
         self.serial_conn = None
         self.consecutive_failures = 0
+        # Successful reconnects since start (heartbeats)
+        self.reconnects = 0
         self.max_failures = config.get('max_failures', 5)
         self.reconnect_delay = config.get('reconnect_delay', 5)
+        # Seconds to let the device settle after opening the port
+        self.settle_time = float(config.get('settle_time', 2))
         
         # Common settings with defaults
         self.baudrate = config.get('baudrate', 9600)
         self.timeout = config.get('timeout', 2)
+
+        # Event-driven mode: block on the serial fd until bytes arrive instead of sleeping 0.1s
+        self.event_driven = bool(config.get('event_driven', False))
+        self.idle_timeout = float(config.get('idle_timeout', 0.1))
+
+        # Batch mode: read everything waiting in one call and hand back every complete line
+        self.batch_read = bool(config.get('batch_read', True))
+        self.max_line_bytes = int(config.get('max_line_bytes', 65536))
+        self._rx_buf = b""
+
+        # Receive time of the chunk being parsed, taken right after the read returns.
+        # Written as integer rx_epoch_ns/rx_mono_ns columns after column_names.
+        self.rx_timestamps = has_rx_time(config)
+        self.rx_epoch_ns = 0
+        self.rx_mono_ns = 0
+        self._stamp_second = None
+        self._stamp_text = ""
+
+        # Schema-driven parsed row -> typed tuple (None without a "schema" block)
+        self.convert_row = row_converter(config)
+
+        # Optional black-box log of every received chunk (opened with the output file)
+        self.raw_capture = None
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         self.output_file = config.get('output_file', f'output/{name.lower()}/{name.lower()}_data_{timestamp}.csv')
         self.setup_logging()
+        # Row counters + one "written N rows" summary per interval instead of a line per row
+        self.row_log = RowLog(self.logger, (config.get('logging') or {}).get('summary_interval', DEFAULT_SUMMARY_INTERVAL))
+        self.board_publisher = self.setup_board()
+        # Readiness to runall.py (None when run by hand)
+        self.status = StatusReporter.from_env(name)
+
+        # Set from the udev monitor thread when our device is plugged (back) in
+        self._device_appeared = threading.Event()
+        self.device_registry = self.setup_device_registry()
         print(f"{self.logger.name} logger initialized.")
         print(f"{self.logger.info}")
         signal.signal(signal.SIGINT, self.signal_handler)
+        # runall.py stops us with terminate() - catch it too so buffered rows get flushed
+        signal.signal(signal.SIGTERM, self.signal_handler)
         
         # Create output directory
         Path(f'output/{self.name}').mkdir(parents=True, exist_ok=True)
@@ -91,14 +141,144 @@ class GenericSensor:
             self.logger.addHandler(fh)
         
 
+    def setup_board(self):
+        """Attach to the shared-memory latest-value board, if enabled in config"""
+        board_cfg = (self.config or {}).get("board") or {}
+        if not board_cfg.get("enabled") or not board_cfg.get("slots"):
+            return None
+        try:
+            board = LatestBoard.open_layout(board_cfg["name"], board_cfg["slots"], board_cfg["width"])
+            publisher = BoardPublisher(board, self.name)
+            self.logger.info(f"Publishing latest values to board '{board_cfg['name']}' slot {publisher.slot}")
+            return publisher
+        except Exception as e:
+            self.logger.warning(f"Latest-value board unavailable: {e}")
+            return None
+
+    def publish_latest(self, parsed_data):
+        """Put the newest row on the board (no-op when the board is off)"""
+        if not self.board_publisher:
+            return
+        try:
+            if self.rx_timestamps:
+                # rx times go in the slot header - int64 ns doesn't fit a float64 value
+                n = len(RX_TIME_COLUMNS)
+                self.board_publisher.publish_row(parsed_data[:-n], self.rx_epoch_ns, self.rx_mono_ns)
+            else:
+                self.board_publisher.publish_row(parsed_data)
+        except Exception as e:
+            self.logger.warning(f"Board publish failed, disabling: {e}")
+            self.board_publisher = None
+
+    def mark_rx(self, chunk=None):
+        """Record the receive time of the chunk just read (and capture its raw bytes, if enabled)"""
+        self.rx_mono_ns = time.monotonic_ns()
+        self.rx_epoch_ns = time.time_ns()
+        if chunk and self.raw_capture:
+            try:
+                self.raw_capture.write(chunk, self.rx_epoch_ns, self.rx_mono_ns)
+            except OSError as e:
+                self.logger.error(f"Raw capture failed, disabling: {e}")
+                self.raw_capture = None
+
+    def setup_raw_capture(self):
+        """Open output/<name>/<name>_raw_<timestamp>.bin when output.raw_capture is on"""
+        settings = output_settings(self.config)
+        if not settings['raw_capture']:
+            return None
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = f'output/{self.name}/{self.name}_raw_{timestamp}.bin'
+        try:
+            capture = RawCapture(path,
+                                 metadata={'sensor': self.name, 'type': self.config.get('type'),
+                                           'transport': self.transport},
+                                 buffer_bytes=settings['raw_buffer_bytes'],
+                                 flush_interval=settings['flush_interval'],
+                                 fsync_interval=settings['fsync_interval'],
+                                 logger=self.logger)
+            self.logger.info(f"Raw capture: {path}")
+            return capture
+        except OSError as e:
+            self.logger.error(f"Failed to open raw capture: {e}")
+            return None
+
+    def rx_timestamp(self):
+        """
+        Timestamp column text for the row being parsed - the receive time to the
+        second (full resolution is in rx_epoch_ns). Formatted once per second.
+        """
+        epoch_ns = self.rx_epoch_ns or time.time_ns()
+        second = epoch_ns // 1_000_000_000
+        if second != self._stamp_second:
+            self._stamp_second = second
+            self._stamp_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return self._stamp_text
+
+    def stamp_row(self, parsed_data):
+        """Append the rx_epoch_ns/rx_mono_ns columns to a parsed row"""
+        if not self.rx_timestamps:
+            return parsed_data
+        return tuple(parsed_data) + (self.rx_epoch_ns, self.rx_mono_ns)
+
+    def finish_row(self, parsed_data):
+        """The row we write: parse_data output typed by the schema (if any), plus the rx times"""
+        if self.convert_row:
+            parsed_data = self.convert_row(parsed_data)
+        return self.stamp_row(parsed_data)
+
     def signal_handler(self, sig, frame):
         """Handle shutdown signals"""
         self.logger.info(f"Stopping {self.name} data collection...")
         self.running = False
 
+    def setup_device_registry(self):
+        """Shared udev index + a subscription that wakes reconnect when our device appears"""
+        if self.config.get("port") or not isinstance(self.config.get("identifiers"), dict):
+            return None
+        try:
+            registry = get_registry(self.logger)
+            ids = self.config["identifiers"]
+            registry.subscribe(ids.get("vendor_id", ""), ids.get("model_id", ""),
+                               ids.get("serial_short"), self.on_device_added)
+            return registry
+        except Exception as e:
+            self.logger.warning(f"Device registry unavailable, enumerating on every lookup: {e}")
+            return None
+
+    def on_device_added(self, node):
+        """udev monitor thread: a device matching our identifiers showed up"""
+        if not self.serial_conn:
+            self.logger.info(f"{self.name} device appeared at {node}")
+            self._device_appeared.set()
+
+    def list_device_matches(self, target_vendor, target_model, target_serial):
+        """[(node, serial_short)] for our ids - registry lookup, or a full tty scan without one"""
+        if self.device_registry:
+            return self.device_registry.lookup(target_vendor, target_model, target_serial)
+
+        context = pyudev.Context()
+
+        matches = []
+        for device in context.list_devices(subsystem="tty"):
+            vendor_id = device.get("ID_VENDOR_ID", "").lower()
+            model_id = device.get("ID_MODEL_ID", "").lower()
+            serial_s = device.get("ID_SERIAL_SHORT", "").lower()
+            node = device.device_node
+
+            if vendor_id == target_vendor and model_id == target_model:
+                # If serial_short is specified, enforce it
+                if target_serial and serial_s != target_serial:
+                    continue
+                matches.append((node, serial_s))
+        return matches
+
     def find_device_port(self):
         """Find device port using vendor/model IDs and optional serial_short."""
         try:
+            # A fixed "port" in config skips discovery (simulators, odd adapters)
+            if self.config.get("port"):
+                return self.config["port"]
+
             ids = self.config.get("identifiers")
             if not isinstance(ids, dict):
                 self.logger.error(f"{self.name}: Missing or invalid 'identifiers' in config")
@@ -113,20 +293,7 @@ class GenericSensor:
                 self.logger.error(f"{self.name}: identifiers must include vendor_id and model_id")
                 return None
 
-            context = pyudev.Context()
-
-            matches = []
-            for device in context.list_devices(subsystem="tty"):
-                vendor_id = device.get("ID_VENDOR_ID", "").lower()
-                model_id = device.get("ID_MODEL_ID", "").lower()
-                serial_s = device.get("ID_SERIAL_SHORT", "").lower()
-                node = device.device_node
-
-                if vendor_id == target_vendor and model_id == target_model:
-                    # If serial_short is specified, enforce it
-                    if target_serial and serial_s != target_serial:
-                        continue
-                    matches.append((node, serial_s))
+            matches = self.list_device_matches(target_vendor, target_model, target_serial)
 
             if len(matches) == 1:
                 node, serial_s = matches[0]
@@ -198,7 +365,8 @@ class GenericSensor:
                 timeout=self.timeout
             )
             
-            time.sleep(2)  # Device initialization
+            time.sleep(self.settle_time)  # Device initialization
+            self._rx_buf = b""
             self.logger.info(f"Connected to {self.name} on {port}")
             self.consecutive_failures = 0
             return True
@@ -222,10 +390,11 @@ class GenericSensor:
             while self.serial_conn.in_waiting > 0:
                 line = self.serial_conn.readline()
                 if line:
+                    self.mark_rx(line)
                     decoded = line.decode('utf-8', errors='ignore').strip()
                     if decoded:
                         data_chunks.append(decoded)
-                        self.logger.debug(f"Raw data chunk: {decoded}")
+                        self.logger.debug("Raw data chunk: %s", decoded)
             
             if data_chunks:
                 # For TriSonica, return the most recent complete line
@@ -236,9 +405,10 @@ class GenericSensor:
             try:
                 line = self.serial_conn.readline()
                 if line:
+                    self.mark_rx(line)
                     decoded = line.decode('utf-8', errors='ignore').strip()
                     if decoded:
-                        self.logger.debug(f"Raw data (direct read): {decoded}")
+                        self.logger.debug("Raw data (direct read): %s", decoded)
                         return decoded
             except:
                 pass
@@ -253,6 +423,112 @@ class GenericSensor:
                 self.serial_conn = None
             return None
 
+    def read_serial_lines(self):
+        """
+        Batch read - returns a list of EVERY complete line received so far.
+
+        Whatever the port has buffered is pulled in with a single read() and
+        split on newlines. A trailing partial line is kept for the next call,
+        so at 10-40 Hz nothing is dropped (read_serial_data only keeps the last).
+        """
+        if not self.serial_conn or not self.serial_conn.is_open:
+            if not self.init_serial():
+                return []
+
+        try:
+            waiting = self.serial_conn.in_waiting
+            if waiting <= 0:
+                return []
+            chunk = self.serial_conn.read(waiting)
+        except Exception as e:
+            self.logger.error(f"Read error: {e}")
+            self.consecutive_failures += 1
+            if self.serial_conn:
+                self.serial_conn.close()
+                self.serial_conn = None
+            self._rx_buf = b""
+            return []
+
+        if not chunk:
+            return []
+        self.mark_rx(chunk)
+
+        lines = self.split_lines(chunk)
+        if lines:
+            self.logger.debug("Read %d lines in one chunk (%d bytes)", len(lines), len(chunk))
+        return lines
+
+    def split_lines(self, chunk):
+        """
+        Decoded complete lines from a received chunk. A trailing partial line is kept
+        in _rx_buf for the next chunk. raw_capture.py reparse calls this too.
+        """
+        self._rx_buf += chunk
+        if b"\n" not in self._rx_buf:
+            if len(self._rx_buf) > self.max_line_bytes:
+                self.logger.warning(f"Discarding {len(self._rx_buf)} bytes with no line ending")
+                self._rx_buf = b""
+            return []
+
+        *complete, self._rx_buf = self._rx_buf.split(b"\n")
+
+        lines = []
+        for raw in complete:
+            decoded = raw.decode('utf-8', errors='ignore').strip()
+            if decoded:
+                lines.append(decoded)
+        return lines
+
+    def accept_line(self, line):
+        """Filter for lines that shouldn't reach parse_data (command echoes etc.) - override as needed"""
+        return True
+
+    def read_lines(self):
+        """Lines to process this iteration - batch read, or the legacy single-line read"""
+        if self.batch_read:
+            return self.read_serial_lines()
+        line = self.read_serial_data()
+        return [line] if line else []
+
+    def fileno(self):
+        """File descriptor that signals incoming data, or None when not connected"""
+        if self.serial_conn and self.serial_conn.is_open:
+            try:
+                return self.serial_conn.fileno()
+            except Exception:
+                return None
+        return None
+
+    def wait_for_data(self, timeout=None):
+        """
+        Idle between loop iterations.
+
+        In event-driven mode we select() on the device fd, so we wake as soon as
+        bytes arrive (or when the timeout passes, so reconnects and FIFOs still
+        get serviced). Otherwise this is the classic fixed 0.1s poll.
+        Returns True if the device has data waiting.
+        """
+        if not self.event_driven:
+            time.sleep(0.1)
+            return False
+
+        if timeout is None:
+            timeout = self.idle_timeout
+
+        fd = self.fileno()
+        if fd is None:
+            time.sleep(timeout)
+            return False
+
+        try:
+            readable, _, _ = select.select([fd], [], [], timeout)
+            return bool(readable)
+        except (OSError, ValueError) as e:
+            # fd went away under us (USB unplug) - let the read path handle reconnect
+            self.logger.debug(f"select() failed: {e}")
+            time.sleep(timeout)
+            return False
+
     def parse_data(self, data):
         """Parse sensor-specific data - To be implemented by child classes"""
         raise NotImplementedError("Child classes must implement parse_data")
@@ -265,90 +541,160 @@ class GenericSensor:
         """Write data to CSV - Common for all sensors"""
         try:
             writer.writerow(parsed_data)
-            
-            # Log sample of written data (first few non-timestamp fields)
-            sample_fields = [str(field) for field in parsed_data[1:4] if field]  # First 3 data fields
-            if sample_fields:
-                self.logger.info(f"Written: {', '.join(sample_fields)}")
-            else:
-                self.logger.debug("Written: [placeholder data]")
+            self.publish_latest(parsed_data)
+            # Counted here, summarised every summary_interval by step()
+            self.row_log.written(parsed_data)
         except Exception as e:
             self.logger.error(f"Write error: {e}")
 
-    def run(self):
-        """Main data collection loop - Common for all sensors"""
-        self.logger.info(f"Starting {self.name} data collection")
-        
-        # Initialize CSV file with headers
+    def report_status(self):
+        """Tell runall.py we're recording once the first row is written, then send heartbeats"""
+        if not self.status:
+            return
+        if not self.status.ready_sent and self.row_log.rows:
+            self.status.ready(rows=self.row_log.rows, output=self.output_file)
+        now = time.monotonic()
+        if self.status.heartbeat_due(now):
+            self.status.heartbeat(self.row_log.rows, now, **self.status_fields(now))
+
+    def status_fields(self, now=None):
+        """Heartbeat counters besides rows"""
+        age = self.row_log.last_row_age(now)
+        fields = {
+            'parse_errors': self.row_log.rejected,
+            'reconnects': self.reconnects,
+            'last_sample_age': round(age, 3) if age is not None else None,
+        }
+        writer = getattr(self, '_writer', None)
+        if writer is not None:
+            stats = getattr(writer, 'stats', None)
+            fields['writer'] = stats() if stats else {'rows_written': writer.rows_written}
+        return fields
+
+    def open_output(self):
+        """Create the output file with headers and open the buffered row writer"""
         try:
-            with open(self.output_file, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(self.config['column_names'])
+            self._writer = create_writer(self.output_file, output_columns(self.config), self.config, self.logger)
             self.logger.info(f"Output file: {self.output_file}")
         except Exception as e:
             self.logger.error(f"Failed to create output file: {e}")
-            return
+            return False
+        self.raw_capture = self.setup_raw_capture()
 
-        last_reconnect = time.time()
-        last_data_time = time.time()
-        data_count = 0
-        
-        with open(self.output_file, 'a', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            
-            while self.running:
-                current_time = time.time()
-                
-                # Reconnection logic
-                if not self.serial_conn and current_time - last_reconnect >= self.reconnect_delay:
-                    self.logger.info("Attempting to reconnect...")
-                    if self.init_serial():
-                        self.logger.info("Reconnected successfully!")
-                    last_reconnect = current_time
-
-                # Data reading and processing
-                if self.serial_conn and self.serial_conn.is_open:
-                    try:
-                        raw_data = self.read_serial_data()
-                        if raw_data:
-                            parsed_data = self.parse_data(raw_data)
-                            if self.is_valid_data(parsed_data):
-                                self.write_data(writer, parsed_data)
-                                csvfile.flush()
-                                self.consecutive_failures = 0
-                                data_count += 1
-                                last_data_time = current_time
-                    except Exception as e:
-                        self.logger.error(f"Processing error: {e}")
-                        self.consecutive_failures += 1
-                    
-                # If no data for a while, try to read anyway (some devices don't show in_waiting properly)
-                elif current_time - last_data_time > 5 and self.serial_conn:
-                    try:
-                        # Force a read attempt
-                        raw_data = self.serial_conn.readline().decode('utf-8', errors='ignore').strip()
-                        if raw_data:
-                            parsed_data = self.parse_data(raw_data)
-                            if self.is_valid_data(parsed_data):
-                                self.write_data(writer, parsed_data)
-                                csvfile.flush()
-                                data_count += 1
-                                last_data_time = current_time
-                    except:
-                        pass
-
-                # Failure handling
-                if self.consecutive_failures >= self.max_failures:
-                    self.logger.warning(f"Multiple failures, reconnecting in {self.reconnect_delay}s")
-                    if self.serial_conn:
-                        self.serial_conn.close()
-                    self.serial_conn = None
-                    self.consecutive_failures = 0
-                    last_reconnect = current_time
-                
-                time.sleep(0.1)
-        
-        # Cleanup
+        # First connect right away - reconnect_delay only spaces out retries
+        self._last_reconnect = 0.0
+        self._last_data_time = time.time()
+        self.data_count = 0
+        return True
+
+    def close_output(self):
+        """Flush and close the output file, then the serial port"""
+        if getattr(self, '_writer', None):
+            try:
+                self._writer.close()
+            except Exception as e:
+                self.logger.error(f"Error closing output: {e}")
+            self._writer = None
+        if self.raw_capture:
+            try:
+                self.raw_capture.close()
+                self.logger.info(f"Raw capture closed: {self.raw_capture.chunks} chunks, {self.raw_capture.bytes} bytes")
+            except Exception as e:
+                self.logger.error(f"Error closing raw capture: {e}")
+            self.raw_capture = None
         if self.serial_conn:
             self.serial_conn.close()
-        self.logger.info(f"{self.name} data collection stopped. Total data points: {data_count}")
\ No newline at end of file
+        self.logger.info(f"{self.name} data collection stopped. Total data points: {getattr(self, 'data_count', 0)}")
+
+    def due_for_reconnect(self, now=None):
+        """True when we're disconnected and reconnect_delay has passed (or our device just appeared)"""
+        now = time.time() if now is None else now
+        if self.serial_conn:
+            return False
+        return self._device_appeared.is_set() or now - self._last_reconnect >= self.reconnect_delay
+
+    def reconnect(self, now=None):
+        """One reconnect attempt (blocking - init_serial sleeps for device settle)"""
+        self.logger.info("Attempting to reconnect...")
+        self._device_appeared.clear()
+        if self.init_serial():
+            self.reconnects += 1
+            self.logger.info("Reconnected successfully!")
+        self._last_reconnect = time.time() if now is None else now
+
+    def step(self, reconnect=True):
+        """
+        One pass of the collection loop: reconnect, read, parse, write, failure handling.
+        Never sleeps - run() idles in wait_for_data(), the engine idles in its selector.
+        """
+        current_time = time.time()
+        writer = self._writer
+
+        # Reconnection logic
+        if reconnect and self.due_for_reconnect(current_time):
+            self.reconnect(current_time)
+
+        # Data reading and processing
+        if self.serial_conn and self.serial_conn.is_open:
+            try:
+                written = 0
+                for raw_data in self.read_lines():
+                    parsed_data = self.parse_data(raw_data)
+                    if self.is_valid_data(parsed_data):
+                        self.write_data(writer, self.finish_row(parsed_data))
+                        written += 1
+                    else:
+                        self.row_log.rejected_row()
+                if written:
+                    self.consecutive_failures = 0
+                    self.data_count += written
+                    self._last_data_time = current_time
+            except Exception as e:
+                self.logger.error(f"Processing error: {e}")
+                self.consecutive_failures += 1
+
+        # If no data for a while, try to read anyway (some devices don't show in_waiting properly)
+        elif current_time - self._last_data_time > 5 and self.serial_conn:
+            try:
+                # Force a read attempt
+                line = self.serial_conn.readline()
+                raw_data = line.decode('utf-8', errors='ignore').strip()
+                if raw_data:
+                    self.mark_rx(line)
+                    parsed_data = self.parse_data(raw_data)
+                    if self.is_valid_data(parsed_data):
+                        self.write_data(writer, self.finish_row(parsed_data))
+                        self.data_count += 1
+                        self._last_data_time = current_time
+            except:
+                pass
+
+        # Time-based flush of buffered rows (also covers quiet periods)
+        writer.maybe_flush()
+        if self.raw_capture:
+            self.raw_capture.maybe_flush()
+        self.row_log.maybe_summary()
+        self.report_status()
+
+        # Failure handling
+        if self.consecutive_failures >= self.max_failures:
+            self.logger.warning(f"Multiple failures, reconnecting in {self.reconnect_delay}s")
+            if self.serial_conn:
+                self.serial_conn.close()
+            self.serial_conn = None
+            self.consecutive_failures = 0
+            self._last_reconnect = current_time
+
+    def run(self):
+        """Main data collection loop - Common for all sensors"""
+        self.logger.info(f"Starting {self.name} data collection")
+
+        if not self.open_output():
+            return
+
+        try:
+            while self.running:
+                self.step()
+                self.wait_for_data()
+        finally:
+            self.close_output()
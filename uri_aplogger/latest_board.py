@@ -0,0 +1,363 @@
+# latest_board.py
+"""
+Shared-memory "latest value" board
+
+Every sensor process publishes its newest parsed row into a named shared-memory
+region, so vitals and the merger can read current values directly instead of
+re-reading and re-parsing each sensor's CSV.
+
+Layout (all little-endian 8-byte words):
+    board header   MAGIC, LAYOUT_VERSION, n_slots, width, generation, 3 reserved
+    slot header    seq, count, epoch_ns, mono_ns, n_cols, pid, 2 reserved, name (32 bytes)
+    slot values    width x float64 (NaN where a field isn't a number)
+
+Slots follow the order of "sensors" in sensor_config.json (enabled or not, so the
+indices never shift) and width is the widest column_names. The Timestamp column
+is not stored as a value - epoch_ns/mono_ns in the slot header carry the time.
+
+Writes are seqlock-style: seq goes odd, values are copied, seq goes even again.
+Readers copy the slot and retry if seq was odd or changed, so they never see a
+half-written row and never block the writer.
+
+Config:
+    "board": {"enabled": true, "name": "apl_latest", "check_interval": 5}
+runall.py creates the region fresh on start and unlinks it on stop; a sensor run
+on its own creates it if it doesn't exist yet. generation is the creation time
+(ns), so long-running readers (vx.py, vitals.py) can notice through BoardFollower
+that the region they mapped was replaced by a runall restart and reattach.
+"""
+
+import os
+import math
+import time
+import inspect
+from array import array
+from multiprocessing import shared_memory, resource_tracker
+
+from field_schema import column_types, type_kind
+
+# Python 3.13+ can open shared memory without the resource tracker
+_HAS_TRACK = 'track' in inspect.signature(shared_memory.SharedMemory.__init__).parameters
+
+MAGIC = 0x42_4C_50_41  # 'APLB'
+LAYOUT_VERSION = 1
+
+BOARD_HEADER_WORDS = 8
+SLOT_HEADER_WORDS = 8
+SLOT_NAME_BYTES = 32
+SLOT_HEADER_BYTES = SLOT_HEADER_WORDS * 8 + SLOT_NAME_BYTES
+
+# Board header word offset of the generation (creation time_ns)
+GENERATION = 4
+
+# Slot header word offsets
+SEQ, COUNT, EPOCH_NS, MONO_NS, N_COLS, PID = range(6)
+
+DEFAULT_BOARD_NAME = 'apl_latest'
+
+def board_layout(config):
+    """(region name, slot names, width) for a full sensor_config.json dict"""
+    board_config = config.get('board', {})
+    sensors = config.get('sensors', {})
+    slots = list(sensors)
+    width = max([len(s.get('column_names', [])) for s in sensors.values()] or [1])
+    width = int(board_config.get('width', width))
+    return board_config.get('name', DEFAULT_BOARD_NAME), slots, width
+
+def board_enabled(config):
+    return bool(config.get('board', {}).get('enabled', False))
+
+def publishes_to_board(sensor_config):
+    """Sensors that publish their rows (everything run through sensor_runner.py)"""
+    return sensor_config.get('script', 'sensor_runner.py') == 'sensor_runner.py'
+
+def numeric_row(sensor_config):
+    """
+    True if the board carries a sensor's whole row: every column after Timestamp
+    is a number under its "schema". Text columns would come back blank.
+    """
+    columns = sensor_config.get('column_names', [])[1:]
+    return bool(columns) and all(type_kind(t) != 'S' for t in column_types(columns, sensor_config.get('schema')))
+
+def to_float(value):
+    """Row field -> float64 value for the board (NaN if not a number)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def format_value(value):
+    """Board float -> CSV text ('' for NaN, no trailing .0 on whole numbers)"""
+    if value != value:  # NaN
+        return ''
+    return '%.10g' % value
+
+class LatestBoard:
+    """One shared-memory region with a fixed slot per sensor"""
+
+    def __init__(self, name, slot_names, width, create=False):
+        self.name = name
+        self.slot_names = list(slot_names)
+        self.width = int(width)
+        self.n_slots = len(self.slot_names)
+        self.slot_bytes = SLOT_HEADER_BYTES + self.width * 8
+        self.size = BOARD_HEADER_WORDS * 8 + self.n_slots * self.slot_bytes
+        self.owner = create
+
+        self.shm = self._open_shm(name, create, self.size)
+        self._buf = self.shm.buf
+        self._words = self._buf.cast('Q')
+        self._doubles = self._buf.cast('d')
+
+        if create:
+            self._init_layout()
+        else:
+            self._check_layout()
+
+    @staticmethod
+    def _open_shm(name, create, size):
+        # The resource tracker would unlink the region when *this* process exits,
+        # pulling it out from under every other sensor - the manager owns its lifetime
+        if _HAS_TRACK:
+            return shared_memory.SharedMemory(name=name, create=create, size=size if create else 0, track=False)
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+    @staticmethod
+    def _unlink_shm(shm):
+        if not _HAS_TRACK:
+            # unlink() unregisters from the tracker; register first so that matches up
+            resource_tracker.register(shm._name, 'shared_memory')
+        shm.unlink()
+
+    def _init_layout(self):
+        self._buf[:self.size] = bytes(self.size)
+        w = self._words
+        w[0], w[1], w[2], w[3] = MAGIC, LAYOUT_VERSION, self.n_slots, self.width
+        w[GENERATION] = time.time_ns()
+        for slot, slot_name in enumerate(self.slot_names):
+            off = self._slot_offset(slot)
+            name_off = off + SLOT_HEADER_WORDS * 8
+            encoded = slot_name.encode('utf-8')[:SLOT_NAME_BYTES]
+            self._buf[name_off:name_off + len(encoded)] = encoded
+            start = (off + SLOT_HEADER_BYTES) // 8
+            self._doubles[start:start + self.width] = array('d', [math.nan]) * self.width
+
+    def _check_layout(self):
+        w = self._words
+        if len(self._buf) < BOARD_HEADER_WORDS * 8 or w[0] != MAGIC or w[1] != LAYOUT_VERSION:
+            raise ValueError(f"Shared memory '{self.name}' is not a sensor board")
+        if w[2] != self.n_slots or w[3] != self.width or len(self._buf) < self.size:
+            raise ValueError(
+                f"Board '{self.name}' layout {w[2]}x{w[3]} does not match config {self.n_slots}x{self.width}"
+            )
+
+    @classmethod
+    def open(cls, config, create=None, fresh=False):
+        """Board for a full sensor_config.json dict (see open_layout)"""
+        name, slots, width = board_layout(config)
+        return cls.open_layout(name, slots, width, create=create, fresh=fresh)
+
+    @classmethod
+    def open_layout(cls, name, slots, width, create=None, fresh=False):
+        """
+        create=None attaches, creating the region if it doesn't exist.
+        fresh=True (the manager) replaces any stale region from an earlier run.
+        """
+        if fresh:
+            try:
+                old = cls._open_shm(name, False, 0)
+                old.close()
+                cls._unlink_shm(old)
+            except FileNotFoundError:
+                pass
+            return cls(name, slots, width, create=True)
+        if create is None:
+            try:
+                return cls(name, slots, width, create=False)
+            except FileNotFoundError:
+                try:
+                    return cls(name, slots, width, create=True)
+                except FileExistsError:
+                    return cls(name, slots, width, create=False)
+        return cls(name, slots, width, create=create)
+
+    @property
+    def generation(self):
+        return self._words[GENERATION]
+
+    def replaced(self):
+        """
+        True when the named region is gone or is no longer the one we mapped
+        (runall.py unlinked it and made a fresh board). Our mapping stays valid
+        but nobody publishes into it any more.
+        """
+        try:
+            shm = self._open_shm(self.name, False, 0)
+        except FileNotFoundError:
+            return True
+        try:
+            if len(shm.buf) < BOARD_HEADER_WORDS * 8:
+                return True
+            words = shm.buf.cast('Q')
+            generation = words[GENERATION]
+            words.release()
+        finally:
+            shm.close()
+        return generation != self.generation
+
+    def _slot_offset(self, slot):
+        return BOARD_HEADER_WORDS * 8 + slot * self.slot_bytes
+
+    def slot_index(self, slot_name):
+        return self.slot_names.index(slot_name)
+
+    def publish(self, slot, values, epoch_ns=None, mono_ns=None):
+        """Write one row of floats into a slot (seqlock write)"""
+        off = self._slot_offset(slot)
+        hdr = off // 8
+        start = (off + SLOT_HEADER_BYTES) // 8
+        n = min(len(values), self.width)
+        w = self._words
+
+        seq = w[hdr + SEQ]
+        w[hdr + SEQ] = seq + 1  # odd: write in progress
+        self._doubles[start:start + n] = array('d', values[:n])
+        if n < self.width:
+            self._doubles[start + n:start + self.width] = array('d', [math.nan]) * (self.width - n)
+        w[hdr + COUNT] += 1
+        w[hdr + EPOCH_NS] = time.time_ns() if epoch_ns is None else epoch_ns
+        w[hdr + MONO_NS] = time.monotonic_ns() if mono_ns is None else mono_ns
+        w[hdr + N_COLS] = n
+        w[hdr + PID] = os.getpid()
+        w[hdr + SEQ] = seq + 2  # even: consistent
+
+    def read(self, slot, retries=100):
+        """
+        Consistent snapshot of a slot:
+        {'count', 'epoch_ns', 'mono_ns', 'pid', 'values'} or None if never written / always busy
+        """
+        off = self._slot_offset(slot)
+        hdr = off // 8
+        start = (off + SLOT_HEADER_BYTES) // 8
+        w = self._words
+
+        for _ in range(retries):
+            seq1 = w[hdr + SEQ]
+            if seq1 & 1:
+                continue
+            count = w[hdr + COUNT]
+            epoch_ns = w[hdr + EPOCH_NS]
+            mono_ns = w[hdr + MONO_NS]
+            n_cols = w[hdr + N_COLS]
+            pid = w[hdr + PID]
+            values = self._doubles[start:start + n_cols].tolist()
+            if w[hdr + SEQ] == seq1:
+                if count == 0:
+                    return None
+                return {'count': count, 'epoch_ns': epoch_ns, 'mono_ns': mono_ns, 'pid': pid, 'values': values}
+        return None
+
+    def read_all(self):
+        """{slot name: snapshot} for every slot that has been written"""
+        snapshots = {}
+        for slot, slot_name in enumerate(self.slot_names):
+            snap = self.read(slot)
+            if snap:
+                snapshots[slot_name] = snap
+        return snapshots
+
+    def close(self):
+        # Drop our views before closing, or SharedMemory.close() raises BufferError
+        if getattr(self, 'shm', None) is None:
+            return
+        self._words.release()
+        self._doubles.release()
+        self._buf = None
+        self.shm.close()
+        self.shm = None
+
+    def __del__(self):
+        # Sensors just exit without closing; release the views so SharedMemory's own cleanup doesn't complain
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def unlink(self):
+        try:
+            shm = self._open_shm(self.name, False, 0)
+            shm.close()
+            self._unlink_shm(shm)
+        except FileNotFoundError:
+            pass
+
+class BoardFollower:
+    """
+    Reader-side board handle that survives runall.py restarts: attaches once the
+    board exists and, every check_interval seconds, reattaches if the region was
+    replaced. Callers use get() each pass; a changed .generation means slot
+    counts started over.
+    """
+
+    def __init__(self, config, check_interval=None, logger=None):
+        self.config = config
+        if check_interval is None:
+            check_interval = config.get('board', {}).get('check_interval', 5.0)
+        self.check_interval = float(check_interval)
+        self.logger = logger
+        self.board = None
+        self.generation = None
+        self._next_check = 0.0
+
+    def get(self, now=None):
+        """The current board, or None while there isn't one"""
+        now = time.monotonic() if now is None else now
+        if now < self._next_check:
+            return self.board
+        self._next_check = now + self.check_interval
+
+        if self.board is not None:
+            if not self.board.replaced():
+                return self.board
+            if self.logger:
+                self.logger.info(f"Board '{self.board.name}' was recreated, reattaching")
+            self.board.close()
+            self.board = None
+
+        try:
+            self.board = LatestBoard.open(self.config, create=False)
+            self.generation = self.board.generation
+            if self.logger:
+                self.logger.info(f"Attached to latest-value board '{self.board.name}'")
+        except (FileNotFoundError, ValueError) as e:
+            if self.logger:
+                self.logger.debug(f"Latest-value board not available: {e}")
+        return self.board
+
+    def close(self):
+        if self.board:
+            self.board.close()
+            self.board = None
+
+class BoardPublisher:
+    """Sensor-side handle: publishes parsed rows to this sensor's slot"""
+
+    def __init__(self, board, slot_name):
+        self.board = board
+        self.slot = board.slot_index(slot_name)
+
+    def publish_row(self, row, epoch_ns=None, mono_ns=None):
+        # Column 0 is the Timestamp string; the slot header carries the time instead
+        values = [math.nan] + [to_float(v) for v in row[1:]]
+        self.board.publish(self.slot, values, epoch_ns, mono_ns)
+
+def row_from_snapshot(snapshot, with_timestamp=True):
+    """Board snapshot -> CSV-style row of strings (Timestamp rebuilt from epoch_ns)"""
+    values = [format_value(v) for v in snapshot['values']]
+    if with_timestamp and values:
+        values[0] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot['epoch_ns'] / 1e9))
+    return values
@@ -0,0 +1,296 @@
+# raw_capture.py
+"""
+Raw byte capture ("black box") for serial and UDP sensors
+
+With "raw_capture": true in a sensor's "output" block (or the global one), every
+chunk the sensor receives is appended, before any parsing, to
+output/<sensor>/<sensor>_raw_<timestamp>.bin:
+
+    file header   b'APLRAW1\\n', u32 length, JSON {"sensor", "type", "created_ns", ...}
+    record        int64 rx_epoch_ns, int64 rx_mono_ns, u32 length, <length bytes>
+
+Records are packed straight into one preallocated buffer (no per-chunk objects or
+joins) and written with a single os.write when it fills or every flush_interval,
+so a capture costs a memcpy per chunk, not a syscall per line.
+
+Lines the parser rejected or mangled can then be re-run after the flight:
+
+    python raw_capture.py dump output/pom/pom_raw_20250101_120000.bin | head
+    python raw_capture.py reparse output/pom/pom_raw_20250101_120000.bin pom_fixed.csv
+
+reparse feeds every chunk through the sensor class's own line splitting and
+parse_data (with rx times from the capture), so fixing a parser and re-running
+regenerates the CSV exactly as the live code would have written it.
+"""
+
+import os
+import json
+import mmap
+import time
+import struct
+import signal
+import argparse
+
+MAGIC = b'APLRAW1\n'
+_LEN = struct.Struct('<I')
+RECORD = struct.Struct('<qqI')  # rx_epoch_ns, rx_mono_ns, payload length
+
+DEFAULT_BUFFER_BYTES = 1 << 20
+
+class RawCapture:
+    """Append-only length-prefixed chunk log with one big write buffer"""
+
+    def __init__(self, path, metadata=None, buffer_bytes=DEFAULT_BUFFER_BYTES, flush_interval=1.0,
+                 fsync_interval=0, logger=None):
+        self.path = path
+        self.logger = logger
+        self.flush_interval = float(flush_interval)
+        self.fsync_interval = float(fsync_interval)
+
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._buf = bytearray(max(int(buffer_bytes), RECORD.size + 1))
+        self._view = memoryview(self._buf)
+        self._used = 0
+
+        self.chunks = 0
+        self.bytes = 0
+        self._last_flush = time.monotonic()
+        self._last_fsync = self._last_flush
+
+        if os.fstat(self._fd).st_size == 0:
+            header = json.dumps({'created_ns': time.time_ns(), **(metadata or {})}).encode('utf-8')
+            os.write(self._fd, MAGIC + _LEN.pack(len(header)) + header)
+
+    def write(self, chunk, epoch_ns, mono_ns):
+        """Append one received chunk (bytes/bytearray/memoryview)"""
+        n = len(chunk)
+        need = RECORD.size + n
+        if self._used + need > len(self._buf):
+            self.flush()
+            if need > len(self._buf):
+                # Bigger than the whole buffer - hand both pieces to the kernel as they are
+                os.writev(self._fd, [RECORD.pack(epoch_ns, mono_ns, n), chunk])
+                self.chunks += 1
+                self.bytes += n
+                return
+        RECORD.pack_into(self._buf, self._used, epoch_ns, mono_ns, n)
+        start = self._used + RECORD.size
+        self._view[start:start + n] = chunk
+        self._used = start + n
+        self.chunks += 1
+        self.bytes += n
+
+    def maybe_flush(self, now=None):
+        if not self._used:
+            return False
+        now = time.monotonic() if now is None else now
+        if now - self._last_flush >= self.flush_interval:
+            self.flush(now=now)
+            return True
+        return False
+
+    def flush(self, sync=False, now=None):
+        if self._fd is None:
+            return
+        now = time.monotonic() if now is None else now
+        if self._used:
+            os.write(self._fd, self._view[:self._used])
+            self._used = 0
+        self._last_flush = now
+        if sync or (self.fsync_interval > 0 and now - self._last_fsync >= self.fsync_interval):
+            try:
+                os.fsync(self._fd)
+            except OSError as e:
+                if self.logger:
+                    self.logger.warning(f"fsync failed for {self.path}: {e}")
+            self._last_fsync = now
+
+    def close(self):
+        if self._fd is None:
+            return
+        try:
+            self.flush(sync=True)
+        finally:
+            self._view.release()
+            os.close(self._fd)
+            self._fd = None
+
+def read_header(path):
+    """The capture's JSON header dict"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a raw capture")
+        (n,) = _LEN.unpack(f.read(_LEN.size))
+        return json.loads(f.read(n).decode('utf-8'))
+
+def iter_records(path):
+    """Yield (rx_epoch_ns, rx_mono_ns, payload) - payload is a memoryview into the mapped file"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < len(MAGIC) + _LEN.size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a raw capture")
+            view = memoryview(mm)
+            try:
+                (n,) = _LEN.unpack_from(mm, len(MAGIC))
+                offset = len(MAGIC) + _LEN.size + n
+                while offset + RECORD.size <= size:
+                    epoch_ns, mono_ns, length = RECORD.unpack_from(mm, offset)
+                    offset += RECORD.size
+                    if offset + length > size:
+                        break  # truncated tail (power cut mid-write)
+                    payload = view[offset:offset + length]
+                    try:
+                        yield epoch_ns, mono_ns, payload
+                    finally:
+                        # Also runs if the caller stops early, so the mmap can close
+                        payload.release()
+                    offset += length
+            finally:
+                view.release()
+
+def read_records(path):
+    """([rx_epoch_ns], [rx_mono_ns], [payload bytes]) for a whole capture - one tight pass for bulk tools"""
+    epochs, monos, payloads = [], [], []
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < len(MAGIC) + _LEN.size:
+            return epochs, monos, payloads
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a raw capture")
+            (n,) = _LEN.unpack_from(mm, len(MAGIC))
+            offset = len(MAGIC) + _LEN.size + n
+            unpack = RECORD.unpack_from
+            while offset + RECORD.size <= size:
+                epoch_ns, mono_ns, length = unpack(mm, offset)
+                offset += RECORD.size
+                if offset + length > size:
+                    break
+                epochs.append(epoch_ns)
+                monos.append(mono_ns)
+                payloads.append(mm[offset:offset + length])
+                offset += length
+    return epochs, monos, payloads
+
+def capture_lines(path):
+    """All received text lines in a capture, in order (for replaying into the simulator)"""
+    if read_header(path).get('transport') == 'udp':
+        # Datagrams: one message per record
+        messages = (bytes(payload).decode('utf-8', errors='ignore').strip('\x00\r\n ')
+                    for _, _, payload in iter_records(path))
+        return [m for m in messages if m]
+    data = b''.join(bytes(payload) for _, _, payload in iter_records(path))
+    return [line.decode('utf-8', errors='ignore').rstrip('\r') for line in data.split(b'\n') if line.strip()]
+
+def capture_span(path):
+    """(first, last) rx_mono_ns of a capture, or None if it has no records"""
+    first = last = None
+    for _, mono_ns, _ in iter_records(path):
+        if first is None:
+            first = mono_ns
+        last = mono_ns
+    return (first, last) if first is not None else None
+
+def replay_config(config, sensor_name, fmt='csv'):
+    """Sensor config for offline use: no board, no device lookup, no raw capture, quiet logging"""
+    from sensor_runner import build_sensor_config
+
+    if sensor_name not in config.get('sensors', {}):
+        raise ValueError(f"Unknown sensor {sensor_name!r}")
+    sensor_config = build_sensor_config(config, sensor_name)
+    sensor_config.pop('board', None)
+    sensor_config['port'] = 'replay'  # no device discovery
+    sensor_config['logging'] = {'verbosity': 1, 'console': True, 'file': False}
+    sensor_config['output'] = {**sensor_config.get('output', {}), 'format': fmt, 'raw_capture': False,
+                             'writer_thread': False}
+    return sensor_config
+
+def replay_sensor(sensor_type, sensor_name, sensor_config):
+    """Sensor instance for offline parsing"""
+    from sensor_implementations import create_sensor
+
+    sensor = create_sensor(sensor_type, sensor_name, sensor_config)
+    # The constructor takes over SIGINT/SIGTERM for its run loop - we have none
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    return sensor
+
+def iter_parsed(sensor, capture_path):
+    """Rows the live sensor would have written for a capture, one parse_data call per line"""
+    for epoch_ns, mono_ns, chunk in iter_records(capture_path):
+        sensor.rx_epoch_ns, sensor.rx_mono_ns = epoch_ns, mono_ns
+        if sensor.batch_read:
+            lines = sensor.split_lines(bytes(chunk))
+        else:
+            # readline() path: every record is one line
+            line = bytes(chunk).decode('utf-8', errors='ignore').strip()
+            lines = [line] if line else []
+        for line in lines:
+            if not sensor.accept_line(line):
+                continue
+            parsed = sensor.parse_data(line)
+            if sensor.is_valid_data(parsed):
+                yield sensor.finish_row(parsed)
+
+def reparse(capture_path, config_file='sensor_config.json', sensor_name=None, out_path=None, fmt='csv'):
+    """
+    Re-run a sensor class's parser over a capture and write fresh rows.
+    Returns (rows written, output path).
+    """
+    # Imported here: generic_sensor imports this module for RawCapture
+    from sensor_writers import create_writer
+    from field_schema import output_columns
+
+    header = read_header(capture_path)
+    sensor_name = sensor_name or header.get('sensor')
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+    sensor_config = replay_config(config, sensor_name, fmt)
+
+    sensor = replay_sensor(header.get('type', sensor_config['type']), sensor_name, sensor_config)
+    if out_path is None:
+        out_path = reparsed_path(capture_path)
+    writer = create_writer(out_path, output_columns(sensor_config), sensor_config, sensor.logger)
+
+    rows = 0
+    try:
+        for row in iter_parsed(sensor, capture_path):
+            writer.writerow(row)
+            rows += 1
+    finally:
+        writer.close()
+    return rows, out_path
+
+def reparsed_path(capture_path):
+    """output/x/x_raw_<ts>.bin -> output/x/x_reparsed_<ts>.csv"""
+    return os.path.splitext(capture_path)[0].replace('_raw_', '_reparsed_') + '.csv'
+
+def main():
+    parser = argparse.ArgumentParser(description='Raw sensor capture tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    dump = sub.add_parser('dump', help='Print the records of a capture')
+    dump.add_argument('capture', help='Path to a *_raw_*.bin file')
+
+    rep = sub.add_parser('reparse', help="Re-run the sensor's parse_data over a capture")
+    rep.add_argument('capture', help='Path to a *_raw_*.bin file')
+    rep.add_argument('output', nargs='?', help='Output CSV (default: <name>_reparsed_<timestamp>.csv)')
+    rep.add_argument('--config', default='sensor_config.json', help='Path to sensor configuration file')
+    rep.add_argument('--sensor', help='Sensor name (default: from the capture header)')
+    rep.add_argument('--format', default='csv', help='Output format(s), e.g. csv or hdf5')
+
+    args = parser.parse_args()
+    if args.command == 'dump':
+        print(json.dumps(read_header(args.capture)))
+        for epoch_ns, mono_ns, payload in iter_records(args.capture):
+            print(f"{epoch_ns} {mono_ns} {len(payload)} {bytes(payload)!r}")
+    elif args.command == 'reparse':
+        fmt = args.format.split(',') if ',' in args.format else args.format
+        rows, out = reparse(args.capture, args.config, args.sensor, args.output, fmt)
+        print(f"Re-parsed {rows} rows -> {out}")
+
+if __name__ == "__main__":
+    main()
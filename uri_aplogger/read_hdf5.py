@@ -1,12 +1,217 @@
 # read_spectro_hdf5.py
 """
 Read and analyze HDF5 spectrometer data
+
+SpectraFile reads a spectro_full_*.h5 file out of core, so a full day of spectra
+can be analysed on a laptop without loading the intensities:
+
+    with SpectraFile(filename) as sf:
+        rows = sf.time_rows('2025-01-01T12:00', '2025-01-01T12:30')
+        pixels = sf.pixel_range(650, 665)
+        for idx, times, block in sf.iter_blocks(pixels=pixels, rows=rows):
+            ...                                  # block: (len(idx), pixels) float32 counts
+
+Blocks are whole HDF5 chunks (block_rows is a multiple of the file's chunk rows),
+so each chunk is read and decompressed once. Only the time index is kept in
+memory - epoch_ns (or, in files without it, the timestamps parsed to
+datetime64[us] in one vectorized pass), 8 bytes per spectrum. Rows past
+n_spectra (a file still being written) are never read; live=True opens a
+growing file in SWMR mode.
+
+Times are wall clock, which can step backwards mid-flight (NTP/GPS fixing the
+Pi's clock after boot). The index is checked once: if it only goes forward,
+time windows are a binary search, otherwise every row is compared, so a window
+is never silently wrong. Window bounds are in the timestamps column's clock
+(local time) or int epoch_ns.
 """
 
+import logging
+
 import h5py
 import numpy as np
-import matplotlib.pyplot as plt
-from datetime import datetime
+
+from spectra_store import intensity_decoder, open_live, refresh_live, valid_rows
+
+logger = logging.getLogger(__name__)
+
+# Rows per block are rounded to whole chunks under this many bytes of float32
+DEFAULT_BLOCK_BYTES = 32 * 1024 * 1024
+
+def parse_timestamps(raw):
+    """ISO timestamp strings/bytes (fixed-length or vlen) to datetime64[us]"""
+    raw = np.asarray(raw)
+    if raw.dtype.kind == 'O':
+        raw = raw.astype('S32')
+    return raw.astype('U32').astype('datetime64[us]')
+
+def to_datetime64(value):
+    if value is None or isinstance(value, np.datetime64):
+        return value
+    return np.datetime64(value, 'us')
+
+class SpectraFile:
+    """Chunk-aligned, bounded-memory reader for a spectrometer HDF5 file"""
+
+    def __init__(self, filename, live=False, block_bytes=DEFAULT_BLOCK_BYTES):
+        self.filename = filename
+        self.f = open_live(filename) if live else self._open(filename)
+        self.intensities = self.f['intensities']
+        self.wavelengths = self.f['wavelengths'][:]
+        self.num_pixels = len(self.wavelengths)
+        self.n = valid_rows(self.f)
+        self.decode = intensity_decoder(self.f)
+
+        chunk_rows = self.intensities.chunks[0] if self.intensities.chunks else 1
+        per_chunk = chunk_rows * self.num_pixels * 4
+        self.block_rows = chunk_rows * max(1, block_bytes // per_chunk)
+        self._times = None
+        self._keys = None
+        self._offset_us = None
+        self.monotonic = True
+
+    @staticmethod
+    def _open(filename):
+        """Plain read-only open; a file whose writer died mid-flight is still flagged
+        open-for-write, which only a SWMR reader accepts"""
+        try:
+            return h5py.File(filename, 'r')
+        except OSError:
+            return open_live(filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+    def refresh(self):
+        """Live files: pick up spectra flushed since opening; returns the new row count"""
+        refresh_live(self.f)
+        self.n = valid_rows(self.f)
+        return self.n
+
+    def times(self):
+        """datetime64[us] of every valid spectrum, parsed once in blocks"""
+        if self._times is None or len(self._times) != self.n:
+            timestamps = self.f['timestamps']
+            times = np.empty(self.n, dtype='datetime64[us]')
+            for start in range(0, self.n, self.block_rows * 16):
+                stop = min(start + self.block_rows * 16, self.n)
+                times[start:stop] = parse_timestamps(timestamps[start:stop])
+            self._times = times
+        return self._times
+
+    def time_keys(self):
+        """
+        int64 ns per spectrum used for time windows: epoch_ns when the file has it,
+        else the parsed timestamps. Also sets self.monotonic (checked once).
+        """
+        if self._keys is None or len(self._keys) != self.n:
+            if 'epoch_ns' in self.f:
+                keys = self.f['epoch_ns'][:self.n].astype(np.int64)
+                # The timestamps column is local(epoch_ns); its offset converts window bounds
+                times_us = self.times().astype(np.int64)
+                self._offset_us = int(np.median(times_us - keys // 1000)) if self.n else 0
+            else:
+                keys = self.times().astype('datetime64[ns]').astype(np.int64)
+                self._offset_us = None
+            self._keys = keys
+            self.monotonic = bool(np.all(keys[1:] >= keys[:-1]))
+            if not self.monotonic:
+                logger.warning(f"{self.filename}: clock stepped backwards during recording - "
+                               f"time windows use a full scan instead of a binary search")
+        return self._keys
+
+    def to_key(self, value):
+        """Window bound -> time key: ints are epoch ns, anything else is in the timestamps' clock"""
+        if isinstance(value, (int, np.integer)):
+            return int(value)
+        t = to_datetime64(value).astype(np.int64)
+        if self._offset_us is not None:
+            return (t - self._offset_us) * 1000
+        return t * 1000
+
+    def time_rows(self, start=None, end=None):
+        """Sorted row indices of spectra with start <= time < end"""
+        keys = self.time_keys()
+        lo = None if start is None else self.to_key(start)
+        hi = None if end is None else self.to_key(end)
+        if self.monotonic:
+            i0 = 0 if lo is None else int(np.searchsorted(keys, lo, 'left'))
+            i1 = self.n if hi is None else int(np.searchsorted(keys, hi, 'left'))
+            return np.arange(i0, max(i0, i1))
+        mask = np.ones(self.n, dtype=bool)
+        if lo is not None:
+            mask &= keys >= lo
+        if hi is not None:
+            mask &= keys < hi
+        return np.flatnonzero(mask)
+
+    def time_range(self, start=None, end=None):
+        """
+        Row span (i0, i1) from the first to the last spectrum in the window. Only
+        every row in it is in the window when self.monotonic - otherwise use time_rows.
+        """
+        rows = self.time_rows(start, end)
+        return (int(rows[0]), int(rows[-1]) + 1) if len(rows) else (0, 0)
+
+    def pixel_range(self, lo_nm=None, hi_nm=None):
+        """Pixel slice covering wavelengths lo_nm <= w <= hi_nm"""
+        p0 = 0 if lo_nm is None else int(np.searchsorted(self.wavelengths, lo_nm, 'left'))
+        p1 = self.num_pixels if hi_nm is None else int(np.searchsorted(self.wavelengths, hi_nm, 'right'))
+        return slice(p0, max(p0, p1))
+
+    def iter_blocks(self, start=0, stop=None, pixels=slice(None), rows=None):
+        """
+        Yield (row indices, times, intensities) in chunk-aligned blocks for rows
+        start:stop, or for a sorted array of rows (e.g. from time_rows).
+        Intensities are decoded float32 counts of the selected pixels.
+        """
+        if rows is None:
+            stop = self.n if stop is None else min(stop, self.n)
+            rows = np.arange(start, max(start, stop))
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[rows < self.n]
+        times = self.times()
+        i = 0
+        while i < len(rows):
+            # Rows up to the next block boundary, so reads never split a chunk
+            boundary = (rows[i] // self.block_rows + 1) * self.block_rows
+            j = int(np.searchsorted(rows, boundary, 'left'))
+            idx = rows[i:j]
+            first, last = int(idx[0]), int(idx[-1])
+            raw = self.intensities[first:last + 1, pixels]
+            if last - first + 1 != len(idx):
+                raw = raw[idx - first]
+            yield idx, times[idx], self.decode(raw, pixels)
+            i = j
+
+    def window(self, start=None, end=None, lo_nm=None, hi_nm=None):
+        """(times, wavelengths, intensities) for a time window and wavelength band"""
+        rows = self.time_rows(start, end)
+        pixels = self.pixel_range(lo_nm, hi_nm)
+        out = np.empty((len(rows), pixels.stop - pixels.start), dtype=np.float32)
+        pos = 0
+        for idx, _, block in self.iter_blocks(pixels=pixels, rows=rows):
+            out[pos:pos + len(idx)] = block
+            pos += len(idx)
+        return self.times()[rows], self.wavelengths[pixels], out
+
+    def band_series(self, lo_nm=None, hi_nm=None, start=None, end=None):
+        """(times, mean intensity over lo_nm..hi_nm) per spectrum, computed block by block"""
+        rows = self.time_rows(start, end)
+        pixels = self.pixel_range(lo_nm, hi_nm)
+        series = np.empty(len(rows), dtype=np.float64)
+        pos = 0
+        for idx, _, block in self.iter_blocks(pixels=pixels, rows=rows):
+            series[pos:pos + len(idx)] = block.mean(axis=1)
+            pos += len(idx)
+        return self.times()[rows], series
 
 def inspect_hdf5_file(filename):
     """Inspect HDF5 file structure"""
@@ -28,10 +233,15 @@ def inspect_hdf5_file(filename):
 
 def plot_spectrum(filename, spectrum_index=0):
     """Plot a specific spectrum from the HDF5 file"""
+    # Imported here so SpectraFile works on headless boxes without matplotlib
+    import matplotlib.pyplot as plt
+
     with h5py.File(filename, 'r') as f:
         wavelengths = f['wavelengths'][:]
-        intensities = f['intensities'][spectrum_index, :]
+        intensities = intensity_decoder(f)(f['intensities'][spectrum_index, :])
         timestamp = f['timestamps'][spectrum_index]
+        if isinstance(timestamp, bytes):
+            timestamp = timestamp.decode()
         
         plt.figure(figsize=(10, 6))
         plt.plot(wavelengths, intensities)
@@ -45,20 +255,19 @@ def plot_spectrum(filename, spectrum_index=0):
         print(f"  Time: {timestamp}")
         print(f"  Max intensity: {intensities.max():.0f} at {wavelengths[intensities.argmax()]:.1f} nm")
 
-def extract_time_series(filename, wavelength_index=1000):
+def extract_time_series(filename, wavelength_index=1000, start=None, end=None):
     """Extract intensity time series at a specific wavelength"""
-    with h5py.File(filename, 'r') as f:
-        wavelengths = f['wavelengths'][:]
-        intensities = f['intensities'][:, wavelength_index]
-        timestamps = f['timestamps'][:]
-        
-        # Convert timestamps to datetime objects
-        times = [datetime.fromisoformat(ts.decode() if isinstance(ts, bytes) else ts) 
-                for ts in timestamps]
-        
+    import matplotlib.pyplot as plt
+
+    with SpectraFile(filename) as sf:
+        pixel = slice(wavelength_index, wavelength_index + 1)
+        rows = sf.time_rows(start, end)
+        intensities = np.concatenate([block[:, 0] for _, _, block in sf.iter_blocks(pixels=pixel, rows=rows)] or [[]])
+        times = sf.times()[rows]
+
         plt.figure(figsize=(10, 6))
         plt.plot(times, intensities)
-        plt.title(f"Intensity at {wavelengths[wavelength_index]:.1f} nm over time")
+        plt.title(f"Intensity at {sf.wavelengths[wavelength_index]:.1f} nm over time")
         plt.xlabel("Time")
         plt.ylabel("Intensity")
         plt.grid(True)
@@ -66,27 +275,30 @@ def extract_time_series(filename, wavelength_index=1000):
         plt.tight_layout()
         plt.show()
 
-def export_to_csv(filename, output_csv, max_spectra=100):
-    """Export a subset of data to CSV"""
-    with h5py.File(filename, 'r') as f:
-        wavelengths = f['wavelengths'][:]
-        intensities = f['intensities'][:max_spectra, :]
-        timestamps = f['timestamps'][:max_spectra]
-        
+def export_to_csv(filename, output_csv, max_spectra=100, start=None, end=None, lo_nm=None, hi_nm=None):
+    """Export a subset of data to CSV (max_spectra=None for the whole time window)"""
+    import io
+
+    with SpectraFile(filename) as sf:
+        rows = sf.time_rows(start, end)
+        if max_spectra is not None:
+            rows = rows[:max_spectra]
+        pixels = sf.pixel_range(lo_nm, hi_nm)
+
         # Create header
-        header = ['timestamp'] + [f'wavelength_{i}_{w:.2f}' for i, w in enumerate(wavelengths)]
-        
-        # Write to CSV
-        import csv
+        header = ['timestamp'] + [f'wavelength_{i}_{w:.2f}' for i, w in
+                                  enumerate(sf.wavelengths[pixels], start=pixels.start)]
+
+        # Write to CSV a block at a time - numpy formats the numbers, we only prefix the time
         with open(output_csv, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(header)
-            
-            for i, (ts, intensity_row) in enumerate(zip(timestamps, intensities)):
-                row = [ts] + list(intensity_row)
-                writer.writerow(row)
-        
-        print(f"Exported {len(intensities)} spectra to {output_csv}")
+            csvfile.write(','.join(header) + '\n')
+            for _, times, block in sf.iter_blocks(pixels=pixels, rows=rows):
+                buf = io.StringIO()
+                np.savetxt(buf, block, fmt='%.7g', delimiter=',')
+                stamps = np.datetime_as_string(times, unit='us')
+                csvfile.writelines(f"{ts},{line}\n" for ts, line in zip(stamps, buf.getvalue().splitlines()))
+
+        print(f"Exported {len(rows)} spectra to {output_csv}")
 
 if __name__ == "__main__":
     # Example usage
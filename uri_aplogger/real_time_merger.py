@@ -1,39 +1,87 @@
 # real_time_merger.py
 """
 Real-time data merger that continuously monitors and merges the latest data from all sensors
+
+Two modes (merger.mode in sensor_config.json, or --mode):
+  latest - every cycle, the newest row of each sensor that sent something (blank otherwise)
+  grid   - rows on a fixed clock (merger.grid_interval, e.g. 1.0 or 0.1 s). Each sensor keeps
+           a short time-indexed ring buffer and every output column is filled by "previous",
+           "nearest" or "linear" interpolation, ignoring samples older than max_staleness.
+           Rows are emitted grid_delay seconds behind real time so "linear" has the sample
+           after each grid point.
+
+interpolation / max_staleness are looked up by merged column name ("trisonica_U_Vector"),
+then sensor name ("trisonica"), then "*":
+    "interpolation": {"*": "previous", "trisonica": "linear", "imet_date": "nearest"},
+    "max_staleness": {"*": 5, "pom": 15}
+Non-numeric values always fall back to previous/nearest. Grid times come from each
+row's rx_epoch_ns (receive time, ns) when the sensor writes it, else its Timestamp.
+
+Sensors are read from their CSVs by default (merger.source / --source: files). The
+shared-memory latest-value board (latest_board.py) only holds the newest row and
+only numbers, so "board" reads just the sensors whose columns are all numeric from
+it and everything else from files; "auto" does the same when the board is enabled
+and the mode is latest (grid needs every sample). Board reads go through a
+BoardFollower, so a board recreated by a runall restart is picked up.
 """
 
 import csv
+import math
 import time
 import json
-import glob
 import os
 import logging
+from bisect import bisect_right
 from datetime import datetime, timedelta
 from pathlib import Path
 import threading
 from collections import defaultdict
 
+from file_tail import FileTailer
+from latest_board import BoardFollower, board_enabled, numeric_row, publishes_to_board, row_from_snapshot
+from field_schema import RX_TIME_COLUMNS, has_rx_time, output_columns
+
+INTERPOLATION_METHODS = ('previous', 'nearest', 'linear')
+
 class RealTimeMerger:
-    def __init__(self, config_file='sensor_config.json', output_interval=1.0):
+    def __init__(self, config_file='sensor_config.json', output_interval=1.0, use_inotify=True, mode=None,
+                 source=None):
         """
         Initialize the real-time merger
         
         Args:
             config_file: Path to sensor configuration file
             output_interval: How often to output merged data (seconds)
+            use_inotify: Follow sensor files with inotify (False = glob polling every cycle)
+            mode: 'latest' or 'grid' (default: merger.mode from config, else 'latest')
+            source: 'files', 'board' or 'auto' (default: merger.source from config, else 'files')
         """
         self.config = self.load_config(config_file)
         self.output_interval = output_interval
+        self.use_inotify = use_inotify
         self.running = True
+
+        merger_config = self.config.get('merger', {})
+        self.mode = mode or merger_config.get('mode', 'latest')
+        self.source = source or merger_config.get('source', 'files')
+        self.grid_interval = float(merger_config.get('grid_interval', output_interval))
+        self.grid_delay = float(merger_config.get('grid_delay', 2.0))
+        self.buffer_seconds = float(merger_config.get('buffer_seconds', 60.0))
+        self.interpolation = merger_config.get('interpolation', {})
+        self.max_staleness = merger_config.get('max_staleness', {'*': 5.0})
         
         # File tracking for each sensor
         self.sensor_files = {}
-        self.sensor_handles = {}
-        self.sensor_positions = {}
         self.latest_data = {}
         self.last_read_times = {}
         self.has_new_data = {}
+
+        # Sensors read from the shared-memory board: name -> slot, last seen count.
+        # self.board is a BoardFollower; slots are looked up again for each new board.
+        self.board = None
+        self.board_generation = None
+        self.board_slots = {}
+        self.board_counts = {}
         
         # Set up merged output
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -41,6 +89,8 @@ class RealTimeMerger:
         
         self.setup_logging()
         self.initialize_sensor_tracking()
+        if self.mode == 'grid':
+            self.initialize_grid()
         
     def setup_logging(self):
         """Setup logging configuration"""
@@ -63,10 +113,38 @@ class RealTimeMerger:
             print(f"Error loading config: {e}")
             return {'sensors': {}}
     
+    def setup_board(self):
+        """BoardFollower on the latest-value board (None if not in use)"""
+        if self.source == 'files':
+            return None
+        if self.source == 'auto' and (not board_enabled(self.config) or self.mode == 'grid'):
+            return None
+        follower = BoardFollower(self.config, logger=self.logger)
+        if follower.get() is None:
+            if self.source == 'board':
+                raise FileNotFoundError("Latest-value board is not available")
+            self.logger.warning("Latest-value board not available, reading sensor files")
+            return None
+        return follower
+
     def initialize_sensor_tracking(self):
         """Initialize tracking for all enabled sensors"""
+        self.tailer = FileTailer(use_inotify=self.use_inotify, logger=self.logger)
+        self.board = self.setup_board()
         for sensor_name, sensor_config in self.config['sensors'].items():
             if sensor_config.get('enabled', True):
+                self.latest_data[sensor_name] = None
+                self.has_new_data[sensor_name] = False  # Initialize as False
+                self.last_read_times[sensor_name] = datetime.now()
+
+                if self.board and publishes_to_board(sensor_config):
+                    if numeric_row(sensor_config):
+                        self.board_slots[sensor_name] = None
+                        self.board_counts[sensor_name] = 0
+                        self.logger.info(f"Tracking {sensor_name} via shared-memory board")
+                        continue
+                    self.logger.info(f"{sensor_name} has text columns, reading it from its file")
+
                 # Determine file pattern based on sensor type
                 if sensor_name == 'spectro':
                     pattern = sensor_config.get('output_file_pattern', 'output/spectro/spectro_data_*.csv')
@@ -74,98 +152,63 @@ class RealTimeMerger:
                     pattern = f'output/{sensor_name}/{sensor_name}_data_*.csv'
                 
                 self.sensor_files[sensor_name] = pattern
-                self.latest_data[sensor_name] = None
-                self.has_new_data[sensor_name] = False  # Initialize as False
-                self.last_read_times[sensor_name] = datetime.now()
+                self.tailer.add(sensor_name, pattern)
                 self.logger.info(f"Tracking {sensor_name} with pattern: {pattern}")
+        self.logger.info(f"Following sensor files via {self.tailer.mode}")
     
-    def find_latest_file(self, pattern):
-        """Find the latest file matching the pattern"""
-        try:
-            files = glob.glob(pattern)
-            if not files:
-                return None
-            # Get the most recently modified file
-            latest_file = max(files, key=os.path.getmtime)
-            return latest_file
-        except Exception as e:
-            self.logger.error(f"Error finding files for pattern {pattern}: {e}")
-            return None
-    
-    def read_new_lines(self, sensor_name, file_path):
-        """Read new lines from a sensor file since last read"""
-        new_data = []
-        
+    def update_sensor_data(self):
+        """Update data from all sensors (only files with appended bytes are read)"""
         try:
-            # If we haven't read this file before, start from the beginning
-            if sensor_name not in self.sensor_positions or self.sensor_positions[sensor_name].get('file') != file_path:
-                self.sensor_positions[sensor_name] = {'file': file_path, 'position': 0}
-            
-            position = self.sensor_positions[sensor_name]['position']
-            
-            with open(file_path, 'r') as f:
-                # Move to last known position
-                f.seek(0, 2)  # Go to end to check file size
-                file_size = f.tell()
-                
-                if position > file_size:
-                    # File was probably rotated/truncated, start from beginning
-                    position = 0
-                
-                f.seek(position)
-                
-                reader = csv.reader(f)
-                try:
-                    # Skip header if we're at position 0
-                    if position == 0:
-                        next(reader, None)
-                    
-                    for row in reader:
-                        if row:  # Skip empty rows
-                            new_data.append(row)
-                    
-                    # Update position
-                    self.sensor_positions[sensor_name]['position'] = f.tell()
-                    
-                except StopIteration:
-                    pass
-                    
+            new_rows = self.tailer.read_new_rows()
         except Exception as e:
-            self.logger.error(f"Error reading {sensor_name} file: {e}")
-        
-        return new_data
-    
-    def update_sensor_data(self):
-        """Update data from all sensors"""
-        for sensor_name, pattern in self.sensor_files.items():
-            try:
-                # Find the latest file
-                latest_file = self.find_latest_file(pattern)
-                if not latest_file:
-                    continue
-                
-                # Read new data
-                new_lines = self.read_new_lines(sensor_name, latest_file)
+            self.logger.error(f"Error reading sensor files: {e}")
+            new_rows = {}
+
+        if self.board:
+            new_rows.update(self.read_board_rows())
+
+        for sensor_name in self.latest_data:
+            new_lines = new_rows.get(sensor_name)
+            if new_lines:
+                # Store the latest data point
+                self.latest_data[sensor_name] = new_lines[-1]
+                self.last_read_times[sensor_name] = datetime.now()
                 
-                if new_lines:
-                    # Store the latest data point
-                    self.latest_data[sensor_name] = new_lines[-1]
-                    self.last_read_times[sensor_name] = datetime.now()
+                # Log if we got multiple new lines
+                if len(new_lines) > 1:
+                    self.logger.debug("Got %d new lines from %s", len(new_lines), sensor_name)
                     
-                    # Log if we got multiple new lines
-                    if len(new_lines) > 1:
-                        self.logger.debug(f"Got {len(new_lines)} new lines from {sensor_name}")
-                        
-                    # IMPORTANT: Mark that this sensor has new data for this cycle
-                    self.has_new_data[sensor_name] = True
-                else:
-                    # No new data for this sensor
-                    self.has_new_data[sensor_name] = False
-                        
-            except Exception as e:
-                self.logger.error(f"Error updating {sensor_name}: {e}")
+                # IMPORTANT: Mark that this sensor has new data for this cycle
+                self.has_new_data[sensor_name] = True
+
+                if self.mode == 'grid':
+                    self.buffer_rows(sensor_name, new_lines)
+            else:
+                # No new data for this sensor
                 self.has_new_data[sensor_name] = False
 
+    def read_board_rows(self):
+        """{sensor: [latest row]} for board sensors that published since the last cycle"""
+        board = self.board.get()
+        if board is None:
+            return {}
+        if self.board_generation != self.board.generation:
+            # New board (runall restarted): slot counts started over
+            self.board_generation = self.board.generation
+            self.board_slots = {name: board.slot_index(name) for name in self.board_slots}
+            self.board_counts = dict.fromkeys(self.board_counts, 0)
+        rows = {}
+        for sensor_name, slot in self.board_slots.items():
+            snapshot = board.read(slot)
+            if not snapshot or snapshot['count'] == self.board_counts[sensor_name]:
+                continue
+            self.board_counts[sensor_name] = snapshot['count']
+            row = row_from_snapshot(snapshot)
+            if has_rx_time(self.config['sensors'][sensor_name]):
+                row += [str(snapshot['epoch_ns']), str(snapshot['mono_ns'])]
+            rows[sensor_name] = [row]
+        return rows
+
     def create_merged_row(self):
         """Create a merged row from the latest data of all sensors"""
         merged_row = {
@@ -178,7 +221,7 @@ class RealTimeMerger:
             if data and self.has_new_data.get(sensor_name, False):
                 # Add sensor name prefix to each column
                 config = self.config['sensors'][sensor_name]
-                column_names = config.get('column_names', [])
+                column_names = output_columns(config)
                 
                 # Create dictionary of column name -> value
                 if len(data) == len(column_names):
@@ -194,7 +237,7 @@ class RealTimeMerger:
             else:
                 # No new data from this sensor - leave columns blank
                 config = self.config['sensors'][sensor_name]
-                column_names = config.get('column_names', [])
+                column_names = output_columns(config)
                 
                 # Add blank columns for this sensor
                 for col_name in column_names:
@@ -202,13 +245,170 @@ class RealTimeMerger:
         
         return merged_row
     
+    # --- grid mode ---
+
+    def _lookup(self, table, sensor_name, col_name, default):
+        """Per-column setting: full merged name, then sensor name, then '*'"""
+        if not isinstance(table, dict):
+            return table
+        for key in (f'{sensor_name}_{col_name}', sensor_name, '*'):
+            if key in table:
+                return table[key]
+        return default
+
+    def initialize_grid(self):
+        """Per-sensor ring buffers and per-column interpolation settings"""
+        self.ring_times = {}
+        self.ring_rows = {}
+        self.column_methods = {}
+        self.column_staleness = {}
+        self._ts_cache = (None, None)
+        self.rx_index = {}
+
+        for sensor_name in self.latest_data:
+            column_names = output_columns(self.config['sensors'][sensor_name])
+            if RX_TIME_COLUMNS[0] in column_names:
+                self.rx_index[sensor_name] = column_names.index(RX_TIME_COLUMNS[0])
+            self.ring_times[sensor_name] = []
+            self.ring_rows[sensor_name] = []
+
+            methods = []
+            for col_name in column_names:
+                if col_name in RX_TIME_COLUMNS:
+                    # Receive time of the sample actually used - never interpolated
+                    methods.append('previous')
+                    continue
+                method = self._lookup(self.interpolation, sensor_name, col_name, 'previous')
+                if method not in INTERPOLATION_METHODS:
+                    self.logger.warning(f"Unknown interpolation '{method}' for {sensor_name}_{col_name}, using previous")
+                    method = 'previous'
+                methods.append(method)
+            self.column_methods[sensor_name] = methods
+            self.column_staleness[sensor_name] = [
+                float(self._lookup(self.max_staleness, sensor_name, col_name, 5.0)) for col_name in column_names
+            ]
+
+        now = time.time()
+        self.next_grid_time = math.floor((now - self.grid_delay) / self.grid_interval + 1) * self.grid_interval
+        self.logger.info(
+            f"Grid merge: every {self.grid_interval}s, {self.grid_delay}s behind real time, "
+            f"buffering {self.buffer_seconds}s per sensor"
+        )
+
+    def row_time(self, sensor_name, row):
+        """Sample time (epoch seconds) of a sensor row: rx_epoch_ns if present, else Timestamp"""
+        if not row:
+            return None
+        idx = self.rx_index.get(sensor_name)
+        if idx is not None and idx < len(row) and row[idx]:
+            try:
+                return int(row[idx]) / 1e9
+            except ValueError:
+                pass
+        stamp = row[0]
+        # Consecutive rows mostly share a timestamp string - parse each one once
+        if stamp == self._ts_cache[0]:
+            return self._ts_cache[1]
+        try:
+            t = datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S").timestamp()
+        except (ValueError, TypeError):
+            return None
+        self._ts_cache = (stamp, t)
+        return t
+
+    def buffer_rows(self, sensor_name, rows):
+        """Add rows to the sensor's ring buffer and drop what's older than buffer_seconds"""
+        times = self.ring_times[sensor_name]
+        buffered = self.ring_rows[sensor_name]
+        for row in rows:
+            t = self.row_time(sensor_name, row)
+            if t is None:
+                continue
+            if times and t < times[-1]:
+                # Out of order (clock step) - keep the buffer sorted
+                idx = bisect_right(times, t)
+                times.insert(idx, t)
+                buffered.insert(idx, row)
+            else:
+                times.append(t)
+                buffered.append(row)
+
+        cutoff = time.time() - self.buffer_seconds
+        drop = bisect_right(times, cutoff)
+        if drop:
+            del times[:drop]
+            del buffered[:drop]
+
+    def value_at(self, sensor_name, col_idx, t):
+        """Interpolated value of one column at time t ('' if nothing fresh enough)"""
+        times = self.ring_times[sensor_name]
+        rows = self.ring_rows[sensor_name]
+        if not times:
+            return ''
+        method = self.column_methods[sensor_name][col_idx]
+        staleness = self.column_staleness[sensor_name][col_idx]
+
+        idx = bisect_right(times, t)
+        before = idx - 1 if idx > 0 else None
+        after = idx if idx < len(times) else None
+
+        def value(i):
+            row = rows[i]
+            return row[col_idx] if col_idx < len(row) else ''
+
+        # A sample exactly on the grid point is used as-is
+        if before is not None and times[before] == t:
+            return value(before)
+
+        if method == 'linear' and before is not None and after is not None:
+            t0, t1 = times[before], times[after]
+            if t - t0 <= staleness and t1 - t <= staleness and t1 > t0:
+                try:
+                    v0, v1 = float(value(before)), float(value(after))
+                    return '%.10g' % (v0 + (v1 - v0) * (t - t0) / (t1 - t0))
+                except (ValueError, TypeError):
+                    pass  # not numeric - fall through to previous
+
+        if method == 'nearest':
+            candidates = [i for i in (before, after) if i is not None]
+            best = min(candidates, key=lambda i: abs(times[i] - t))
+            return value(best) if abs(times[best] - t) <= staleness else ''
+
+        # previous (and linear without a bracketing pair)
+        if before is not None and t - times[before] <= staleness:
+            return value(before)
+        return ''
+
+    def create_grid_row(self, t):
+        """Merged row for grid time t"""
+        if self.grid_interval < 1:
+            stamp = datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        else:
+            stamp = datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S")
+        merged_row = {'merge_timestamp': stamp}
+
+        for sensor_name in self.latest_data:
+            column_names = output_columns(self.config['sensors'][sensor_name])
+            for i, col_name in enumerate(column_names):
+                merged_row[f'{sensor_name}_{col_name}'] = self.value_at(sensor_name, i, t)
+        return merged_row
+
+    def due_grid_times(self):
+        """Grid times that are now grid_delay in the past"""
+        horizon = time.time() - self.grid_delay
+        due = []
+        while self.next_grid_time <= horizon:
+            due.append(self.next_grid_time)
+            self.next_grid_time += self.grid_interval
+        return due
+
     def get_merged_headers(self):
         """Generate headers for the merged CSV file"""
         headers = ['merge_timestamp']
         
         for sensor_name, sensor_config in self.config['sensors'].items():
             if sensor_config.get('enabled', True):
-                column_names = sensor_config.get('column_names', [])
+                column_names = output_columns(sensor_config)
                 for col_name in column_names:
                     headers.append(f'{sensor_name}_{col_name}')
         
@@ -234,6 +434,14 @@ class RealTimeMerger:
                 try:
                     # Update data from all sensors
                     self.update_sensor_data()
+
+                    if self.mode == 'grid':
+                        for t in self.due_grid_times():
+                            if any(self.ring_times.values()):
+                                writer.writerow(self.create_grid_row(t))
+                        f.flush()
+                        time.sleep(min(self.output_interval, self.grid_interval))
+                        continue
                     
                     # Create and write merged row
                     merged_row = self.create_merged_row()
@@ -280,13 +488,19 @@ class RealTimeMerger:
         self.logger.info("Starting real-time data merger")
         self.logger.info(f"Output file: {self.merged_file}")
         self.logger.info(f"Output interval: {self.output_interval}s")
+        self.logger.info(f"Merge mode: {self.mode}")
         
         # Start health monitoring in a separate thread
         health_thread = threading.Thread(target=self.monitor_sensor_health, daemon=True)
         health_thread.start()
         
         # Start the main write loop
-        self.write_merged_data()
+        try:
+            self.write_merged_data()
+        finally:
+            self.tailer.close()
+            if self.board:
+                self.board.close()
         
         self.logger.info("Real-time merger stopped")
 
@@ -296,10 +510,15 @@ def main():
     parser = argparse.ArgumentParser(description='Real-time data merger for sensor data')
     parser.add_argument('--config', default='sensor_config.json', help='Path to sensor configuration file')
     parser.add_argument('--interval', type=float, default=1.0, help='Output interval in seconds')
+    parser.add_argument('--poll', action='store_true', help='Rescan sensor files every cycle instead of using inotify')
+    parser.add_argument('--mode', choices=['latest', 'grid'], help='Merge mode (default: merger.mode in config)')
+    parser.add_argument('--source', choices=['auto', 'board', 'files'],
+                        help='Read sensors from the shared-memory board or their files (default: merger.source in config)')
     
     args = parser.parse_args()
     
-    merger = RealTimeMerger(config_file=args.config, output_interval=args.interval)
+    merger = RealTimeMerger(config_file=args.config, output_interval=args.interval,
+                            use_inotify=not args.poll, mode=args.mode, source=args.source)
     
     try:
         merger.run()
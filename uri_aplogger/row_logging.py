@@ -0,0 +1,95 @@
+# row_logging.py
+"""
+Hot-path logging for the per-row loop
+
+Logging every written row at INFO formats a string and hits every handler
+(console + file) 10-40 times a second per sensor. RowLog keeps counters instead
+and logs one summary line per summary_interval:
+
+    Written 412 rows in last 10s (41.2/s), 0 rejected, last: 21.3, 1013.2, 45.0
+
+The per-row "Written: ..." line is still there at DEBUG (verbosity 3), built
+lazily so it costs nothing when debug is off. Levels come from the sensor's
+logger, so "logging.verbosity" keeps working as before:
+
+    "logging": { "verbosity": 2, "summary_interval": 10 }
+"""
+
+import time
+import logging
+
+DEFAULT_SUMMARY_INTERVAL = 10.0
+
+class RowSample:
+    """First few data fields of a row, only turned into text if a handler emits it"""
+
+    __slots__ = ('row',)
+
+    def __init__(self, row):
+        self.row = row
+
+    def __str__(self):
+        if not self.row:
+            return "[no data]"
+        fields = [str(field) for field in self.row[1:4] if field not in (None, "")]
+        return ", ".join(fields) if fields else "[placeholder data]"
+
+class RowLog:
+    """Per-sensor row counters with a rate-limited INFO summary"""
+
+    def __init__(self, logger, interval=DEFAULT_SUMMARY_INTERVAL):
+        self.logger = logger
+        self.interval = float(interval)
+        # Cached once - the sensor's level doesn't change after setup_logging
+        self.debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        self.info_enabled = logger.isEnabledFor(logging.INFO)
+
+        # Totals since start (heartbeats read these)
+        self.rows = 0
+        self.rejected = 0
+
+        self._window_start = time.monotonic()
+        self._window_rows = 0
+        self._window_rejected = 0
+        self._last_row = None
+        self.last_row_mono = None
+
+    def written(self, row):
+        self.rows += 1
+        self._window_rows += 1
+        self._last_row = row
+        self.last_row_mono = time.monotonic()
+        if self.debug_enabled:
+            self.logger.debug("Written: %s", RowSample(row))
+
+    def rejected_row(self):
+        """A line that parsed to nothing / failed is_valid_data"""
+        self.rejected += 1
+        self._window_rejected += 1
+
+    def maybe_summary(self, now=None):
+        """Log the window's summary once summary_interval has passed (call once per loop pass)"""
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._window_start
+        if elapsed < self.interval:
+            return False
+        if self.info_enabled:
+            if self._window_rows:
+                self.logger.info("Written %d rows in last %.0fs (%.1f/s), %d rejected, last: %s",
+                                 self._window_rows, elapsed, self._window_rows / elapsed,
+                                 self._window_rejected, RowSample(self._last_row))
+            else:
+                self.logger.info("No rows written in last %.0fs (%d rejected)", elapsed, self._window_rejected)
+        self._window_start = now
+        self._window_rows = 0
+        self._window_rejected = 0
+        return True
+
+    def last_row_age(self, now=None):
+        """Seconds since the last written row (None before the first)"""
+        if self.last_row_mono is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.last_row_mono
+
+    def stats(self):
+        return {'rows': self.rows, 'rejected': self.rejected}
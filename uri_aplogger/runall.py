@@ -12,8 +12,13 @@ import os
 from pathlib import Path
 from datetime import datetime
 import json
+import selectors
 import subprocess
 
+from latest_board import LatestBoard, board_enabled
+from status_channel import (ENV_VAR, HEARTBEAT_ENV_VAR, DEFAULT_HEARTBEAT_INTERVAL, StatusListener,
+                            default_socket_path)
+
 class CompleteSensorManager:
     """Manages all sensor processes and merger using generic approach"""
     
@@ -22,7 +27,22 @@ class CompleteSensorManager:
         self.config_filename = config_file
         self.sensor_processes = {}
         self.merger_process = None
+        self.engine_process = None
+        self.board = None
         self.running = False
+
+        # Readiness and heartbeat messages from children (status_channel.py)
+        self.status_listener = None
+        self.ready = {}
+        self.heartbeats = {}  # name -> (message, time.monotonic() received)
+        self.expected_ready = set()
+        self._merger_deadline = None
+
+        # Restart bookkeeping, keyed by sensor name / 'engine' / 'merger'
+        self._started = {}
+        self._failures = {}
+        self._restart_due = {}
+        self._wakeup_r = self._wakeup_w = None
         
         signal.signal(signal.SIGINT, self.signal_handler)
         
@@ -89,6 +109,17 @@ class CompleteSensorManager:
             absolute_path = self.base_path / script_path
             return str(absolute_path.resolve())
 
+    def child_env(self):
+        """Environment for child processes - tells them where to send readiness"""
+        env = os.environ.copy()
+        if self.status_listener:
+            env[ENV_VAR] = self.status_listener.path
+            env[HEARTBEAT_ENV_VAR] = str(self.heartbeat_interval())
+        return env
+
+    def heartbeat_interval(self):
+        return float(self.config.get('supervisor', {}).get('heartbeat_interval', DEFAULT_HEARTBEAT_INTERVAL))
+
     def start_sensor(self, name, config):
         """Start a single sensor process"""
         if not config.get('enabled', True):
@@ -119,7 +150,8 @@ class CompleteSensorManager:
                 stdout=log_f,
                 stderr=log_f,
                 text=True,
-                cwd=self.base_path
+                cwd=self.base_path,
+                env=self.child_env()
             )
             self.logger.info(f"Started {name} (PID: {process.pid}) from {absolute_script_path}")
             return process
@@ -127,6 +159,49 @@ class CompleteSensorManager:
             self.logger.error(f"Failed to start {name} from {absolute_script_path}: {e}")
             return None
 
+    def uses_engine(self, config):
+        """True if this sensor is hosted by the single-process acquisition engine"""
+        engine_config = self.config.get('engine', {})
+        return (engine_config.get('enabled', False) and
+                config.get('script') == 'sensor_runner.py')
+
+    def engine_sensors(self):
+        """Enabled sensors the acquisition engine hosts"""
+        return [name for name, config in self.config['sensors'].items()
+                if config.get('enabled', True) and self.uses_engine(config)]
+
+    def start_engine(self):
+        """Start the acquisition engine hosting every enabled sensor_runner.py sensor"""
+        engine_config = self.config.get('engine', {})
+        names = self.engine_sensors()
+        if not names:
+            return None
+
+        script_path = engine_config.get('script', 'acquisition_engine.py')
+        absolute_script_path = self.get_absolute_script_path(script_path)
+        if not os.path.exists(absolute_script_path):
+            self.logger.error(f"Engine script not found: {absolute_script_path}")
+            return None
+
+        log_dir = self.base_path / "output" / "process_logs"
+        log_dir.mkdir(parents=True, exist_ok=True)
+        log_f = open(log_dir / "engine.log", "a")
+
+        try:
+            process = subprocess.Popen(
+                [sys.executable, absolute_script_path, '--sensors', ','.join(names)],
+                stdout=log_f,
+                stderr=log_f,
+                text=True,
+                cwd=self.base_path,
+                env=self.child_env()
+            )
+            self.logger.info(f"Started acquisition engine (PID: {process.pid}) hosting: {', '.join(names)}")
+            return process
+        except Exception as e:
+            self.logger.error(f"Failed to start engine from {absolute_script_path}: {e}")
+            return None
+
     def start_merger(self):
         """Start the data merger process"""
         merger_config = self.config.get('merger', {})
@@ -157,7 +232,8 @@ class CompleteSensorManager:
                 stdout=log_f,
                 stderr=log_f,
                 text=True,
-                cwd=self.base_path  # Run from base directory
+                cwd=self.base_path,  # Run from base directory
+                env=self.child_env()
             )
             self.logger.info(f"Started real-time merger (PID: {process.pid}) from {absolute_script_path} with interval {interval}s")
             return process
@@ -165,34 +241,122 @@ class CompleteSensorManager:
             self.logger.error(f"Failed to start merger from {absolute_script_path}: {e}")
             return None
         
+    def create_board(self):
+        """Create the shared-memory latest-value board before any sensor attaches to it"""
+        if not board_enabled(self.config):
+            return None
+        try:
+            board = LatestBoard.open(self.config, fresh=True)
+            self.logger.info(f"Created latest-value board '{board.name}' ({board.n_slots} slots x {board.width} columns)")
+            return board
+        except Exception as e:
+            self.logger.error(f"Failed to create latest-value board: {e}")
+            return None
+
+    def open_status_channel(self):
+        """Bind the readiness socket children report to"""
+        path = default_socket_path(self.config)
+        try:
+            listener = StatusListener(path)
+            self.logger.info(f"Status channel: {path}")
+            return listener
+        except OSError as e:
+            self.logger.error(f"Failed to open status channel {path}: {e} (merger will wait its full startup_delay)")
+            return None
+
+    def watch_children(self):
+        """Wake the main loop on SIGCHLD instead of polling every 5s"""
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        signal.set_wakeup_fd(self._wakeup_w, warn_on_full_buffer=False)
+        # A Python-level handler is needed for the wakeup byte to be written
+        signal.signal(signal.SIGCHLD, lambda sig, frame: None)
+
     def start_all(self):
-        """Start all enabled sensors and merger"""
+        """Start every enabled sensor at once; the merger follows once they report ready"""
         self.logger.info(f"Starting all sensor processes from directory: {self.base_path}")
+
+        self.board = self.create_board()
+        self.status_listener = self.open_status_channel()
+        now = time.monotonic()
         
-        # Start sensors first
+        # Sensors hosted by the acquisition engine share one process
+        self.engine_process = self.start_engine()
+        if self.engine_process:
+            self._started['engine'] = now
+            self.expected_ready.update(self.engine_sensors())
+
+        # Standalone sensors - no waiting between them, each one settles its own device
         for name, config in self.config['sensors'].items():
+            if self.uses_engine(config):
+                continue
             process = self.start_sensor(name, config)
             if process:
                 self.sensor_processes[name] = process
-                # Wait for sensor initialization
-                startup_delay = config.get('startup_delay', 2)
-                self.logger.info(f"Waiting {startup_delay}s for {name} to initialize...")
-                time.sleep(startup_delay)
+                self._started[name] = now
+                self.expected_ready.add(name)
         
-        # Start merger after sensors (with additional delay)
+        # The merger is started from the main loop once every sensor above has sent
+        # "ready" (first row written); merger startup_delay is now the most it waits
         merger_delay = self.config.get('merger', {}).get('startup_delay', 10)
-        self.logger.info(f"Waiting {merger_delay}s before starting merger...")
-        time.sleep(merger_delay)
-        
-        self.merger_process = self.start_merger()
+        self._merger_deadline = now + merger_delay
+        self.logger.info(f"Merger starts when {len(self.expected_ready)} sensors are ready (at most {merger_delay}s)")
         
         self.running = True
-        self.logger.info("All processes started")
+        self.logger.info("All sensor processes started")
+
+    def handle_status(self):
+        """Record readiness and heartbeat messages from children"""
+        if not self.status_listener:
+            return
+        now = time.monotonic()
+        for message in self.status_listener.drain():
+            name = message['sensor']
+            event = message.get('event')
+            if event == 'heartbeat':
+                self.heartbeats[name] = (message, now)
+            elif event == 'ready' and name not in self.ready:
+                self.ready[name] = message
+                self.logger.info(f"{name} ready (PID {message.get('pid')}, {message.get('rows', 0)} rows)")
+
+    def sensor_health(self, now=None):
+        """Latest heartbeat per sensor, with how long ago it arrived and whether it's overdue"""
+        now = time.monotonic() if now is None else now
+        stale_after = 3 * self.heartbeat_interval()
+        health = {}
+        for name in sorted(self.expected_ready | set(self.heartbeats)):
+            message, received = self.heartbeats.get(name, (None, None))
+            entry = {'ready': name in self.ready, 'heartbeat_age': None, 'stale': True}
+            if message:
+                age = now - received
+                entry.update({key: value for key, value in message.items() if key not in ('sensor', 'event', 't')})
+                entry['heartbeat_age'] = round(age, 1)
+                entry['stale'] = age > stale_after
+            health[name] = entry
+        return health
+
+    def check_merger_start(self, now=None):
+        """Start the merger once all sensors are ready, or when its startup_delay runs out"""
+        if self._merger_deadline is None:
+            return
+        now = time.monotonic() if now is None else now
+        waiting = self.expected_ready - set(self.ready)
+        if waiting and now < self._merger_deadline:
+            return
+        if waiting:
+            self.logger.warning(f"Starting merger without ready signal from: {', '.join(sorted(waiting))}")
+        self._merger_deadline = None
+        self.merger_process = self.start_merger()
+        if self.merger_process:
+            self._started['merger'] = now
 
     def stop_all(self):
         """Stop all sensor processes and merger"""
         self.logger.info("Stopping all processes...")
         self.running = False
+        self._restart_due.clear()
+        self._merger_deadline = None
         
         # Stop merger first
         if self.merger_process and self.merger_process.poll() is None:
@@ -204,6 +368,16 @@ class CompleteSensorManager:
                 self.merger_process.kill()
             self.logger.info("Merger stopped")
         
+        # Stop engine
+        if self.engine_process and self.engine_process.poll() is None:
+            self.logger.info("Stopping acquisition engine...")
+            self.engine_process.terminate()
+            try:
+                self.engine_process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.engine_process.kill()
+            self.logger.info("Engine stopped")
+
         # Stop sensors
         for name, process in self.sensor_processes.items():
             if process.poll() is None:  # Still running
@@ -215,28 +389,90 @@ class CompleteSensorManager:
                     process.kill()
                 self.logger.info(f"Stopped {name}")
 
-    def monitor_processes(self):
-        """Monitor and restart failed processes"""
+        # Remove the board last, once nothing publishes to it any more
+        if self.board:
+            self.board.close()
+            self.board.unlink()
+            self.board = None
+
+        if self.status_listener:
+            self.status_listener.close()
+            self.status_listener = None
+
+    def schedule_restart(self, key, label, exit_code, restart_delay, now):
+        """
+        Exponential backoff: restart_delay, then x2 per crash up to supervisor.max_restart_delay.
+        A process that stayed up for supervisor.stable_after seconds starts over at restart_delay.
+        """
+        supervisor = self.config.get('supervisor', {})
+        ran_for = now - self._started.get(key, now)
+        if ran_for >= supervisor.get('stable_after', 60):
+            self._failures[key] = 0
+        failures = self._failures.get(key, 0)
+        delay = min(float(restart_delay) * (2 ** failures), float(supervisor.get('max_restart_delay', 300)))
+        self._failures[key] = failures + 1
+        self._restart_due[key] = now + delay
+        self.logger.warning(f"{label} died (exit code: {exit_code}) after {ran_for:.0f}s, restarting in {delay:.1f}s")
+
+    def restart(self, key, now):
+        """Relaunch one process whose backoff has expired"""
+        if key == 'engine':
+            process = self.start_engine()
+            if process:
+                self.engine_process = process
+            names = self.engine_sensors()
+        elif key == 'merger':
+            process = self.start_merger()
+            if process:
+                self.merger_process = process
+            names = []
+        else:
+            process = self.start_sensor(key, self.config['sensors'][key])
+            if process:
+                self.sensor_processes[key] = process
+            names = [key]
+        if process:
+            self._started[key] = now
+            for name in names:
+                # The new process reports ready again after its first row
+                self.ready.pop(name, None)
+        # A failed launch leaves the dead process in place, so the next pass backs off again
+
+    def check_process(self, key, process, label, restart_delay, now):
+        if process is None or process.poll() is None:
+            return
+        due = self._restart_due.get(key)
+        if due is None:
+            self.schedule_restart(key, label, process.returncode, restart_delay, now)
+        elif now >= due:
+            del self._restart_due[key]
+            self.restart(key, now)
+
+    def monitor_processes(self, now=None):
+        """Reap dead processes and restart them once their backoff has expired"""
+        now = time.monotonic() if now is None else now
+
         # Monitor sensors
         for name, process in list(self.sensor_processes.items()):
-            if process.poll() is not None:  # Process ended
-                exit_code = process.returncode
-                self.logger.warning(f"Sensor {name} died (exit code: {exit_code}), restarting...")
-                config = self.config['sensors'][name]
-                new_process = self.start_sensor(name, config)
-                if new_process:
-                    self.sensor_processes[name] = new_process
+            restart_delay = self.config['sensors'][name].get('restart_delay', 5)
+            self.check_process(name, process, f"Sensor {name}", restart_delay, now)
         
+        # Monitor engine
+        self.check_process('engine', self.engine_process, "Acquisition engine",
+                           self.config.get('engine', {}).get('restart_delay', 5), now)
+
         # Monitor merger
-        if (self.merger_process and 
-            self.merger_process.poll() is not None and 
-            self.config.get('merger', {}).get('enabled', True)):
-            
-            exit_code = self.merger_process.returncode
-            self.logger.warning(f"Merger died (exit code: {exit_code}), restarting...")
-            new_merger = self.start_merger()
-            if new_merger:
-                self.merger_process = new_merger
+        if self.config.get('merger', {}).get('enabled', True):
+            self.check_process('merger', self.merger_process, "Merger",
+                               self.config.get('merger', {}).get('restart_delay', 5), now)
+
+    def next_wakeup(self, now):
+        """Seconds until the main loop has something scheduled (restart or merger start)"""
+        deadlines = list(self._restart_due.values())
+        if self._merger_deadline is not None:
+            deadlines.append(self._merger_deadline)
+        # Safety net poll in case a SIGCHLD wakeup is ever missed
+        return max(0.0, min([now + 5.0] + deadlines) - now)
 
     def get_status(self):
         """Get current status of all processes"""
@@ -244,7 +480,9 @@ class CompleteSensorManager:
             'timestamp': datetime.now().isoformat(),
             'base_directory': str(self.base_path),
             'sensors': {},
-            'merger': None
+            'engine': None,
+            'merger': None,
+            'health': self.sensor_health()
         }
         
         for name, process in self.sensor_processes.items():
@@ -255,6 +493,14 @@ class CompleteSensorManager:
                 'script': self.config['sensors'][name]['script']
             }
         
+        if self.engine_process:
+            status['engine'] = {
+                'running': self.engine_process.poll() is None,
+                'pid': self.engine_process.pid,
+                'exit_code': self.engine_process.returncode,
+                'script': self.config.get('engine', {}).get('script', 'acquisition_engine.py')
+            }
+
         if self.merger_process:
             status['merger'] = {
                 'running': self.merger_process.poll() is None,
@@ -272,16 +518,34 @@ class CompleteSensorManager:
         sys.exit(0)
 
     def run(self):
-        """Main monitoring loop"""
+        """Main monitoring loop - sleeps until a child exits, reports ready, or a restart is due"""
+        self.watch_children()
         self.start_all()
         
         self.logger.info("Sensor controller running. Press Ctrl+C to stop.")
         
         last_status_report = time.time()
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_r, selectors.EVENT_READ, 'signal')
+        if self.status_listener:
+            selector.register(self.status_listener, selectors.EVENT_READ, 'status')
         
         try:
             while self.running:
+                for key, _ in selector.select(self.next_wakeup(time.monotonic())):
+                    if key.data == 'signal':
+                        try:
+                            while os.read(self._wakeup_r, 512):
+                                pass
+                        except BlockingIOError:
+                            pass
+                    elif key.data == 'status':
+                        self.handle_status()
+
+                if not self.running:
+                    break
                 self.monitor_processes()
+                self.check_merger_start()
                 
                 # Print status every 60 seconds
                 if time.time() - last_status_report >= 60:
@@ -295,22 +559,43 @@ class CompleteSensorManager:
                         script_info = f"Script: {sensor_status.get('script', 'N/A')}"
                         self.logger.info(f"  {sensor_name}: {state} {exit_info} {script_info}")
                     
+                    if status['engine']:
+                        state = "RUNNING" if status['engine']['running'] else "STOPPED"
+                        self.logger.info(f"  Engine: {state} (Script: {status['engine'].get('script', 'N/A')})")
+
                     if status['merger']:
                         state = "RUNNING" if status['merger']['running'] else "STOPPED"
                         self.logger.info(f"  Merger: {state} (Script: {status['merger'].get('script', 'N/A')})")
+
+                    for sensor_name, health in status['health'].items():
+                        self.logger.info(f"  {sensor_name}: {format_health(health)}")
                     
                     self.logger.info("=====================")
                     last_status_report = time.time()
                 
-                time.sleep(5)  # Check every 5 seconds
-                
         except KeyboardInterrupt:
             self.logger.info("Keyboard interrupt received")
         except Exception as e:
             self.logger.error(f"Unexpected error in main loop: {e}")
         finally:
+            selector.close()
             self.stop_all()
 
+def format_health(health):
+    """One status-report line from a sensor_health() entry"""
+    if health['heartbeat_age'] is None:
+        return "no heartbeat yet" + ("" if health['ready'] else " (not ready)")
+    age = health.get('last_sample_age')
+    text = (f"{health.get('rows_per_s', 0):.1f} rows/s, {health.get('rows', 0)} rows, "
+            f"{health.get('parse_errors', 0)} parse errors, {health.get('reconnects', 0)} reconnects, "
+            f"last sample {'never' if age is None else f'{age:.1f}s ago'}")
+    writer = health.get('writer') or {}
+    if writer.get('rows_dropped'):
+        text += f", {writer['rows_dropped']} rows dropped (queue {writer.get('queue_depth', 0)})"
+    if health['stale']:
+        text += f" - STALE (last heartbeat {health['heartbeat_age']:.0f}s ago)"
+    return text
+
 if __name__ == "__main__":
     # Get absolute path to config file if provided as argument
     if len(sys.argv) > 1:
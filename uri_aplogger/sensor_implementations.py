@@ -4,6 +4,8 @@ Sensor-specific implementations
 """
 
 from generic_sensor import GenericSensor
+from sensor_writers import create_writer
+from field_schema import output_columns
 from datetime import datetime, timedelta
 import time
 import re
@@ -32,7 +34,7 @@ class iMetSensor(GenericSensor):
             
             # Add timestamp and remove first field (printed XQ)
             data_list = data_list[1:11]  # Take exactly 10 fields
-            data_list.insert(0, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            data_list.insert(0, self.rx_timestamp())
             
             return data_list
         except Exception as e:
@@ -71,7 +73,7 @@ class POMSensor(GenericSensor):
                 return None
 
             # Add timestamp as first column
-            data_list.insert(0, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            data_list.insert(0, self.rx_timestamp())
             return data_list
             
         except Exception as e:
@@ -109,7 +111,7 @@ class TriSonicaSensor(GenericSensor):
             ]
             
             # Add timestamp as first column
-            parsed_data.insert(0, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            parsed_data.insert(0, self.rx_timestamp())
             return parsed_data
             
         except Exception as e:
@@ -169,20 +171,24 @@ class Partector2ProSensor(GenericSensor):
             # - 18 fields for standard 1Hz mode (mode 1)
             # - 32 fields for size distribution mode (mode 6)
             
-            # Convert numeric values where possible
-            parsed_values = []
-            for value in data_list:
-                try:
-                    # Try to convert to float if it looks like a number
-                    if value.replace('.', '', 1).replace('-', '', 1).isdigit():
-                        parsed_values.append(float(value))
-                    else:
+            if self.convert_row:
+                # The schema types every column after parse_data
+                parsed_values = data_list
+            else:
+                # No schema: convert numeric values where possible
+                parsed_values = []
+                for value in data_list:
+                    try:
+                        # Try to convert to float if it looks like a number
+                        if value.replace('.', '', 1).replace('-', '', 1).isdigit():
+                            parsed_values.append(float(value))
+                        else:
+                            parsed_values.append(value)
+                    except:
                         parsed_values.append(value)
-                except:
-                    parsed_values.append(value)
             
             # Add timestamp as first column
-            parsed_values.insert(0, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            parsed_values.insert(0, self.rx_timestamp())
             
             return parsed_values
             
@@ -196,9 +202,13 @@ class MiniaethMA200Sensor(GenericSensor):
         self.baudrate = config.get("baudrate", 1000000)
         self.timeout = config.get("timeout", 1)
 
+        # Request/response: our own read_serial_data() does the 'dr' exchange
+        self.batch_read = False
+
         # Poll rate (seconds) — IMPORTANT so we don’t spam dr
         self.poll_interval = float(config.get("poll_interval", 1.0))
         self._last_poll = 0.0
+        self._awaiting_reply = False
 
     def read_serial_data(self):
         # Ensure connection
@@ -227,16 +237,13 @@ class MiniaethMA200Sensor(GenericSensor):
                 raw = self.serial_conn.readline()
                 if not raw:
                     continue
+                self.mark_rx(raw)
                 line = raw.decode("utf-8", errors="ignore").strip()
 
                 # DEBUG: show everything we receive
-                self.logger.debug(f"MA200 RX: {line!r}")
+                self.logger.debug("MA200 RX: %r", line)
 
-                if not line:
-                    continue
-                if line.lower() == "dr":
-                    continue
-                if line.startswith("MA200-") and "," in line:
+                if self.accept_line(line):
                     return line
 
             self.logger.debug("MA200: no valid data line received this poll")
@@ -250,11 +257,81 @@ class MiniaethMA200Sensor(GenericSensor):
                 self.serial_conn = None
             return None
 
+    def accept_line(self, line):
+        # Skip blanks and the 'dr' echo, keep only data lines
+        if not line or line.lower() == "dr":
+            return False
+        return line.startswith("MA200-") and "," in line
+
+    def read_lines(self):
+        # Event-driven (engine or event_driven runner): never wait on the port here.
+        # Send 'dr' when a poll is due and return whatever reply lines have already
+        # arrived - the selector wakes us when the reply bytes come in.
+        if not self.event_driven:
+            return super().read_lines()
+        lines = self.read_reply_lines()
+        now = time.time()
+        if now - self._last_poll >= self.poll_interval:
+            self.send_poll(now)
+        return lines
+
+    def send_poll(self, now):
+        if self._awaiting_reply:
+            self.logger.debug("MA200: no valid data line received this poll")
+        try:
+            self.serial_conn.write(b"dr\r")
+            self._awaiting_reply = True
+        except Exception as e:
+            self.logger.error(f"MA200 write error: {e}")
+            self.consecutive_failures += 1
+        self._last_poll = now
+
+    def read_reply_lines(self):
+        """Complete data lines received so far (non-blocking); a partial reply waits for the next call"""
+        try:
+            waiting = self.serial_conn.in_waiting
+            chunk = self.serial_conn.read(waiting) if waiting > 0 else b""
+        except Exception as e:
+            self.logger.error(f"MA200 read error: {e}")
+            self.consecutive_failures += 1
+            if self.serial_conn:
+                self.serial_conn.close()
+                self.serial_conn = None
+            self._rx_buf = b""
+            return []
+        if not chunk:
+            return []
+
+        self._rx_buf += chunk
+        *complete, self._rx_buf = self._rx_buf.split(b"\n")
+        if len(self._rx_buf) > self.max_line_bytes:
+            self._rx_buf = b""
+
+        lines = []
+        for raw in complete:
+            # One capture record per line, like the readline() path (batch_reparse relies on it)
+            self.mark_rx(raw + b"\n")
+            line = raw.decode("utf-8", errors="ignore").strip()
+            self.logger.debug("MA200 RX: %r", line)
+            if self.accept_line(line):
+                lines.append(line)
+                self._awaiting_reply = False
+        return lines
+
+    def wait_for_data(self, timeout=None):
+        # Request/response device: in event-driven mode wait on the port, but
+        # no longer than until the next 'dr' poll is due
+        if self.event_driven:
+            remaining = self.poll_interval - (time.time() - self._last_poll)
+            timeout = self.idle_timeout if timeout is None else timeout
+            timeout = max(0.0, min(timeout, remaining))
+        return super().wait_for_data(timeout)
+
     def parse_data(self, data):
         try:
             parts = [p.strip() for p in data.split(",")]
-            parts.insert(0, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            self.logger.debug(f"MA200 parsed fields: {len(parts)}")
+            parts.insert(0, self.rx_timestamp())
+            self.logger.debug("MA200 parsed fields: %d", len(parts))
             return parts
         except Exception as e:
             self.logger.error(f"Parse error: {e}, data: {data}")
@@ -270,6 +347,8 @@ class POPSSensor(GenericSensor):
     Replaces legacy pops_class UDP behavior but uses the same CSV/merge conventions.
     """
 
+    transport = 'udp'
+
     def __init__(self, name, config):
         super().__init__(name, config)
         self.udp_ip = config.get("udp_ip", "0.0.0.0")
@@ -289,7 +368,8 @@ class POPSSensor(GenericSensor):
             self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self._sock.bind((self.udp_ip, self.udp_port))
-            self._sock.settimeout(self._sock_timeout)
+            # Event-driven: we only read after select() says a datagram is waiting
+            self._sock.settimeout(0 if self.event_driven else self._sock_timeout)
             self.logger.info(f"POPS listening on UDP {self.udp_ip}:{self.udp_port}")
             self.consecutive_failures = 0
             return True
@@ -317,10 +397,11 @@ class POPSSensor(GenericSensor):
             data, addr = self._sock.recvfrom(self.buffer_size)
             if not data:
                 return None
+            self.mark_rx(data)
             msg = data.decode("utf-8", errors="ignore").strip("\x00\r\n ")
-            self.logger.debug(f"POPS RX from {addr}: {msg[:200]!r}")
+            self.logger.debug("POPS RX from %s: %.200r", addr, msg)
             return msg
-        except socket.timeout:
+        except (socket.timeout, BlockingIOError):
             return None
         except Exception as e:
             self.logger.error(f"POPS read error: {e}")
@@ -333,6 +414,11 @@ class POPSSensor(GenericSensor):
             self._sock = None
             return None
 
+    def split_lines(self, chunk):
+        # One datagram is one message (used by raw_capture.py reparse)
+        msg = bytes(chunk).decode("utf-8", errors="ignore").strip("\x00\r\n ")
+        return [msg] if msg else []
+
     def parse_data(self, data):
         """
         Legacy POPS payloads were comma-separated and code used message[3:].
@@ -342,7 +428,7 @@ class POPSSensor(GenericSensor):
         try:
             parts = [p.strip() for p in data.split(",")]
             values = parts[3:] if len(parts) > 3 else []
-            row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S")] + values
+            row = [self.rx_timestamp()] + values
 
             # Ensure exact column count (pad/truncate) to match config column_names
             expected = len(self.config.get("column_names", []))
@@ -356,70 +442,108 @@ class POPSSensor(GenericSensor):
             self.logger.error(f"POPS parse error: {e}, raw={data!r}")
             return None
 
-    def run(self):
-        """Own run loop (UDP needs its own flow, so we don't call GenericSensor.run)."""
-        self.logger.info(f"Starting POPS UDP listener: {self.udp_ip}:{self.udp_port}")
+    def fileno(self):
+        """UDP socket fd, so wait_for_data() and the engine can select() on it"""
+        return self._sock.fileno() if self._sock else None
 
-        # Ensure output dir / file exist, then append rows
+    def open_output(self):
+        """Ensure output dir / file exist, then open it for appending rows"""
         Path(f'output/{self.name}').mkdir(parents=True, exist_ok=True)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         self.output_file = self.config.get('output_file', f'output/{self.name}/{self.name}_data_{timestamp}.csv')
 
         try:
-            # Initialize CSV with headers if needed
-            if not Path(self.output_file).exists():
-                with open(self.output_file, 'w', newline='') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(self.config.get('column_names', []))
-                self.logger.info(f"Created POPS output file: {self.output_file}")
+            # Header only if the file is new; existing files are appended to
+            self._writer = create_writer(self.output_file, output_columns(self.config),
+                                         self.config, self.logger, append=True)
+            self.logger.info(f"POPS output file: {self.output_file}")
         except Exception as e:
             self.logger.error(f"Failed to create POPS output file: {e}")
-            return
+            return False
+        self.raw_capture = self.setup_raw_capture()
 
-        last_reconnect = time.time()
-        data_count = 0
-        self.running = True
+        self._last_reconnect = time.time()
+        self.data_count = 0
+        return True
 
-        with open(self.output_file, 'a', newline='') as csvfile:
-            writer = csv.writer(csvfile)
+    def close_output(self):
+        if getattr(self, '_writer', None):
+            try:
+                self._writer.close()
+            except Exception as e:
+                self.logger.error(f"Error closing POPS output: {e}")
+            self._writer = None
+        if self.raw_capture:
+            try:
+                self.raw_capture.close()
+            except Exception as e:
+                self.logger.error(f"Error closing POPS raw capture: {e}")
+            self.raw_capture = None
+        self._close_socket()
+        self.logger.info(f"POPS stopped. Total rows: {getattr(self, 'data_count', 0)}")
 
-            while self.running:
-                now = time.time()
-                # Try to ensure socket is open periodically (reconnect_delay from GenericSensor)
-                if not self._sock and now - last_reconnect >= self.reconnect_delay:
-                    self.logger.info("Attempting to (re)open POPS socket...")
-                    self._open_socket()
-                    last_reconnect = now
-
-                # Read one UDP packet (if any)
-                packet = self.read_udp_packet()
-                if packet:
-                    parsed = self.parse_data(packet)
-                    if parsed:
-                        try:
-                            writer.writerow(parsed)
-                            csvfile.flush()
-                            data_count += 1
-                            self.consecutive_failures = 0
-                            # log a short sample
-                            sample_fields = [str(f) for f in parsed[1:4] if f]
-                            if sample_fields:
-                                self.logger.info(f"Written: {', '.join(sample_fields)}")
-                        except Exception as e:
-                            self.logger.error(f"POPS write error: {e}")
-
-                # Failure handling similar to GenericSensor
-                if self.consecutive_failures >= self.max_failures:
-                    self.logger.warning(f"POPS: consecutive failures >= {self.max_failures}, closing socket and retrying after {self.reconnect_delay}s")
-                    self._close_socket()
+    def due_for_reconnect(self, now=None):
+        # Reopening a UDP socket never blocks, step() does it inline
+        return False
+
+    def step(self, reconnect=True):
+        """One pass of the UDP loop: (re)open socket, read packet(s), write rows"""
+        now = time.time()
+        writer = self._writer
+
+        # Try to ensure socket is open periodically (reconnect_delay from GenericSensor)
+        if not self._sock and now - self._last_reconnect >= self.reconnect_delay:
+            self.logger.info("Attempting to (re)open POPS socket...")
+            if self._open_socket():
+                self.reconnects += 1
+            self._last_reconnect = now
+
+        # Read one UDP packet (if any); event-driven sockets are drained
+        for _ in range(64 if self.event_driven else 1):
+            packet = self.read_udp_packet()
+            if not packet:
+                break
+            parsed = self.parse_data(packet)
+            if parsed:
+                parsed = self.finish_row(parsed)
+                try:
+                    writer.writerow(parsed)
+                    self.publish_latest(parsed)
+                    self.data_count += 1
                     self.consecutive_failures = 0
-                    last_reconnect = now
+                    self.row_log.written(parsed)
+                except Exception as e:
+                    self.logger.error(f"POPS write error: {e}")
+            else:
+                self.row_log.rejected_row()
+
+        writer.maybe_flush()
+        if self.raw_capture:
+            self.raw_capture.maybe_flush()
+        self.row_log.maybe_summary()
+        self.report_status()
+
+        # Failure handling similar to GenericSensor
+        if self.consecutive_failures >= self.max_failures:
+            self.logger.warning(f"POPS: consecutive failures >= {self.max_failures}, closing socket and retrying after {self.reconnect_delay}s")
+            self._close_socket()
+            self.consecutive_failures = 0
+            self._last_reconnect = now
 
-                time.sleep(0.1)
+    def run(self):
+        """Own run loop (UDP needs its own flow, so we don't call GenericSensor.run)."""
+        self.logger.info(f"Starting POPS UDP listener: {self.udp_ip}:{self.udp_port}")
 
-        # cleanup
-        self._close_socket()
-        self.logger.info(f"POPS stopped. Total rows: {data_count}")
+        if not self.open_output():
+            return
+
+        self.running = True
+        try:
+            while self.running:
+                self.step()
+                self.wait_for_data()
+        finally:
+            self.close_output()
 
     def teardown(self):
         # Ensure socket closed if framework calls teardown
@@ -533,7 +657,7 @@ class LDDSensor(GenericSensor):
             parts = [p.strip() for p in s.split(",")]
 
             # Prepend timestamp to match your framework
-            parts.insert(0, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            parts.insert(0, self.rx_timestamp())
             return parts
 
         except Exception as e:
@@ -728,7 +852,7 @@ class PumpSensor(GenericSensor):
         pres = "" if pres_raw.upper() == "ERR" else float(pres_raw)
 
         row = [
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            self.rx_timestamp(),
             float(rpm),
             pres,
             float(m.group("temp")),
@@ -903,7 +1027,7 @@ class CavitySensor(GenericSensor):
                     return None
 
             # Add wall-clock timestamp
-            row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S")] + parts
+            row = [self.rx_timestamp()] + parts
 
             # Enforce column count if configured
             expected = len(self.config.get("column_names", []))
@@ -6,6 +6,25 @@ Universal sensor runner - fixed version
 import sys
 import json
 from sensor_implementations import create_sensor
+from latest_board import board_enabled, board_layout
+
+def build_sensor_config(config, sensor_name):
+    """Per-sensor config with global settings merged in (per-sensor overrides global)"""
+    global_logging = config.get("logging", {})
+    sensor_config = config["sensors"][sensor_name]
+
+    # Merge: per-sensor overrides global
+    merged_logging = {**global_logging, **sensor_config.get("logging", {})}
+    sensor_config["logging"] = merged_logging
+
+    # Same for output buffering/flush settings
+    sensor_config["output"] = {**config.get("output", {}), **sensor_config.get("output", {})}
+
+    # Shared-memory board: the slot table depends on every sensor, so pass the layout down
+    if board_enabled(config):
+        name, slots, width = board_layout(config)
+        sensor_config["board"] = {"enabled": True, "name": name, "slots": slots, "width": width}
+    return sensor_config
 
 def main():
     if len(sys.argv) < 2:
@@ -28,12 +47,7 @@ def main():
         print(f"Available: {list(config['sensors'].keys())}")
         sys.exit(1)
     
-    global_logging = config.get("logging", {})
-    sensor_config = config["sensors"][sensor_name]
-
-    # Merge: per-sensor overrides global
-    merged_logging = {**global_logging, **sensor_config.get("logging", {})}
-    sensor_config["logging"] = merged_logging
+    sensor_config = build_sensor_config(config, sensor_name)
     
     # Create and run sensor
     try:
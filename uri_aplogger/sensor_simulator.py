@@ -0,0 +1,671 @@
+# sensor_simulator.py
+"""
+Virtual sensors for running the acquisition stack without hardware
+
+Every serial sensor gets a pty pair: the simulator writes realistic lines to the
+master side and the sensor code opens the slave (/dev/pts/N) like any USB port.
+Commands written by the sensor (X000n!, dr, PING, SETC ..., SETPWR ...) are read
+back and answered the way the real devices do. POPS is simulated as UDP datagrams
+sent to its configured udp_port.
+
+Usage:
+    python sensor_simulator.py --write-config sim_config.json
+    python acquisition_engine.py --config sim_config.json      (in another shell)
+
+--write-config copies sensor_config.json with each simulated sensor's "port" set
+to its pty (see device_registry / find_device_port), so no udev lookup happens.
+
+Rates are lines per second and burst is how many lines go out in one write (to
+mimic a USB adapter delivering several lines per packet). Defaults come from each
+emitter, then a sensor's "simulator" block in the config, then the command line:
+    "simulator": {"rate": 40, "burst": 4, "jitter": 0.1}
+    --rate trisonica=40 --burst trisonica=4
+
+--replay sensor=FILE sends the lines of a recorded text capture instead of
+generated data (at the sensor's rate, looping with --loop). A raw_capture .bin
+file is replayed at the rate it was recorded.
+"""
+
+import os
+import tty
+import pty
+import json
+import time
+import math
+import errno
+import random
+import select
+import socket
+import signal
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+
+import raw_capture
+
+class Emitter:
+    """Generates one device's output lines and answers its commands"""
+
+    rate = 1.0
+    line_ending = "\r\n"
+
+    def __init__(self, column_names=None):
+        self.column_names = list(column_names or [])
+        self.t0 = time.time()
+        self.streaming = True
+
+    def banner(self):
+        """Lines the device prints when it powers up"""
+        return []
+
+    def line(self, t):
+        """Next data line at time t (None = nothing to send)"""
+        raise NotImplementedError
+
+    def handle_command(self, cmd):
+        """Response lines for a command written by the sensor code"""
+        return []
+
+    def walk(self, key, start, step, low=None, high=None):
+        """Bounded random walk, so values drift like real readings"""
+        value = getattr(self, key, start) + random.gauss(0, step)
+        if low is not None:
+            value = max(low, value)
+        if high is not None:
+            value = min(high, value)
+        setattr(self, key, value)
+        return value
+
+class IMetEmitter(Emitter):
+    """iMet-XQ2: XQ,pressure*100,temp*100,rh*10... style CSV"""
+
+    rate = 1.0
+
+    def line(self, t):
+        p = self.walk('_p', 1013.25, 0.05, 300, 1100)
+        temp = self.walk('_t', 22.0, 0.02)
+        rh = self.walk('_rh', 45.0, 0.1, 0, 100)
+        now = datetime.fromtimestamp(t, timezone.utc)
+        return (f"XQ,{p * 100:.0f},{temp * 100:.0f},{rh * 100:.0f},{temp * 100 + 15:.0f},"
+                f"{now:%Y/%m/%d},{now:%H:%M:%S},34.8123456,31.9087654,{420 + 5 * math.sin(t / 60):.1f},9")
+
+class POMEmitter(Emitter):
+    """2B Technologies Personal Ozone Monitor: banner, then CSV every 10 s"""
+
+    rate = 0.1
+
+    def banner(self):
+        return ["Personal Ozone Monitor", "123"]
+
+    def line(self, t):
+        o3 = self.walk('_o3', 35.0, 0.8, 0)
+        now = datetime.fromtimestamp(t, timezone.utc)
+        return (f"{o3:.1f},{self.walk('_ct', 303.2, 0.05):.1f},{self.walk('_cp', 760.0, 0.2):.1f},"
+                f"{0.8123 + random.gauss(0, 0.001):.4f},{12.1 + random.gauss(0, 0.01):.2f},"
+                f"31.9087,34.8123,420,1,{now:%d/%m/%y},{now:%H:%M:%S}")
+
+class TriSonicaEmitter(Emitter):
+    """TriSonica Mini: key/value pairs, 10 Hz"""
+
+    rate = 10.0
+
+    def line(self, t):
+        u = self.walk('_u', 1.5, 0.15)
+        v = self.walk('_v', -0.8, 0.15)
+        w = self.walk('_w', 0.0, 0.05, -3, 3)
+        speed = math.sqrt(u * u + v * v + w * w)
+        direction = math.degrees(math.atan2(-u, -v)) % 360
+        return (f"S {speed:05.2f} D {direction:03.0f} U {u:06.2f} V {v:06.2f} W {w:06.2f} "
+                f"T {self.walk('_t', 22.0, 0.02):05.2f} H {self.walk('_h', 45.0, 0.05, 0, 100):05.2f} "
+                f"P {self.walk('_p', 1013.2, 0.02):07.2f} PI {self.walk('_pi', 1.0, 0.05):05.1f} "
+                f"RO {self.walk('_ro', -0.5, 0.05):05.1f} MD {self.walk('_md', 270.0, 0.2) % 360:05.1f}")
+
+class Partector2ProEmitter(Emitter):
+    """naneos Partector 2 pro: silent until X000n!, then tab-separated rows at 1 Hz"""
+
+    rate = 1.0
+
+    def __init__(self, column_names=None):
+        super().__init__(column_names)
+        self.streaming = False
+        self.mode = 0
+
+    def handle_command(self, cmd):
+        if cmd.startswith("X000") and cmd.endswith("!") and cmd[4:-1].isdigit():
+            self.mode = int(cmd[4:-1])
+            self.streaming = self.mode > 0
+            self.t_start = time.time()
+        return []
+
+    def line(self, t):
+        if not self.streaming:
+            return None
+        number = max(0, self.walk('_n', 5000, 150))
+        values = [
+            f"{t - self.t_start:.0f}", f"{self.walk('_dc', 0.35, 0.01):.3f}", "2500",
+            f"{random.gauss(0, 0.5):.2f}", f"{random.gauss(0, 0.5):.2f}", f"{abs(random.gauss(2, 0.3)):.2f}",
+            f"{abs(random.gauss(2, 0.3)):.2f}", f"{self.walk('_t', 25.0, 0.02):.1f}", f"{self.walk('_rh', 40.0, 0.1, 0, 100):.1f}",
+            "0", "20", f"{self.walk('_bat', 3.9, 0.001, 3.0, 4.2):.2f}", f"{self.walk('_flow', 0.48, 0.002):.3f}",
+            f"{number * 0.004:.1f}", f"{self.walk('_d', 45, 0.5, 10, 300):.0f}", f"{number:.0f}", "1234", "1010",
+        ]
+        expected = max(0, len(self.column_names) - 1) or len(values)
+        return "\t".join(values[:expected])
+
+class MA200Emitter(Emitter):
+    """AethLabs MA200: request/response - a CSV record for every 'dr'"""
+
+    rate = 0.0  # nothing unsolicited
+    line_ending = "\r\n"
+
+    def __init__(self, column_names=None):
+        super().__init__(column_names)
+        self.datum = 0
+
+    def line(self, t):
+        return None
+
+    def values(self):
+        """One field per column after Timestamp, in the device's record order"""
+        now = datetime.now(timezone.utc)
+        fields = {
+            "serial_number": "MA200-0420", "datum_id": str(self.datum), "session_id": "12",
+            "data_format_version": "2", "firmware_version": "1.45", "app_version": "1.2.0",
+            "date_time_GMT": now.strftime("%Y-%m-%dT%H:%M:%S"), "timezone_offset": "0",
+            "date_local": now.strftime("%Y/%m/%d"), "time_local": now.strftime("%H:%M:%S"),
+            "gps_sat_count": "0", "timebase": "1", "status": "0", "battery": "87",
+            "tape_pos": "3", "flow_setpoint": "150", "optical_config": "5L", "readable_status": "",
+        }
+        out = []
+        for col in self.column_names[1:]:
+            if col in fields:
+                out.append(fields[col])
+            elif col.endswith(("_BC1", "_BC2", "_BCc")):
+                out.append(f"{self.walk('_bc', 800.0, 20.0, 0):.0f}")
+            else:
+                out.append(f"{random.uniform(0, 100):.3f}")
+        return out
+
+    def handle_command(self, cmd):
+        if cmd.lower() != "dr":
+            return []
+        self.datum += 1
+        if not self.column_names:
+            return ["dr", f"MA200-0420,{self.datum}"]
+        return ["dr", ",".join(self.values())]
+
+class LDDEmitter(Emitter):
+    """Meerstetter LDD Arduino bridge: header, CSV telemetry at 1 Hz, OK/ERR acks"""
+
+    rate = 1.0
+    line_ending = "\n"
+    commands = ("PING", "GET", "RESET", "SETC", "SETT")
+
+    def __init__(self, column_names=None):
+        super().__init__(column_names)
+        self.setc = 1.4
+        self.sett = 35.0
+
+    def data_columns(self):
+        return [c for c in self.column_names if c != "Timestamp"]
+
+    def banner(self):
+        return ["IDENT LDD bridge v2", "COMMANDS: " + " ".join(self.commands), ",".join(self.data_columns())]
+
+    def handle_command(self, cmd):
+        parts = cmd.split()
+        if not parts:
+            return []
+        verb = parts[0].upper()
+        if verb not in self.commands:
+            return [f"ERR unknown command {verb}"]
+        try:
+            if verb == "SETC":
+                self.setc = float(parts[1])
+            elif verb == "SETT":
+                self.sett = float(parts[1])
+        except (IndexError, ValueError):
+            return [f"ERR bad argument for {verb}"]
+        if verb == "PING":
+            return ["OK PONG"]
+        return [f"OK {cmd.strip()}"]
+
+    def values(self, t):
+        """One value per data column (ErrorText is a word, the rest numbers)"""
+        out = []
+        for col in self.data_columns():
+            if col == "ms":
+                out.append(str(int((t - self.t0) * 1000)))
+            elif col == "ErrorText":
+                out.append("NoError")
+            elif col.startswith("Error"):
+                out.append("0")
+            elif col == "LDD_ActualOutputCurrent":
+                out.append(f"{self.setc + random.gauss(0, 0.002):.4f}")
+            elif col in ("TEC_TargetObjectTemperature",):
+                out.append(f"{self.sett:.2f}")
+            elif col == "TEC_ObjectTemperature":
+                out.append(f"{self.walk('_obj', self.sett, 0.01):.3f}")
+            else:
+                out.append(f"{random.uniform(0, 10):.3f}")
+        return out
+
+    def line(self, t):
+        return ",".join(self.values(t))
+
+class CavityEmitter(LDDEmitter):
+    """Merged LDD + pump Arduino: 'ms,ErrorNumber,...' rows once a second"""
+
+    commands = ("PING", "GET", "RESET", "SETC", "SETT", "SETPWR")
+
+    def __init__(self, column_names=None):
+        super().__init__(column_names)
+        self.power = 40.0
+
+    def banner(self):
+        return ["IDENT cavity bridge v1", "COMMANDS: " + " ".join(self.commands), ",".join(self.data_columns())]
+
+    def handle_command(self, cmd):
+        parts = cmd.split()
+        if parts and parts[0].upper() == "SETPWR":
+            try:
+                self.power = max(0.0, min(100.0, float(parts[1])))
+            except (IndexError, ValueError):
+                return ["ERR bad argument for SETPWR"]
+            return [f"OK SETPWR {self.power:.1f}"]
+        return super().handle_command(cmd)
+
+    def values(self, t):
+        out = super().values(t)
+        pump = {
+            "pump_rpm": f"{self.power * 66 + random.gauss(0, 10):.0f}",
+            "pressure_mb": f"{self.walk('_pres', 1007.5, 0.05):.1f}",
+            "temp_c": f"{self.walk('_tc', 22.8, 0.02):.1f}",
+            "humidity_pct": f"{self.walk('_hum', 48.5, 0.05, 0, 100):.1f}",
+            "power_pct": f"{self.power:.1f}",
+            "pressure_status": "1",
+            "target_speed": f"{self.power:.1f}",
+        }
+        for i, col in enumerate(self.data_columns()):
+            if col in pump:
+                out[i] = pump[col]
+        return out
+
+class PumpEmitter(Emitter):
+    """Pump Arduino: 'Pump: .. RPM | Pres: .. mb | Temp: .. C | Hum: .. %' at 1 Hz"""
+
+    rate = 1.0
+    line_ending = "\n"
+
+    def __init__(self, column_names=None):
+        super().__init__(column_names)
+        self.power = 40.0
+
+    def banner(self):
+        return ["System startup", "HDC 1080 ok"]
+
+    def handle_command(self, cmd):
+        parts = cmd.split()
+        if parts and parts[0].upper() == "SETPWR":
+            try:
+                self.power = max(0.0, min(100.0, float(parts[1])))
+                return [f"OK SETPWR {self.power:.1f}"]
+            except (IndexError, ValueError):
+                return ["ERR bad argument"]
+        return ["ERR unknown command"] if parts else []
+
+    def line(self, t):
+        rpm = self.power * 66 + random.gauss(0, 10)
+        return (f"Pump: {rpm:.0f} RPM | Pres: {self.walk('_p', 1007.5, 0.05):.1f} mb | "
+                f"Temp: {self.walk('_t', 22.8, 0.02):.1f} C | Hum: {self.walk('_h', 48.5, 0.05, 0, 100):.1f} %")
+
+class POPSEmitter(Emitter):
+    """Handix POPS: one comma-separated UDP datagram per second"""
+
+    rate = 1.0
+
+    def line(self, t):
+        n_values = max(1, len(self.column_names) - 1)
+        now = datetime.fromtimestamp(t, timezone.utc)
+        values = [now.strftime("%Y%m%dT%H%M%S"), f"{t % 86400:.2f}"]
+        values += [f"{max(0, random.gauss(50 / (i + 1), 3)):.0f}" for i in range(n_values - len(values))]
+        return "POPS,POPS-93,/media/uSD/F2/F20250101/HK_20250101x001.csv," + ",".join(values[:n_values])
+
+class ReplayEmitter(Emitter):
+    """Sends the lines of a recorded capture (text, or a raw_capture .bin) in order (optionally looping)"""
+
+    def __init__(self, path, loop=False, inner=None):
+        super().__init__()
+        # Lines per second the capture was recorded at (raw captures only)
+        self.capture_rate = None
+        with open(path, 'rb') as f:
+            is_raw = f.read(len(raw_capture.MAGIC)) == raw_capture.MAGIC
+        if is_raw:
+            self.lines = raw_capture.capture_lines(path)
+            span = raw_capture.capture_span(path)
+            if span and span[1] > span[0] and len(self.lines) > 1:
+                self.capture_rate = (len(self.lines) - 1) / ((span[1] - span[0]) / 1e9)
+        else:
+            with open(path, 'r', errors='ignore') as f:
+                self.lines = [l.rstrip("\r\n") for l in f if l.strip()]
+        self.loop = loop
+        self.index = 0
+        # Commands are still answered by the device's own emitter
+        self.inner = inner
+
+    def handle_command(self, cmd):
+        return self.inner.handle_command(cmd) if self.inner else []
+
+    def line(self, t):
+        if self.index >= len(self.lines):
+            if not self.loop or not self.lines:
+                return None
+            self.index = 0
+        line = self.lines[self.index]
+        self.index += 1
+        return line
+
+EMITTERS = {
+    'iMet': IMetEmitter,
+    'POM': POMEmitter,
+    'TriSonica': TriSonicaEmitter,
+    'Partector2Pro': Partector2ProEmitter,
+    'MiniaethMA200': MA200Emitter,
+    'LDD': LDDEmitter,
+    'Pump': PumpEmitter,
+    'Cavity': CavityEmitter,
+    'POPS': POPSEmitter,
+}
+
+class SimulatedDevice:
+    """A pty pair driven by an emitter on a rate/burst schedule"""
+
+    def __init__(self, name, emitter, rate=None, burst=1, jitter=0.0):
+        self.name = name
+        self.emitter = emitter
+        self.rate = float(emitter.rate if rate is None else rate)
+        self.burst = max(1, int(burst))
+        self.jitter = float(jitter)
+        self.master = None
+        self.slave = None
+        self.port = None
+        self.next_time = None
+        self._cmd_buf = b""
+        self.lines_sent = 0
+        self.data_lines = 0   # generated samples, not banners/acks
+        self.bytes_sent = 0
+        self.lines_dropped = 0
+        self.commands = 0
+
+    def open(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        self.next_time = time.time()
+        self.send(self.emitter.banner())
+        return self.port
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.master = self.slave = None
+
+    def fileno(self):
+        return self.master
+
+    def send(self, lines):
+        if not lines:
+            return
+        ending = self.emitter.line_ending
+        data = "".join(line + ending for line in lines).encode("utf-8")
+        try:
+            os.write(self.master, data)
+            self.lines_sent += len(lines)
+            self.bytes_sent += len(data)
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+            # Nobody is reading the port and its buffer is full - a real device would overrun too
+            self.lines_dropped += len(lines)
+
+    def handle_input(self):
+        """Read commands written by the sensor side and answer them"""
+        try:
+            data = os.read(self.master, 4096)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EIO):
+                return
+            raise
+        self._cmd_buf += data.replace(b"\r", b"\n")
+        while b"\n" in self._cmd_buf:
+            raw, self._cmd_buf = self._cmd_buf.split(b"\n", 1)
+            cmd = raw.decode("utf-8", errors="ignore").strip()
+            if cmd:
+                self.commands += 1
+                self.send(self.emitter.handle_command(cmd))
+
+    def interval(self):
+        base = self.burst / self.rate
+        if self.jitter:
+            base *= max(0.0, 1 + random.uniform(-self.jitter, self.jitter))
+        return base
+
+    def due(self, now):
+        return self.rate > 0 and now >= self.next_time
+
+    def emit(self, now):
+        lines = []
+        for _ in range(self.burst):
+            line = self.emitter.line(now)
+            if line is not None:
+                lines.append(line)
+        self.data_lines += len(lines)
+        self.send(lines)
+        # Schedule from the previous slot so the long-run rate stays exact
+        self.next_time = max(self.next_time + self.interval(), now - 1.0)
+
+class SimulatedUDPDevice(SimulatedDevice):
+    """Sends each line as a datagram (POPS)"""
+
+    def __init__(self, name, emitter, address, rate=None, burst=1, jitter=0.0):
+        super().__init__(name, emitter, rate, burst, jitter)
+        self.address = address
+        self.sock = None
+
+    def open(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.next_time = time.time()
+        self.port = f"udp://{self.address[0]}:{self.address[1]}"
+        return self.port
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+        self.sock = None
+
+    def fileno(self):
+        return None
+
+    def send(self, lines):
+        for line in lines:
+            data = line.encode("utf-8")
+            try:
+                self.sock.sendto(data, self.address)
+                self.lines_sent += 1
+                self.bytes_sent += len(data)
+            except OSError:
+                self.lines_dropped += 1
+
+class SensorSimulator:
+    """Runs a set of simulated devices from one thread"""
+
+    def __init__(self, config, sensor_names=None, rates=None, bursts=None, replays=None, loop=False,
+                 logger=None):
+        self.config = config
+        self.logger = logger or logging.getLogger('SensorSimulator')
+        self.running = False
+        self.devices = {}
+        self._thread = None
+
+        rates = rates or {}
+        bursts = bursts or {}
+        replays = replays or {}
+
+        for name, sensor_config in config.get('sensors', {}).items():
+            if sensor_names is not None and name not in sensor_names:
+                continue
+            if sensor_names is None and not sensor_config.get('enabled', True):
+                continue
+            emitter_class = EMITTERS.get(sensor_config.get('type'))
+            if emitter_class is None:
+                self.logger.info(f"No simulator for {name} ({sensor_config.get('type')}), skipping")
+                continue
+
+            emitter = emitter_class(sensor_config.get('column_names', []))
+            if name in replays:
+                emitter = ReplayEmitter(replays[name], loop=loop, inner=emitter)
+                emitter.rate = emitter.capture_rate or emitter.inner.rate or 1.0
+                emitter.line_ending = emitter.inner.line_ending
+
+            sim_config = sensor_config.get('simulator', {})
+            rate = rates.get(name, sim_config.get('rate'))
+            burst = bursts.get(name, sim_config.get('burst', 1))
+            jitter = sim_config.get('jitter', 0.0)
+
+            if sensor_config.get('type') == 'POPS':
+                address = ('127.0.0.1', int(sensor_config.get('udp_port', 10080)))
+                device = SimulatedUDPDevice(name, emitter, address, rate, burst, jitter)
+            else:
+                device = SimulatedDevice(name, emitter, rate, burst, jitter)
+            self.devices[name] = device
+
+    def open(self):
+        """Create every pty / socket; returns {sensor name: port}"""
+        ports = {}
+        for name, device in self.devices.items():
+            ports[name] = device.open()
+            self.logger.info(f"{name}: {ports[name]} ({device.rate:g} lines/s, burst {device.burst})")
+        return ports
+
+    def sim_config(self):
+        """Copy of the config with each simulated serial sensor pinned to its pty"""
+        config = json.loads(json.dumps(self.config))
+        for name, device in self.devices.items():
+            if not isinstance(device, SimulatedUDPDevice):
+                config['sensors'][name]['port'] = device.port
+        return config
+
+    def run(self, duration=None):
+        self.running = True
+        end = time.time() + duration if duration else None
+        while self.running and (end is None or time.time() < end):
+            now = time.time()
+            for device in self.devices.values():
+                if device.due(now):
+                    device.emit(now)
+
+            # Sleep until the next emission, waking early for commands from the sensors
+            now = time.time()
+            pending = [d.next_time for d in self.devices.values() if d.rate > 0]
+            timeout = max(0.0, min(pending) - now) if pending else 0.1
+            timeout = min(timeout, 0.1)
+            fds = [d.fileno() for d in self.devices.values() if d.fileno() is not None]
+            try:
+                readable, _, _ = select.select(fds, [], [], timeout)
+            except InterruptedError:
+                continue
+            for device in self.devices.values():
+                if device.fileno() in readable:
+                    device.handle_input()
+
+    def start(self):
+        """Run in a background thread (for tests and benchmarks)"""
+        self._thread = threading.Thread(target=self.run, name='sensor-simulator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        for device in self.devices.values():
+            device.close()
+
+    def stats(self):
+        return {
+            name: {
+                'lines_sent': d.lines_sent,
+                'data_lines': d.data_lines,
+                'bytes_sent': d.bytes_sent,
+                'lines_dropped': d.lines_dropped,
+                'commands': d.commands,
+            }
+            for name, d in self.devices.items()
+        }
+
+def _pairs(values, cast=str):
+    """['trisonica=40', ...] -> {'trisonica': 40}"""
+    out = {}
+    for item in values or []:
+        name, _, value = item.partition('=')
+        if not value:
+            raise argparse.ArgumentTypeError(f"Expected sensor=value, got {item!r}")
+        out[name.strip()] = cast(value)
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate the serial/UDP sensors on pty pairs')
+    parser.add_argument('--config', default='sensor_config.json', help='Path to sensor configuration file')
+    parser.add_argument('--sensors', help='Comma-separated sensor names (default: all enabled)')
+    parser.add_argument('--rate', action='append', help='sensor=lines_per_second (repeatable)')
+    parser.add_argument('--burst', action='append', help='sensor=lines_per_write (repeatable)')
+    parser.add_argument('--replay', action='append', help='sensor=capture.txt|capture.bin - replay recorded lines (repeatable)')
+    parser.add_argument('--loop', action='store_true', help='Loop replayed captures')
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+    parser.add_argument('--write-config', help='Write a copy of the config pointing at the ptys')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - Simulator - %(levelname)s - %(message)s')
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    names = [n.strip() for n in args.sensors.split(',')] if args.sensors else None
+    sim = SensorSimulator(
+        config,
+        sensor_names=names,
+        rates=_pairs(args.rate, float),
+        bursts=_pairs(args.burst, int),
+        replays=_pairs(args.replay),
+        loop=args.loop,
+    )
+    sim.open()
+
+    if args.write_config:
+        with open(args.write_config, 'w') as f:
+            json.dump(sim.sim_config(), f, indent=2)
+        sim.logger.info(f"Wrote {args.write_config}")
+
+    def stop(sig, frame):
+        sim.running = False
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        sim.run(args.duration)
+    finally:
+        for name, s in sim.stats().items():
+            sim.logger.info(f"{name}: {s['lines_sent']} lines, {s['bytes_sent']} bytes, "
+                            f"{s['lines_dropped']} dropped, {s['commands']} commands")
+        sim.close()
+
+if __name__ == "__main__":
+    main()
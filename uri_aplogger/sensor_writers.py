@@ -0,0 +1,521 @@
+# sensor_writers.py
+"""
+Output writers for sensor rows
+
+Sensors used to call csvfile.flush() after every row, which on the Pi's SD card
+means one tiny write syscall per sample per sensor. The writers here buffer rows
+and flush on a row count, on a time interval, or at shutdown, with an optional
+(slower) fsync cadence so a power cut loses at most a bounded amount of data.
+
+Besides CSV there is a typed binary backend: fixed-width records (column_names
+plus the sensor's "schema", see field_schema.py) appended to a chunked HDF5 table.
+Numbers are stored as numbers, so files are smaller and reload without parsing.
+"format" picks the backend(s); the merger and vitals still tail the CSV, so keep
+"csv" in the list for sensors they read. HDF5 files can be exported back to CSV:
+    python sensor_writers.py export output/pops/pops_data_20250101_120000.h5
+(--rx-time adds an rx_time column: rx_epoch_ns formatted to the millisecond.)
+
+Settings come from the "output" block in sensor_config.json (global, overridable
+per sensor):
+    format          - "csv", "hdf5", or a list such as ["csv", "hdf5"]
+    flush_rows      - flush after this many buffered rows (CSV)
+    flush_interval  - flush at least this often while rows are pending (seconds)
+    fsync_interval  - also fsync this often (seconds, 0 = never)
+    buffer_bytes    - size of the file buffer holding rows between flushes (CSV)
+    chunk_rows      - HDF5 chunk size in rows; a full chunk is written at once
+    compression     - HDF5 filter: "gzip", "lzf" or null
+    writer_thread   - hand rows to a per-sensor writer thread (true) or write inline (false)
+    max_queue_rows  - rows the writer thread may fall behind by before new rows are dropped
+    raw_capture     - also log every received chunk, see raw_capture.py
+    raw_buffer_bytes - raw capture write buffer size
+
+With writer_thread on, writerow() only appends the row to a deque; the writes,
+flushes and fsyncs happen on the writer thread, so an SD card stall delays the
+file, not the serial reads. If the card stalls long enough to fill the queue,
+rows are dropped (and counted) rather than blocking acquisition.
+"""
+
+import os
+import csv
+import json
+import math
+import time
+import logging
+import threading
+from collections import deque
+
+from field_schema import RX_TIME_COLUMNS, column_types, type_kind, format_epoch_ns
+
+try:
+    import numpy as np
+    import h5py
+except ImportError:
+    np = None
+    h5py = None
+
+DEFAULT_OUTPUT_CONFIG = {
+    'format': 'csv',
+    'flush_rows': 50,
+    'flush_interval': 1.0,
+    'fsync_interval': 0,
+    'buffer_bytes': 65536,
+    'chunk_rows': 512,
+    'compression': 'gzip',
+    'writer_thread': False,
+    'max_queue_rows': 10000,
+    'raw_capture': False,
+    'raw_buffer_bytes': 1 << 20,
+}
+
+# Stored for int columns that are empty or not a number
+INT_FILL = -1
+
+class CSVRowWriter:
+    """csv.writer with a write-behind buffer and flush/fsync cadence"""
+
+    def __init__(self, path, column_names=None, flush_rows=50, flush_interval=1.0,
+                 fsync_interval=0, buffer_bytes=65536, append=False, logger=None):
+        self.path = path
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = float(flush_interval)
+        self.fsync_interval = float(fsync_interval)
+        self.logger = logger
+
+        write_header = column_names and not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self._file = open(path, 'a' if append else 'w', newline='', buffering=int(buffer_bytes))
+        self._writer = csv.writer(self._file)
+
+        self.rows_written = 0
+        self.rows_pending = 0
+        self.flush_count = 0
+        self._last_flush = time.monotonic()
+        self._last_fsync = self._last_flush
+
+        if write_header:
+            self._writer.writerow(column_names)
+            self.flush()
+
+    def writerow(self, row):
+        """Buffer one row; flushes when the row budget or interval is used up"""
+        self._writer.writerow(row)
+        self.rows_written += 1
+        self.rows_pending += 1
+        if self.rows_pending >= self.flush_rows:
+            self.flush()
+        else:
+            self.maybe_flush()
+
+    def maybe_flush(self, now=None):
+        """Flush if rows have been pending longer than flush_interval - call this when idle too"""
+        if not self.rows_pending:
+            return False
+        now = time.monotonic() if now is None else now
+        if now - self._last_flush >= self.flush_interval:
+            self.flush(now=now)
+            return True
+        return False
+
+    def flush(self, sync=False, now=None):
+        """Push buffered rows to the OS; fsync too if asked or the fsync cadence is due"""
+        if self._file is None:
+            return
+        now = time.monotonic() if now is None else now
+        self._file.flush()
+        self.rows_pending = 0
+        self.flush_count += 1
+        self._last_flush = now
+
+        if sync or (self.fsync_interval > 0 and now - self._last_fsync >= self.fsync_interval):
+            try:
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                if self.logger:
+                    self.logger.warning(f"fsync failed for {self.path}: {e}")
+            self._last_fsync = now
+
+    def close(self):
+        """Final flush + fsync, then close"""
+        if self._file is None:
+            return
+        try:
+            self.flush(sync=True)
+        finally:
+            self._file.close()
+            self._file = None
+
+def _to_float(value):
+    if value is None or value == '':
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _to_int(value):
+    if value is None or value == '':
+        return INT_FILL
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError, OverflowError):
+            return INT_FILL
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    if value is None:
+        return b''
+    return str(value).encode('utf-8', errors='replace')
+
+_CONVERTERS = {'f': _to_float, 'i': _to_int, 'S': _to_bytes}
+
+class HDF5RowWriter:
+    """Typed fixed-width records appended chunk by chunk to an HDF5 table ('rows')"""
+
+    def __init__(self, path, column_names, schema=None, chunk_rows=512, compression='gzip',
+                 flush_interval=1.0, fsync_interval=0, append=False, logger=None):
+        if h5py is None:
+            raise RuntimeError("HDF5 output needs numpy and h5py (pip install h5py)")
+
+        self.path = path
+        self.column_names = list(column_names)
+        self.flush_interval = float(flush_interval)
+        self.fsync_interval = float(fsync_interval)
+        self.logger = logger
+
+        types = column_types(self.column_names, schema)
+        self.dtype = np.dtype([(name, t) for name, t in zip(self.column_names, types)])
+        self._converters = [_CONVERTERS[type_kind(t)] for t in types]
+        self._fill = tuple(conv('') for conv in self._converters)
+
+        # append=True (a restarted sensor with a fixed output_file) keeps the rows already there
+        self._file = h5py.File(path, 'a' if append else 'w')
+        if 'rows' in self._file:
+            self._dset = self._file['rows']
+            if self._dset.dtype != self.dtype:
+                self._file.close()
+                self._file = None
+                raise ValueError(f"Cannot append to {path}: its 'rows' table has different columns/types "
+                                 f"than the current column_names and schema")
+        else:
+            self._dset = self._file.create_dataset(
+                'rows',
+                shape=(0,),
+                maxshape=(None,),
+                dtype=self.dtype,
+                chunks=(int(chunk_rows),),
+                compression=compression or None,
+            )
+            self._dset.attrs['column_names'] = json.dumps(self.column_names)
+            self._dset.attrs['schema'] = json.dumps(schema or {})
+            self._dset.attrs['int_fill'] = INT_FILL
+
+        # One chunk's worth of rows is staged in memory and written in one go
+        self._buf = np.zeros(int(chunk_rows), dtype=self.dtype)
+
+        self.rows_written = 0
+        self.rows_pending = 0
+        self.flush_count = 0
+        self._last_flush = time.monotonic()
+        self._last_fsync = self._last_flush
+
+    def convert(self, row):
+        """Parsed row (strings or numbers) -> tuple matching self.dtype"""
+        n = len(self._converters)
+        values = tuple(conv(v) for conv, v in zip(self._converters, row))
+        if len(values) < n:
+            values += self._fill[len(values):]
+        return values
+
+    def writerow(self, row):
+        self._buf[self.rows_pending] = self.convert(row)
+        self.rows_pending += 1
+        self.rows_written += 1
+        if self.rows_pending >= len(self._buf):
+            self.flush()
+        else:
+            self.maybe_flush()
+
+    def maybe_flush(self, now=None):
+        if not self.rows_pending:
+            return False
+        now = time.monotonic() if now is None else now
+        if now - self._last_flush >= self.flush_interval:
+            self.flush(now=now)
+            return True
+        return False
+
+    def flush(self, sync=False, now=None):
+        if self._file is None:
+            return
+        now = time.monotonic() if now is None else now
+        n = self.rows_pending
+        if n:
+            start = self._dset.shape[0]
+            self._dset.resize((start + n,))
+            self._dset[start:start + n] = self._buf[:n]
+            self.rows_pending = 0
+        self._file.flush()
+        self.flush_count += 1
+        self._last_flush = now
+
+        if sync or (self.fsync_interval > 0 and now - self._last_fsync >= self.fsync_interval):
+            try:
+                os.fsync(self._file.id.get_vfd_handle())
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"fsync failed for {self.path}: {e}")
+            self._last_fsync = now
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            self.flush(sync=True)
+        finally:
+            self._file.close()
+            self._file = None
+
+class TeeWriter:
+    """Fans rows out to several writers (e.g. CSV for the merger + HDF5 for analysis)"""
+
+    def __init__(self, writers):
+        self.writers = list(writers)
+
+    @property
+    def rows_written(self):
+        return self.writers[0].rows_written if self.writers else 0
+
+    def writerow(self, row):
+        for w in self.writers:
+            w.writerow(row)
+
+    def maybe_flush(self, now=None):
+        now = time.monotonic() if now is None else now
+        flushed = False
+        for w in self.writers:
+            flushed = w.maybe_flush(now) or flushed
+        return flushed
+
+    def flush(self, sync=False, now=None):
+        for w in self.writers:
+            w.flush(sync=sync, now=now)
+
+    def close(self):
+        for w in self.writers:
+            try:
+                w.close()
+            except Exception:
+                pass
+
+# Queue markers for flush requests from the sensor thread
+_FLUSH = object()
+_SYNC = object()
+
+class ThreadedRowWriter:
+    """Write-behind wrapper: rows go through a deque to a writer thread that owns the real writer"""
+
+    def __init__(self, writer, name='sensor', max_queue_rows=10000, flush_interval=1.0, logger=None):
+        self.writer = writer
+        self.name = name
+        self.max_queue_rows = max(1, int(max_queue_rows))
+        self.flush_interval = float(flush_interval)
+        self.logger = logger or logging.getLogger(name)
+
+        # deque append/popleft are atomic, so the handoff needs no lock
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._closing = False
+
+        self.rows_queued = 0
+        self.rows_dropped = 0
+        self.max_depth = 0
+        self.write_errors = 0
+
+        self._thread = threading.Thread(target=self._run, name=f'{name}-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def rows_written(self):
+        return self.writer.rows_written
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def stats(self):
+        return {
+            'queue_depth': len(self._queue),
+            'max_depth': self.max_depth,
+            'rows_queued': self.rows_queued,
+            'rows_written': self.writer.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'write_errors': self.write_errors,
+        }
+
+    def writerow(self, row):
+        """Queue one row (never blocks; drops it if the writer is max_queue_rows behind)"""
+        depth = len(self._queue)
+        if depth >= self.max_queue_rows:
+            self.rows_dropped += 1
+            if self.rows_dropped == 1 or self.rows_dropped % 1000 == 0:
+                self.logger.warning(f"Writer queue full ({depth} rows), {self.rows_dropped} rows dropped so far")
+            return
+        self._queue.append(row)
+        self.rows_queued += 1
+        if depth >= self.max_depth:
+            self.max_depth = depth + 1
+        # Always: the depth we read may be stale if the thread just drained the
+        # queue, and a skipped wake would leave this row waiting a flush_interval
+        self._wake.set()
+
+    def maybe_flush(self, now=None):
+        # The writer thread keeps the flush cadence
+        return False
+
+    def flush(self, sync=False, now=None):
+        """Ask the writer thread to flush (asynchronous)"""
+        self._queue.append(_SYNC if sync else _FLUSH)
+        self._wake.set()
+
+    def _run(self):
+        writer = self.writer
+        queue = self._queue
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while queue:
+                item = queue.popleft()
+                try:
+                    if item is _FLUSH or item is _SYNC:
+                        writer.flush(sync=item is _SYNC)
+                    else:
+                        writer.writerow(item)
+                except Exception as e:
+                    self.write_errors += 1
+                    if self.write_errors == 1 or self.write_errors % 100 == 0:
+                        self.logger.error(f"Write error ({self.write_errors} so far): {e}")
+            try:
+                writer.maybe_flush()
+            except Exception as e:
+                self.write_errors += 1
+                self.logger.error(f"Flush error: {e}")
+            if self._closing and not queue:
+                return
+
+    def close(self):
+        """Drain the queue, stop the thread, then close the real writer"""
+        if self._thread is None:
+            return
+        self._closing = True
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        self.writer.close()
+        if self.rows_dropped or self.write_errors:
+            self.logger.warning(f"Writer stats: {self.stats()}")
+        else:
+            self.logger.debug(f"Writer stats: {self.stats()}")
+
+def output_settings(config):
+    """Writer settings for a sensor config, falling back to the defaults"""
+    return {**DEFAULT_OUTPUT_CONFIG, **(config or {}).get('output', {})}
+
+def create_writer(path, column_names, config, logger=None, append=False):
+    """
+    Build the row writer described by a sensor config's "output" block.
+    path is the CSV path; other formats use the same name with their own extension.
+    append=True adds to existing files (CSV and HDF5) instead of starting them over.
+    """
+    settings = output_settings(config)
+    formats = settings['format']
+    if isinstance(formats, str):
+        formats = [formats]
+
+    writers = []
+    for fmt in formats:
+        fmt = str(fmt).lower()
+        if fmt == 'csv':
+            writers.append(CSVRowWriter(
+                path,
+                column_names,
+                flush_rows=settings['flush_rows'],
+                flush_interval=settings['flush_interval'],
+                fsync_interval=settings['fsync_interval'],
+                buffer_bytes=settings['buffer_bytes'],
+                append=append,
+                logger=logger,
+            ))
+        elif fmt in ('hdf5', 'h5'):
+            writers.append(HDF5RowWriter(
+                os.path.splitext(path)[0] + '.h5',
+                column_names,
+                schema=(config or {}).get('schema'),
+                chunk_rows=settings['chunk_rows'],
+                compression=settings['compression'],
+                flush_interval=settings['flush_interval'],
+                fsync_interval=settings['fsync_interval'],
+                append=append,
+                logger=logger,
+            ))
+        else:
+            raise ValueError(f"Unknown output format: {fmt!r}")
+
+    if not writers:
+        raise ValueError("No output format configured")
+    writer = writers[0] if len(writers) == 1 else TeeWriter(writers)
+    if settings['writer_thread']:
+        writer = ThreadedRowWriter(writer,
+                                   name=os.path.basename(path).split('_data_')[0],
+                                   max_queue_rows=settings['max_queue_rows'],
+                                   flush_interval=settings['flush_interval'],
+                                   logger=logger)
+    return writer
+
+def export_csv(h5_path, csv_path=None, block_rows=65536, rx_time=False):
+    """
+    Write an HDF5 row table back out as CSV (same columns as the live CSV writer).
+    rx_time=True appends rx_epoch_ns as readable local time - formatted here, not while logging.
+    """
+    if h5py is None:
+        raise RuntimeError("Exporting HDF5 needs numpy and h5py (pip install h5py)")
+    csv_path = csv_path or os.path.splitext(h5_path)[0] + '.csv'
+
+    with h5py.File(h5_path, 'r') as f, open(csv_path, 'w', newline='') as out:
+        dset = f['rows']
+        names = list(dset.dtype.names)
+        rx_idx = names.index(RX_TIME_COLUMNS[0]) if rx_time and RX_TIME_COLUMNS[0] in names else None
+        writer = csv.writer(out)
+        writer.writerow(names + (['rx_time'] if rx_idx is not None else []))
+        for start in range(0, dset.shape[0], block_rows):
+            block = dset[start:start + block_rows]
+            for rec in block.tolist():
+                row = [
+                    v.decode('utf-8', errors='replace') if isinstance(v, bytes)
+                    else ('' if isinstance(v, float) and math.isnan(v) else v)
+                    for v in rec
+                ]
+                if rx_idx is not None:
+                    row.append(format_epoch_ns(rec[rx_idx]))
+                writer.writerow(row)
+    return csv_path
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Sensor output utilities')
+    sub = parser.add_subparsers(dest='command', required=True)
+    exp = sub.add_parser('export', help='Export an HDF5 sensor file to CSV')
+    exp.add_argument('h5_file', help='Path to the .h5 file')
+    exp.add_argument('csv_file', nargs='?', help='Output CSV (default: same name, .csv)')
+    exp.add_argument('--rx-time', action='store_true', help='Add rx_epoch_ns as a readable rx_time column')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        out = export_csv(args.h5_file, args.csv_file, rx_time=args.rx_time)
+        print(f"Exported {args.h5_file} -> {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# spectra_storage_bench.py
+"""
+Spectrometer HDF5 storage benchmark - write time, CPU and file size per layout
+
+Writes the same spectra through SpectraWriter once per storage case (profile x
+filter x compressor, see spectra_store.py) and reports per case:
+    wall and CPU seconds to write, spectra/s
+    file size, bytes per spectrum, size relative to the current float32+gzip layout
+    GB per flight hour at the configured integration time
+    max abs error after decoding (0 = lossless) and seconds to read everything back
+
+Spectra are synthetic by default (dark ~1000 counts plus a few emission/scatter
+features with shot noise, whole counts like intensities() delivers; every 50th
+spectrum saturates the 656 nm line at 65535); --input replays the intensities of
+a real flight file instead. dark_delta cases use --dark, the synthetic dark, or
+the per-pixel minimum of the input.
+
+    python spectra_storage_bench.py
+    python spectra_storage_bench.py --input output/spectro_data_20250101_120000.h5 --spectra 20000
+    python spectra_storage_bench.py --cases float32-gzip,counts-lzf --output storage.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+import h5py
+
+from spectra_store import SpectraWriter, hdf5_settings, intensity_decoder, valid_rows
+from spectral_stats import load_dark
+
+# name: SpectraWriter settings; the first one is the baseline everything is compared to
+CASES = {
+    'float32-gzip': {'storage': 'float32', 'compression': 'gzip'},
+    'float32-shuffle-gzip': {'storage': 'float32', 'compression': 'gzip', 'shuffle': True},
+    'counts-lzf': {'storage': 'counts', 'compression': 'lzf'},
+    'counts-gzip1': {'storage': 'counts', 'compression': 'gzip', 'compression_level': 1},
+    'counts-gzip4': {'storage': 'counts', 'compression': 'gzip', 'compression_level': 4},
+    'dark_delta-lzf': {'storage': 'dark_delta', 'compression': 'lzf'},
+    'dark_delta-gzip1': {'storage': 'dark_delta', 'compression': 'gzip', 'compression_level': 1},
+    # Narrower than the detector: clips bright pixels, shown for the size comparison
+    'dark_delta-int16-lzf': {'storage': 'dark_delta', 'dtype': 'int16', 'compression': 'lzf'},
+}
+
+def synthetic_spectra(n_spectra, n_pixels, seed=0):
+    """(wavelengths, dark, spectra) - whole counts in float32, like the ring holds them"""
+    rng = np.random.default_rng(seed)
+    wavelengths = np.linspace(190.0, 1100.0, n_pixels)
+    dark = 1000.0 + 20.0 * np.sin(np.arange(n_pixels) / 37.0) + rng.normal(0, 5, n_pixels)
+
+    # Broad scattered-light continuum plus a few lines, slowly varying in strength
+    shape = 8000.0 * np.exp(-0.5 * ((wavelengths - 550.0) / 150.0) ** 2)
+    for center, height in ((486.1, 6000.0), (656.3, 12000.0), (760.0, -3000.0)):
+        shape += height * np.exp(-0.5 * ((wavelengths - center) / 2.0) ** 2)
+    gain = 1.0 + 0.3 * np.sin(np.arange(n_spectra) / 500.0)
+
+    signal = np.maximum(gain[:, None] * shape[None, :], 0.0)
+    spectra = rng.poisson(signal) + dark[None, :] + rng.normal(0, 8, (n_spectra, n_pixels))
+    line = np.abs(wavelengths - 656.3) < 3.0
+    spectra[::50, line] = 65535.0
+    return wavelengths, dark, np.clip(np.rint(spectra), 0, 65535).astype(np.float32)
+
+def load_spectra(path, n_spectra):
+    """(wavelengths, spectra) from an existing spectrometer file, decoded to counts"""
+    with h5py.File(path, 'r') as f:
+        n = min(valid_rows(f), n_spectra)
+        decode = intensity_decoder(f)
+        return f['wavelengths'][()], decode(f['intensities'][:n])
+
+def bench_case(settings, wavelengths, spectra, dark, hdf5, block_rows, workdir, name):
+    """Write spectra with one storage setting, read them back; returns the measurements"""
+    path = os.path.join(workdir, f'{name}.h5')
+    n = len(spectra)
+    epoch_ns = time.time_ns() + np.arange(n, dtype=np.int64) * 100_000_000
+    timestamps = np.datetime_as_string(epoch_ns.astype('datetime64[ns]'), unit='us')
+
+    options = {key: hdf5[key] for key in ('chunk_rows', 'grow_chunks', 'swmr')}
+    options.update(settings)
+    if options['storage'] == 'dark_delta':
+        options['dark'] = dark
+
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    writer = SpectraWriter(path, wavelengths, flush_interval=hdf5['flush_interval'], **options)
+    for start in range(0, n, block_rows):
+        stop = start + block_rows
+        writer.append(spectra[start:stop], timestamps[start:stop], epoch_ns[start:stop])
+        writer.maybe_flush()
+    writer.close()
+    write_s, cpu_s = time.perf_counter() - wall0, time.process_time() - cpu0
+
+    read0 = time.perf_counter()
+    max_error = 0.0
+    with h5py.File(path, 'r') as f:
+        decode = intensity_decoder(f)
+        dset = f['intensities']
+        for start in range(0, n, dset.chunks[0] * 16):
+            stop = min(start + dset.chunks[0] * 16, n)
+            error = np.abs(decode(dset[start:stop]) - spectra[start:stop]).max()
+            max_error = max(max_error, float(error))
+    read_s = time.perf_counter() - read0
+
+    size = os.path.getsize(path)
+    os.remove(path)
+    return {
+        'settings': settings,
+        'write_s': round(write_s, 3),
+        'cpu_s': round(cpu_s, 3),
+        'spectra_per_s': round(n / write_s, 1) if write_s > 0 else None,
+        'file_bytes': size,
+        'bytes_per_spectrum': round(size / n, 1),
+        'clipped_values': writer.clipped,
+        'max_abs_error': max_error,
+        'read_s': round(read_s, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Spectrometer HDF5 storage benchmark')
+    parser.add_argument('--config', default='sensor_config.json', help='Path to sensor configuration file')
+    parser.add_argument('--input', help='Existing spectrometer .h5 file to replay instead of synthetic spectra')
+    parser.add_argument('--dark', help='Dark spectrum (.npy or text) for the dark_delta cases')
+    parser.add_argument('--spectra', type=int, default=5000, help='Spectra written per case')
+    parser.add_argument('--pixels', type=int, default=2048, help='Pixels per synthetic spectrum')
+    parser.add_argument('--block', type=int, default=16, help='Spectra per append (the processing block)')
+    parser.add_argument('--cases', default=','.join(CASES), help='Comma-separated cases to run')
+    parser.add_argument('--output', help='JSON results file')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    spectro = config.get('sensors', {}).get('spectro', {})
+    hdf5 = hdf5_settings(spectro)
+    integration_s = spectro.get('integration_time_micros', 100000) / 1e6
+
+    if args.input:
+        wavelengths, spectra = load_spectra(args.input, args.spectra)
+        dark = load_dark(args.dark, len(wavelengths)) if args.dark else spectra.min(axis=0)
+        source = args.input
+    else:
+        wavelengths, dark, spectra = synthetic_spectra(args.spectra, args.pixels)
+        if args.dark:
+            dark = load_dark(args.dark, len(wavelengths))
+        source = 'synthetic'
+
+    names = [n.strip() for n in args.cases.split(',')]
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        parser.error(f"Unknown cases {', '.join(unknown)} (one of {', '.join(CASES)})")
+
+    results = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'python': sys.version.split()[0],
+            'h5py': h5py.version.version,
+            'hdf5': h5py.version.hdf5_version,
+            'source': source,
+            'spectra': len(spectra),
+            'pixels': len(wavelengths),
+            'block_rows': args.block,
+            'integration_time_s': integration_s,
+            'hdf5': hdf5,
+        },
+        'cases': {},
+    }
+
+    workdir = tempfile.mkdtemp(prefix='apl_storage_bench_')
+    try:
+        for name in names:
+            print(f"Writing {len(spectra)} spectra as {name}...")
+            results['cases'][name] = bench_case(CASES[name], wavelengths, spectra, dark, hdf5,
+                                                args.block, workdir, name)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Relative to the current layout, and per flight hour at the configured cadence
+    baseline = results['cases'].get('float32-gzip')
+    spectra_per_hour = 3600.0 / integration_s
+    for r in results['cases'].values():
+        r['size_vs_float32_gzip'] = round(r['file_bytes'] / baseline['file_bytes'], 3) if baseline else None
+        r['gb_per_flight_hour'] = round(r['bytes_per_spectrum'] * spectra_per_hour / 1e9, 3)
+
+    print(f"\n{'case':<22}{'write s':>9}{'cpu s':>8}{'spectra/s':>11}{'B/spectrum':>12}"
+          f"{'vs f32gz':>10}{'GB/h':>8}{'max err':>9}{'read s':>8}")
+    for name, r in results['cases'].items():
+        ratio = '' if r['size_vs_float32_gzip'] is None else f"{r['size_vs_float32_gzip']:.2f}"
+        print(f"{name:<22}{r['write_s']:>9.2f}{r['cpu_s']:>8.2f}{r['spectra_per_s']:>11.0f}"
+              f"{r['bytes_per_spectrum']:>12.0f}{ratio:>10}{r['gb_per_flight_hour']:>8.2f}"
+              f"{r['max_abs_error']:>9.2g}{r['read_s']:>8.2f}")
+        if r['clipped_values']:
+            print(f"  {name}: {r['clipped_values']} values clipped to the storage dtype")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
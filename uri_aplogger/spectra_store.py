@@ -0,0 +1,272 @@
+# spectra_store.py
+"""
+Spectrometer HDF5 file, kept open for the whole flight in SWMR mode
+
+One h5py handle is opened when the spectrometer connects and closed at shutdown,
+instead of reopening the file (and rebuilding its B-trees and attrs) on every
+flush. The file is written single-writer/multiple-reader, so a quick-look plot
+or the merger can read it while it grows:
+
+    wavelengths   (n_pixels,)            float64
+    intensities   (capacity, n_pixels)   float32, chunks of chunk_rows spectra
+    timestamps    (capacity,)            S26 ISO time (fixed length - SWMR has no vlen strings)
+    epoch_ns      (capacity,)            int64 capture time
+    n_spectra     (1,)                   int64 rows actually written
+
+Datasets grow grow_chunks chunks at a time, always to a chunk boundary, so
+rows past n_spectra are preallocated padding - live readers must use
+n_spectra, not shape[0]. close() trims everything to n_spectra and writes the
+total_spectra / last_update attrs, so a finished file looks like the old layout.
+
+Storage profiles ("storage" in the hdf5 block) choose how intensities are kept:
+
+    float32      float32 as delivered (default, the original layout)
+    counts       raw detector counts as uint16 (or "dtype": "int32" for 18-bit
+                 detectors), shuffle filter on
+    dark_delta   counts minus the rounded "dark_file" spectrum as int32, shuffle on -
+                 dark pixels become small numbers around 0 that compress very well
+                 (shuffle groups the mostly-zero high bytes, so int32 costs little
+                 over int16)
+
+intensities() without nonlinearity correction returns whole counts, so the
+default dtypes are exact for detectors up to 16 bits (counts) and any detector
+(dark_delta). A narrower "dtype" (e.g. int16 for dark_delta, which only holds
+counts up to dark + 32767) is not: values outside its range are clipped,
+counted in attr clipped_values and logged. The intensities dataset carries storage,
+scale_factor and add_offset attrs, plus dark_reference naming the dataset that
+holds the subtracted dark; intensity_decoder(f) turns stored rows back into
+float32 for any layout. "compression" may be "gzip" (with "compression_level"
+1-9) or "lzf". spectra_storage_bench.py compares the profiles.
+
+Live reading:
+    with open_live(path) as f:
+        n = valid_rows(f)          # call refresh_live(f) before each poll
+        decode = intensity_decoder(f)
+        latest = decode(f['intensities'][n - 1])
+"""
+
+import time
+from datetime import datetime
+
+import numpy as np
+import h5py
+
+TIMESTAMP_DTYPE = 'S26'  # 2025-01-01T12:00:00.123456
+DEFAULT_CHUNK_ROWS = 64
+DEFAULT_GROW_CHUNKS = 16
+LIVE_DATASETS = ('intensities', 'timestamps', 'epoch_ns', 'n_spectra')
+
+# storage profile: (default dtype, shuffle filter)
+STORAGE_PROFILES = {
+    'float32': ('float32', False),
+    'counts': ('uint16', True),
+    'dark_delta': ('int32', True),
+}
+
+def hdf5_settings(sensor_config):
+    """The spectrometer's "hdf5" block with defaults filled in"""
+    settings = {
+        'chunk_rows': DEFAULT_CHUNK_ROWS,
+        'grow_chunks': DEFAULT_GROW_CHUNKS,
+        'flush_interval': 10.0,
+        'compression': 'gzip',
+        'compression_level': None,
+        'swmr': True,
+        'storage': 'float32',
+    }
+    settings.update((sensor_config or {}).get('hdf5', {}))
+    return settings
+
+class SpectraWriter:
+    """Append-only spectra file with one persistent handle"""
+
+    def __init__(self, path, wavelengths, chunk_rows=DEFAULT_CHUNK_ROWS, grow_chunks=DEFAULT_GROW_CHUNKS,
+                 flush_interval=10.0, compression='gzip', swmr=True, attrs=None, logger=None,
+                 storage='float32', dtype=None, shuffle=None, compression_level=None, dark=None):
+        if storage not in STORAGE_PROFILES:
+            raise ValueError(f"Unknown storage profile '{storage}' (one of {', '.join(STORAGE_PROFILES)})")
+        if storage == 'dark_delta' and dark is None:
+            raise ValueError("storage 'dark_delta' needs a dark spectrum")
+        self.path = path
+        self.logger = logger
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.grow_rows = self.chunk_rows * max(1, int(grow_chunks))
+        self.flush_interval = float(flush_interval)
+        self.num_pixels = len(wavelengths)
+
+        self.storage = storage
+        default_dtype, default_shuffle = STORAGE_PROFILES[storage]
+        self.dtype = np.dtype(dtype or default_dtype)
+        shuffle = default_shuffle if shuffle is None else bool(shuffle)
+        # Whole counts up to 2**24 are exact in float32, so the ring's blocks need no upcast
+        self.dark = None if storage != 'dark_delta' else np.rint(np.asarray(dark, dtype=np.float64)).astype(np.float32)
+        if self.dtype.kind in 'iu':
+            info = np.iinfo(self.dtype)
+            self.limits = (info.min, info.max)
+        else:
+            self.limits = None
+        self.clipped = 0
+        level = None if compression != 'gzip' else compression_level
+        packed = {'compression': compression, 'compression_opts': level}
+
+        self.n = 0
+        self.capacity = 0
+        self.flush_count = 0
+        self._last_flush = time.monotonic()
+
+        # libver='latest' is required for SWMR
+        self.f = h5py.File(path, 'w', libver='latest')
+        f = self.f
+        f.create_dataset('wavelengths', data=np.asarray(wavelengths), **packed)
+        f['wavelengths'].attrs['units'] = 'nanometers'
+        f['wavelengths'].attrs['description'] = 'Wavelength values for each pixel'
+
+        self.intensities = f.create_dataset('intensities', shape=(0, self.num_pixels),
+                                            maxshape=(None, self.num_pixels), dtype=self.dtype,
+                                            chunks=(self.chunk_rows, self.num_pixels), shuffle=shuffle, **packed)
+        self.intensities.attrs['storage'] = storage
+        self.intensities.attrs['units'] = 'counts'
+        self.intensities.attrs['scale_factor'] = 1.0
+        self.intensities.attrs['add_offset'] = 0.0
+        if self.dark is not None:
+            f.create_dataset('dark_reference', data=self.dark)
+            f['dark_reference'].attrs['description'] = 'Dark spectrum (rounded counts) subtracted before storage'
+            self.intensities.attrs['dark_reference'] = 'dark_reference'
+        self.timestamps = f.create_dataset('timestamps', shape=(0,), maxshape=(None,), dtype=TIMESTAMP_DTYPE,
+                                           chunks=(self.chunk_rows * 16,), **packed)
+        self.epoch_ns = f.create_dataset('epoch_ns', shape=(0,), maxshape=(None,), dtype=np.int64,
+                                         chunks=(self.chunk_rows * 16,), **packed)
+        self.n_spectra = f.create_dataset('n_spectra', data=np.zeros(1, dtype=np.int64))
+
+        # All attrs go in before SWMR starts - they can't change while it's on
+        f.attrs['creation_date'] = datetime.now().isoformat()
+        f.attrs['num_pixels'] = self.num_pixels
+        f.attrs['chunk_rows'] = self.chunk_rows
+        for key, value in (attrs or {}).items():
+            f.attrs[key] = value
+
+        self.swmr = bool(swmr)
+        if self.swmr:
+            f.swmr_mode = True
+
+    def _grow(self, needed):
+        """Extend every row dataset to the next grow_rows boundary past needed"""
+        capacity = -(-needed // self.grow_rows) * self.grow_rows
+        self.intensities.resize((capacity, self.num_pixels))
+        self.timestamps.resize((capacity,))
+        self.epoch_ns.resize((capacity,))
+        self.capacity = capacity
+
+    def append(self, intensities, timestamps, epoch_ns):
+        """
+        Append a block of spectra: (k, n_pixels) intensities, k ISO timestamp strings
+        (or bytes), k int64 epoch_ns. Readers see the rows after the next flush.
+        """
+        k = len(intensities)
+        if not k:
+            return 0
+        end = self.n + k
+        if end > self.capacity:
+            self._grow(end)
+        self.intensities[self.n:end] = self.encode(intensities)
+        self.timestamps[self.n:end] = np.asarray(timestamps, dtype=TIMESTAMP_DTYPE)
+        self.epoch_ns[self.n:end] = np.asarray(epoch_ns, dtype=np.int64)
+        self.n = end
+        return k
+
+    def encode(self, intensities):
+        """Intensities block in the storage dtype (dark subtracted, rounded, clipped)"""
+        x = np.asarray(intensities, dtype=np.float32)
+        if self.limits is None:
+            return x
+        if self.dark is not None:
+            x = x - self.dark
+        lo, hi = self.limits
+        clipped = np.count_nonzero((x < lo) | (x > hi))
+        if clipped:
+            if not self.clipped and self.logger:
+                self.logger.warning(f"{self.storage} storage: {clipped} values outside {self.dtype} range, clipping")
+            self.clipped += clipped
+            x = np.clip(x, lo, hi)
+        return np.rint(x).astype(self.dtype)
+
+    def maybe_flush(self, now=None):
+        now = time.monotonic() if now is None else now
+        if now - self._last_flush >= self.flush_interval:
+            self.flush(now)
+            return True
+        return False
+
+    def flush(self, now=None):
+        """Make appended rows visible: data first, then the n_spectra that covers them"""
+        if self.f is None:
+            return
+        self.intensities.flush()
+        self.timestamps.flush()
+        self.epoch_ns.flush()
+        self.n_spectra[0] = self.n
+        self.n_spectra.flush()
+        if not self.swmr:
+            self.f.flush()
+        self.flush_count += 1
+        self._last_flush = time.monotonic() if now is None else now
+
+    def close(self):
+        """Final flush, then trim the preallocated padding and stamp the totals"""
+        if self.f is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.f.close()
+            self.f = None
+        # Shrinking and attrs aren't allowed under SWMR - one short reopen at the end
+        with h5py.File(self.path, 'a') as f:
+            for name in ('intensities', 'timestamps', 'epoch_ns'):
+                shape = list(f[name].shape)
+                shape[0] = self.n
+                f[name].resize(tuple(shape))
+            f['intensities'].attrs['clipped_values'] = self.clipped
+            f.attrs['total_spectra'] = self.n
+            f.attrs['last_update'] = datetime.now().isoformat()
+
+def intensity_decoder(f):
+    """
+    Function turning rows read from f['intensities'] back into float32 counts,
+    whatever the storage profile (files from before profiles: unchanged).
+    Reads of a pixel subset pass the same selection: decode(raw, pixels=idx)
+    """
+    attrs = f['intensities'].attrs
+    scale = float(attrs.get('scale_factor', 1.0))
+    offset = float(attrs.get('add_offset', 0.0))
+    dark_name = attrs.get('dark_reference')
+    dark = None
+    if dark_name is not None:
+        dark = f[dark_name.decode() if isinstance(dark_name, bytes) else dark_name][()].astype(np.float32)
+
+    def decode(raw, pixels=slice(None)):
+        x = np.asarray(raw, dtype=np.float32)
+        if scale != 1.0:
+            x = x * np.float32(scale)
+        if offset:
+            x = x + np.float32(offset)
+        if dark is not None:
+            x = x + dark[pixels]
+        return x
+    return decode
+
+def open_live(path):
+    """Reader handle that is safe while SpectraWriter is still appending"""
+    return h5py.File(path, 'r', libver='latest', swmr=True)
+
+def refresh_live(f):
+    """Pick up rows flushed since the last poll"""
+    for name in LIVE_DATASETS:
+        if name in f:
+            f[name].refresh()
+
+def valid_rows(f):
+    """Rows actually written (files without n_spectra: every row)"""
+    if 'n_spectra' in f:
+        return int(f['n_spectra'][0])
+    return f['intensities'].shape[0]
@@ -12,10 +12,23 @@ from datetime import datetime
 import logging
 import signal
 import sys
+import json
+import threading
 from pathlib import Path
 import numpy as np
 import h5py
 
+from status_channel import StatusReporter
+from latest_board import LatestBoard, BoardPublisher, board_enabled
+from sensor_writers import CSVRowWriter, output_settings
+from spectra_store import SpectraWriter, hdf5_settings
+from spectrum_ring import SpectrumRing, DEFAULT_RING_SLOTS
+from spectral_stats import SpectralProcessor, BASE_COLUMNS, band_columns, load_dark
+
+def summary_columns(bands=None):
+    """Summary CSV header - new derived columns go after 'status' so old readers keep their positions"""
+    return ['Timestamp'] + BASE_COLUMNS + ['total_points', 'status', 'centroid_wavelength'] + band_columns(bands)
+
 class HDF5Spectrometer:
     def __init__(self, summary_interval=60):
         """
@@ -26,6 +39,10 @@ class HDF5Spectrometer:
         self.running = True
         self.consecutive_failures = 0
         self.max_failures = 3
+        # Heartbeat counters
+        self.failed_scans = 0
+        self.reconnects = 0
+        self._last_spectrum_mono = None
         self.reconnect_delay = 2
         self.summary_interval = summary_interval
         
@@ -43,12 +60,29 @@ class HDF5Spectrometer:
         
         # Data buffers
         self.wavelengths = None
-        self.spectra_buffer = []  # Buffer for intensity arrays
-        self.timestamps_buffer = []  # Buffer for timestamps
-        self.buffer_size = 100  # Number of spectra to buffer before writing to HDF5
+        self.ring = None  # acquisition thread -> processing thread (spectrum_ring.py)
+        self.processor = None  # block statistics (spectral_stats.py), set up on first connect
+        self.buffer_size = 100  # Max spectra taken off the ring and written per block
+        self.measurement_count = 0
+        self._acq_thread = None
+
+        # Persistent handles, opened once (HDF5 on first connect, summary CSV in run)
+        self.store = None
+        self.summary_writer = None
         
         self.setup_logging()
+        self.config = self.load_config()
+        self.sensor_config = self.config.get('sensors', {}).get('spectro', {})
+        self.hdf5_settings = hdf5_settings(self.sensor_config)
+        self.integration_time_micros = int(self.sensor_config.get('integration_time_micros', 100000))
+        self.ring_slots = int(self.sensor_config.get('ring_slots', DEFAULT_RING_SLOTS))
+        # Readiness to runall.py (None when run by hand)
+        self.status = StatusReporter.from_env('spectro')
+        # Summary values on the latest-value board, so vx.py / vitals see spectro like any other sensor
+        self.board_publisher = self.setup_board()
         signal.signal(signal.SIGINT, self.signal_handler)
+        # runall.py stops us with terminate() - the SWMR file must still be closed and trimmed
+        signal.signal(signal.SIGTERM, self.signal_handler)
     
     def setup_logging(self):
         logging.basicConfig(
@@ -61,6 +95,28 @@ class HDF5Spectrometer:
         )
         self.logger = logging.getLogger()
     
+    def load_config(self, config_file='sensor_config.json'):
+        """Full sensor_config.json (empty if missing - everything has defaults)"""
+        try:
+            with open(config_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning(f"Could not load {config_file}: {e}")
+            return {}
+
+    def setup_board(self):
+        """Publisher for the 'spectro' board slot (None if the board is off or unavailable)"""
+        config = self.config
+        try:
+            if not board_enabled(config) or 'spectro' not in config.get('sensors', {}):
+                return None
+            publisher = BoardPublisher(LatestBoard.open(config), 'spectro')
+            self.logger.info(f"Publishing summary values to board slot {publisher.slot}")
+            return publisher
+        except Exception as e:
+            self.logger.warning(f"Latest-value board unavailable: {e}")
+            return None
+
     def signal_handler(self, sig, frame):
         self.logger.info("Stopping Spectrometer data collection...")
         self.running = False
@@ -74,13 +130,14 @@ class HDF5Spectrometer:
                 return False
             
             self.spec = sb.Spectrometer(devices[0])
-            self.spec.integration_time_micros(100000)  # 100ms
+            self.spec.integration_time_micros(self.integration_time_micros)
             
             # Get wavelengths once (they're fixed for the device)
             self.wavelengths = self.spec.wavelengths()
             self.num_pixels = len(self.wavelengths)
             
-            # Initialize HDF5 file with wavelengths dataset
+            # Initialize block statistics and the HDF5 file with wavelengths dataset
+            self.setup_processor()
             self.init_hdf5_file()
             
             self.logger.info(f"Connected to: {self.spec.model}")
@@ -95,121 +152,219 @@ class HDF5Spectrometer:
         except Exception as e:
             self.logger.warning(f"Connection failed: {e}")
             self.consecutive_failures += 1
+            # A device opened before the failure would otherwise stay claimed
+            self.close_spectrometer()
             return False
     
+    def setup_processor(self):
+        """Band windows and dark spectrum from config (once - the wavelengths don't change)"""
+        if self.processor is not None:
+            return
+        dark = None
+        dark_file = self.sensor_config.get('dark_file')
+        if dark_file:
+            try:
+                dark = load_dark(dark_file, self.num_pixels)
+                self.logger.info(f"Subtracting dark spectrum from {dark_file}")
+            except Exception as e:
+                self.logger.warning(f"Could not load dark spectrum {dark_file}: {e}")
+        self.processor = SpectralProcessor(self.wavelengths, self.sensor_config.get('bands'), dark)
+
     def init_hdf5_file(self):
-        """Initialize HDF5 file with proper structure"""
+        """Open the HDF5 file once - reconnects keep appending to the same file"""
+        if self.store is not None:
+            return
         # Ensure directory exists
         Path('output').mkdir(exist_ok=True)
-        
-        with h5py.File(self.hdf5_file, 'w') as f:
-            # Store wavelengths as a fixed dataset (these don't change)
-            f.create_dataset('wavelengths', data=self.wavelengths, compression='gzip')
-            f['wavelengths'].attrs['units'] = 'nanometers'
-            f['wavelengths'].attrs['description'] = 'Wavelength values for each pixel'
-            
-            # Create resizable datasets for intensities and timestamps
-            # We'll use maxshape=(None,) to allow unlimited growth
-            f.create_dataset('intensities', 
-                           shape=(0, self.num_pixels),
-                           maxshape=(None, self.num_pixels),
-                           dtype=np.float32,
-                           compression='gzip',
-                           chunks=(min(100, self.buffer_size), self.num_pixels))
-            
-            f.create_dataset('timestamps', 
-                           shape=(0,),
-                           maxshape=(None,),
-                           dtype=h5py.string_dtype(encoding='utf-8'),
-                           compression='gzip')
-            
-            # Add metadata
-            f.attrs['creation_date'] = datetime.now().isoformat()
-            f.attrs['instrument_model'] = str(self.spec.model) if self.spec else 'Unknown'
-            f.attrs['integration_time'] = 100  # ms
-            f.attrs['num_pixels'] = self.num_pixels
-            f.attrs['buffer_size'] = self.buffer_size
-    
-    def append_to_hdf5(self):
-        """Append buffered spectra to HDF5 file"""
-        if not self.spectra_buffer:
-            return
-        
-        try:
-            # Convert buffers to numpy arrays
-            spectra_array = np.array(self.spectra_buffer, dtype=np.float32)
-            timestamps_array = np.array(self.timestamps_buffer, dtype=h5py.string_dtype(encoding='utf-8'))
-            
-            with h5py.File(self.hdf5_file, 'a') as f:
-                # Get current sizes
-                n_existing = f['intensities'].shape[0]
-                n_new = len(self.spectra_buffer)
-                
-                # Resize datasets
-                f['intensities'].resize((n_existing + n_new, self.num_pixels))
-                f['timestamps'].resize((n_existing + n_new,))
-                
-                # Write new data
-                f['intensities'][n_existing:n_existing + n_new] = spectra_array
-                f['timestamps'][n_existing:n_existing + n_new] = timestamps_array
-                
-                # Update metadata
-                f.attrs['last_update'] = datetime.now().isoformat()
-                f.attrs['total_spectra'] = n_existing + n_new
-            
-            self.logger.info(f"Appended {n_new} spectra to HDF5 (total: {n_existing + n_new})")
-            
-            # Clear buffers
-            self.spectra_buffer.clear()
-            self.timestamps_buffer.clear()
-            
-        except Exception as e:
-            self.logger.error(f"Error writing to HDF5: {e}")
-            import traceback
-            self.logger.error(traceback.format_exc())
+
+        settings = dict(self.hdf5_settings)
+        if settings['storage'] == 'dark_delta':
+            if self.processor.dark is None:
+                self.logger.warning("dark_delta storage needs a dark_file - storing raw counts instead")
+                settings['storage'] = 'counts'
+            else:
+                settings['dark'] = self.processor.dark
+
+        self.store = SpectraWriter(
+            self.hdf5_file, self.wavelengths,
+            attrs={
+                'instrument_model': str(self.spec.model) if self.spec else 'Unknown',
+                'integration_time': self.integration_time_micros / 1000,  # ms
+                'buffer_size': self.buffer_size,
+                'bands': json.dumps(self.processor.bands),
+                # Raw counts are stored; the dark used for the summary is kept alongside
+                **({'dark_spectrum': self.processor.dark} if self.processor.dark is not None else {}),
+            },
+            logger=self.logger,
+            **settings)
+        self.logger.info(f"HDF5 storage: {self.store.storage} ({self.store.dtype}, {settings['compression']})")
     
     def get_spectrum(self):
-        """Get complete spectrum"""
+        """One raw spectrum and its capture time (epoch ns), or None"""
         if not self.spec:
             return None
         
         try:
             intensities = self.spec.intensities()
+            epoch_ns = time.time_ns()
             
             if len(intensities) == 0:
                 self.logger.warning("Empty spectrum data")
                 self.consecutive_failures += 1
+                self.failed_scans += 1
                 return None
             
-            # Calculate summary statistics
-            max_intensity = intensities.max()
-            peak_wavelength = self.wavelengths[intensities.argmax()]
-            
-            return {
-                'intensities': intensities.astype(np.float32),
-                'peak_wavelength': peak_wavelength,
-                'max_intensity': max_intensity,
-                'timestamp': datetime.now()
-            }
+            return intensities, epoch_ns
             
         except Exception as e:
             self.logger.warning(f"Measurement failed: {e}")
             self.consecutive_failures += 1
-            self.spec = None
+            self.failed_scans += 1
+            # Release the USB handle before the acquisition thread reconnects,
+            # or the new open can fail with the device still claimed
+            self.close_spectrometer()
             return None
+
+    def acquire_loop(self):
+        """
+        Acquisition thread: intensities() back to back, so the cadence is the
+        integration time; every spectrum is copied straight into the ring
+        """
+        while self.running:
+            if not self.spec:
+                time.sleep(self.reconnect_delay)
+                if self.running and self.connect():
+                    self.reconnects += 1
+                continue
+
+            result = self.get_spectrum()
+            if result is None:
+                if self.spec and self.consecutive_failures >= self.max_failures:
+                    self.logger.warning("Too many failures, attempting recovery...")
+                    self.close_spectrometer()
+                continue
+
+            self.consecutive_failures = 0
+            if not self.ring.put(*result) and self.ring.overruns % 100 == 1:
+                self.logger.warning(f"Processing is behind, dropped {self.ring.overruns} spectra so far")
+
+    def close_spectrometer(self):
+        """Close the device handle (errors ignored - it may already be gone)"""
+        spec, self.spec = self.spec, None
+        if spec:
+            try:
+                spec.close()
+            except Exception:
+                pass
+
+    def process_block(self, timeout=0.5):
+        """
+        Processing/writer side: take the next block of spectra off the ring, append
+        it to HDF5, write summary rows and publish the newest one. Returns spectra handled.
+        """
+        block = self.ring.get_block(self.buffer_size, timeout)
+        if block is None:
+            return 0
+        start, count = block
+        spectra = self.ring.data[start:start + count]
+        epochs = self.ring.epoch_ns[start:start + count]
+        try:
+            times = [datetime.fromtimestamp(ns / 1e9) for ns in epochs.tolist()]
+
+            try:
+                self.store.append(spectra, [t.isoformat(timespec='microseconds') for t in times], epochs)
+            except Exception as e:
+                self.logger.error(f"Error writing to HDF5: {e}")
+
+            # Every statistic for the whole block in one vectorized pass
+            stats = self.processor.process(spectra)
+            peak_wavelength = stats['peak_wavelength'].tolist()
+            max_intensity = stats['max_intensity'].tolist()
+            mean_intensity = stats['mean_intensity'].tolist()
+            std_intensity = stats['std_intensity'].tolist()
+            centroid = stats['centroid_wavelength'].tolist()
+            bands = [stats[column].tolist() for column in band_columns(self.processor.bands)]
+            n_pixels = self.processor.n_pixels
+
+            # Summary rows through the open writer (flushed every flush_interval)
+            row = None
+            for i, t in enumerate(times):
+                row = [
+                    t.strftime("%Y-%m-%d %H:%M:%S"),
+                    f"{peak_wavelength[i]:.4f}",
+                    f"{max_intensity[i]:.2f}",
+                    f"{mean_intensity[i]:.2f}",
+                    f"{std_intensity[i]:.2f}",
+                    n_pixels,
+                    'success',
+                    f"{centroid[i]:.4f}",
+                ] + [f"{band[i]:.6g}" for band in bands]
+                try:
+                    self.summary_writer.writerow(row)
+                except Exception as e:
+                    self.logger.error(f"Error writing to summary CSV: {e}")
+
+            # Newest spectrum only - the board holds latest values
+            if self.board_publisher and row:
+                try:
+                    self.board_publisher.publish_row(row)
+                except Exception as e:
+                    self.logger.debug(f"Board publish failed: {e}")
+        finally:
+            self.ring.release(count)
+
+        previous = self.measurement_count
+        self.measurement_count += count
+        self._last_spectrum_mono = time.monotonic()
+        if self.status and not self.status.ready_sent:
+            self.status.ready(rows=self.measurement_count, output=self.summary_csv)
+
+        # Log every 10 measurements
+        if self.measurement_count // 10 != previous // 10:
+            self.logger.info(
+                f"Scan {self.measurement_count}: Peak {peak_wavelength[-1]:.1f} nm, "
+                f"Max intensity {max_intensity[-1]:.0f}, Centroid {centroid[-1]:.1f} nm"
+            )
+        return count
     
+    def report_status(self):
+        """Heartbeat to runall.py (no-op when run by hand)"""
+        now = time.monotonic()
+        if not self.status or not self.status.heartbeat_due(now):
+            return
+        age = now - self._last_spectrum_mono if self._last_spectrum_mono is not None else None
+        self.status.heartbeat(self.measurement_count, now,
+                              parse_errors=self.failed_scans,
+                              reconnects=self.reconnects,
+                              last_sample_age=round(age, 3) if age is not None else None,
+                              writer={**self.ring.stats(), 'hdf5_rows': self.store.n if self.store else 0,
+                                      'hdf5_clipped': self.store.clipped if self.store else 0})
+
     def init_summary_csv(self):
-        """Initialize summary CSV file"""
+        """Open the summary CSV once, with the usual output buffering/flush settings"""
         Path('output').mkdir(exist_ok=True)
         
-        with open(self.summary_csv, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'Timestamp', 'peak_wavelength', 'max_intensity', 
-                'mean_intensity', 'std_intensity', 'total_points', 'status'
-            ])
+        settings = output_settings({'output': {**self.config.get('output', {}), **self.sensor_config.get('output', {})}})
+        self.summary_writer = CSVRowWriter(self.summary_csv, summary_columns(self.sensor_config.get('bands')),
+                                           flush_rows=settings['flush_rows'],
+                                           flush_interval=settings['flush_interval'],
+                                           fsync_interval=settings['fsync_interval'],
+                                           buffer_bytes=settings['buffer_bytes'],
+                                           logger=self.logger)
         self.logger.info(f"Initialized summary CSV: {self.summary_csv}")
     
+    def close_outputs(self):
+        """Close the HDF5 file (trims its preallocated rows) and the summary CSV"""
+        for name in ('store', 'summary_writer'):
+            handle = getattr(self, name)
+            if handle is None:
+                continue
+            try:
+                handle.close()
+            except Exception as e:
+                self.logger.error(f"Error closing {name}: {e}")
+            setattr(self, name, None)
+
     def save_summary(self):
         """Save summary statistics to CSV"""
         if not self.summary_data:
@@ -227,16 +382,14 @@ class HDF5Spectrometer:
             self.logger.error(f"Error saving summary CSV: {e}")
     
     def run(self):
-        """Main data collection loop"""
+        """Connect, then run the acquisition thread and process its spectra here"""
         self.logger.info(f"Starting Spectrometer data collection")
         
         # Initialize summary CSV
         self.init_summary_csv()
         
         # Initial connection
-        measurement_count = 0
         last_connection_attempt = time.time()
-        last_hdf5_write = time.time()
         
         # Wait for initial connection
         while not self.spec and self.running:
@@ -250,73 +403,21 @@ class HDF5Spectrometer:
         
         if not self.spec:
             self.logger.error("Failed to connect to spectrometer")
+            self.close_outputs()
             return
+
+        self.ring = SpectrumRing(self.num_pixels, self.ring_slots)
+        self._acq_thread = threading.Thread(target=self.acquire_loop, name='spectro-acquire', daemon=True)
+        self._acq_thread.start()
+        self.logger.info(f"Acquiring at {self.integration_time_micros / 1000:.1f} ms integration "
+                         f"(ring of {self.ring.slots} spectra)")
         
         try:
             while self.running:
-                current_time = time.time()
-                
-                # Data collection
-                spectrum = self.get_spectrum()
-                
-                if spectrum:
-                    measurement_count += 1
-                    
-                    # Buffer spectrum for HDF5
-                    self.spectra_buffer.append(spectrum['intensities'])
-                    self.timestamps_buffer.append(spectrum['timestamp'].isoformat())
-                    
-                    # Calculate additional statistics
-                    mean_intensity = spectrum['intensities'].mean()
-                    std_intensity = spectrum['intensities'].std()
-                    
-                    # Write summary to CSV IMMEDIATELY (no buffering)
-                    try:
-                        with open(self.summary_csv, 'a', newline='') as f:
-                            writer = csv.writer(f)
-                            writer.writerow([
-                                spectrum['timestamp'].strftime("%Y-%m-%d %H:%M:%S"),
-                                f"{spectrum['peak_wavelength']:.4f}",
-                                f"{spectrum['max_intensity']:.2f}",
-                                f"{mean_intensity:.2f}",
-                                f"{std_intensity:.2f}",
-                                len(spectrum['intensities']),
-                                'success'
-                            ])
-                    except Exception as e:
-                        self.logger.error(f"Error writing to summary CSV: {e}")
-                    
-                    # Log every 10 measurements
-                    if measurement_count % 10 == 0:
-                        self.logger.info(
-                            f"Scan {measurement_count}: Peak {spectrum['peak_wavelength']:.1f} nm, "
-                            f"Max intensity {spectrum['max_intensity']:.0f}"
-                        )
-                    
-                    self.consecutive_failures = 0
-                
-                # Flush buffer to HDF5 when full or every 10 seconds
-                if (len(self.spectra_buffer) >= self.buffer_size or 
-                    current_time - last_hdf5_write >= 10):
-                    if self.spectra_buffer:
-                        self.append_to_hdf5()
-                        last_hdf5_write = current_time
-                
-                # Failure handling
-                if self.consecutive_failures >= self.max_failures:
-                    self.logger.warning("Too many failures, attempting recovery...")
-                    # Flush any remaining data before reconnecting
-                    if self.spectra_buffer:
-                        self.append_to_hdf5()
-                    
-                    self.spec = None
-                    time.sleep(self.reconnect_delay)
-                    
-                    # Try to reconnect
-                    if self.connect():
-                        self.consecutive_failures = 0
-                
-                time.sleep(0.5)  # Collect data every 0.5 seconds
+                self.process_block(timeout=0.5)
+                self.store.maybe_flush()
+                self.summary_writer.maybe_flush()
+                self.report_status()
                 
         except KeyboardInterrupt:
             self.logger.info(f"Keyboard interrupt received")
@@ -325,19 +426,26 @@ class HDF5Spectrometer:
             import traceback
             self.logger.error(traceback.format_exc())
         finally:
-            # Final flush on shutdown
+            # Stop acquiring, then write out whatever is still in the ring
             self.logger.info("Shutting down, flushing remaining data...")
-            if self.spectra_buffer:
-                self.append_to_hdf5()
+            self.running = False
+            try:
+                self._acq_thread.join(timeout=self.integration_time_micros / 1e6 + 5)
+                while self.process_block(timeout=0):
+                    pass
+            except Exception as e:
+                self.logger.error(f"Error flushing remaining spectra: {e}")
+            finally:
+                # Always: an unclosed SWMR file stays flagged open-for-write
+                self.close_outputs()
             
             if self.spec:
-                try:
-                    self.spec.close()
-                    self.logger.info("Spectrometer closed")
-                except:
-                    pass
+                self.close_spectrometer()
+                self.logger.info("Spectrometer closed")
             
-            self.logger.info(f"Stopped after {measurement_count} measurements")
+            stats = self.ring.stats()
+            self.logger.info(f"Stopped after {self.measurement_count} measurements "
+                             f"({stats['ring_overruns']} dropped, max ring depth {stats['ring_max_depth']})")
             self.logger.info(f"HDF5 file: {self.hdf5_file}")
             self.logger.info(f"CSV file: {self.summary_csv}")
 
@@ -348,7 +456,7 @@ def main():
     parser.add_argument('--summary-interval', type=int, default=60,
                        help='Interval for saving summary to CSV (seconds)')
     parser.add_argument('--buffer-size', type=int, default=100,
-                       help='Number of spectra to buffer before writing to HDF5')
+                       help='Max spectra processed and written to HDF5 per block')
     
     args = parser.parse_args()
     
@@ -0,0 +1,83 @@
+# spectrum_ring.py
+"""
+Preallocated ring of spectrum buffers between the spectrometer's acquisition
+thread and its processing/writer thread
+
+The acquisition thread calls intensities() back to back and copies each
+spectrum into the next free slot (no per-spectrum allocation on our side).
+The processing thread takes contiguous blocks of filled slots as
+(n_spectra, n_pixels) views, works on them, then releases them. One producer,
+one consumer: slots are written outside the lock and only become visible when
+the head moves, so the copy never blocks the reader.
+
+If processing falls a whole ring behind, new spectra are dropped and counted
+in overruns rather than blocking the instrument.
+"""
+
+import threading
+
+import numpy as np
+
+DEFAULT_RING_SLOTS = 256
+
+class SpectrumRing:
+    def __init__(self, n_pixels, slots=DEFAULT_RING_SLOTS, dtype=np.float32):
+        self.slots = max(2, int(slots))
+        self.n_pixels = int(n_pixels)
+        self.data = np.zeros((self.slots, self.n_pixels), dtype=dtype)
+        self.epoch_ns = np.zeros(self.slots, dtype=np.int64)
+
+        self._head = 0  # spectra put so far
+        self._tail = 0  # spectra released so far
+        self._cond = threading.Condition()
+
+        self.overruns = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self):
+        return self._head - self._tail
+
+    def put(self, spectrum, epoch_ns):
+        """Copy one spectrum in (producer). False if the ring is full and it was dropped."""
+        with self._cond:
+            depth = self._head - self._tail
+            if depth >= self.slots:
+                self.overruns += 1
+                return False
+            i = self._head % self.slots
+        # Slot i is ours until the head moves past it
+        self.data[i] = spectrum
+        self.epoch_ns[i] = epoch_ns
+        with self._cond:
+            self._head += 1
+            self.max_depth = max(self.max_depth, depth + 1)
+            self._cond.notify()
+        return True
+
+    def get_block(self, max_rows=None, timeout=None):
+        """
+        (start, count) of the oldest contiguous run of filled slots (consumer), or
+        None on timeout. Read self.data[start:start + count] / self.epoch_ns[...],
+        then release(count).
+        """
+        with self._cond:
+            if self._head == self._tail and not self._cond.wait_for(lambda: self._head > self._tail, timeout):
+                return None
+            start = self._tail % self.slots
+            count = min(self._head - self._tail, self.slots - start)
+        if max_rows:
+            count = min(count, int(max_rows))
+        return start, count
+
+    def release(self, count):
+        with self._cond:
+            self._tail += count
+
+    def wake(self):
+        """Unblock a waiting consumer (shutdown)"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def stats(self):
+        return {'ring_depth': self.depth, 'ring_max_depth': self.max_depth, 'ring_overruns': self.overruns}
@@ -0,0 +1,138 @@
+# status_channel.py
+"""
+Local status channel between runall.py and the processes it starts
+
+runall.py binds a Unix datagram socket and passes its path to every child in the
+APL_STATUS_SOCKET environment variable. Children send small JSON messages to it:
+
+    {"sensor": "imet", "event": "ready", "pid": 1234, "t": 1700000000.1}
+
+"ready" is sent once, when the first valid row has been written, so the manager
+can start the merger as soon as sensors are actually recording instead of after
+fixed sleeps. After that a "heartbeat" goes out every APL_HEARTBEAT_INTERVAL
+seconds (supervisor.heartbeat_interval, default 5):
+
+    {"sensor": "imet", "event": "heartbeat", "rows": 5123, "rows_per_s": 10.0,
+     "parse_errors": 2, "reconnects": 0, "last_sample_age": 0.08,
+     "writer": {"queue_depth": 0, "rows_dropped": 0, ...}, ...}
+
+Sends never block and errors are ignored - a sensor run by hand (no manager, no
+variable) or a manager that's gone away must not stop logging.
+"""
+
+import os
+import json
+import time
+import socket
+import tempfile
+
+ENV_VAR = 'APL_STATUS_SOCKET'
+HEARTBEAT_ENV_VAR = 'APL_HEARTBEAT_INTERVAL'
+DEFAULT_HEARTBEAT_INTERVAL = 5.0
+
+# Datagrams are tiny; one recv buffer comfortably holds any message
+MAX_MESSAGE_BYTES = 65536
+
+def default_socket_path(config=None):
+    """supervisor.status_socket from config, else a per-manager path in the temp dir"""
+    path = ((config or {}).get('supervisor') or {}).get('status_socket')
+    # sun_path is ~108 bytes, so not under a possibly deep base directory
+    return path or os.path.join(tempfile.gettempdir(), f'aplogger_status_{os.getpid()}.sock')
+
+class StatusListener:
+    """Manager side: bound, non-blocking datagram socket"""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(path)
+        self.sock.setblocking(False)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def drain(self):
+        """Every message waiting on the socket, decoded (malformed ones skipped)"""
+        messages = []
+        while True:
+            try:
+                data = self.sock.recv(MAX_MESSAGE_BYTES)
+            except (BlockingIOError, InterruptedError):
+                break
+            try:
+                message = json.loads(data.decode('utf-8'))
+            except (UnicodeDecodeError, ValueError):
+                continue
+            if isinstance(message, dict) and message.get('sensor'):
+                messages.append(message)
+        return messages
+
+    def close(self):
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+class StatusReporter:
+    """Child side: fire-and-forget sender for one sensor"""
+
+    def __init__(self, name, path, heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL):
+        self.name = name
+        self.path = path
+        self.heartbeat_interval = float(heartbeat_interval)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.ready_sent = False
+
+        self._last_heartbeat = time.monotonic()
+        self._last_rows = 0
+
+    @classmethod
+    def from_env(cls, name):
+        """Reporter for the manager that started us, or None when run standalone"""
+        path = os.environ.get(ENV_VAR)
+        if not path:
+            return None
+        try:
+            interval = float(os.environ.get(HEARTBEAT_ENV_VAR, DEFAULT_HEARTBEAT_INTERVAL))
+        except ValueError:
+            interval = DEFAULT_HEARTBEAT_INTERVAL
+        try:
+            return cls(name, path, interval)
+        except OSError:
+            return None
+
+    def send(self, event, **fields):
+        message = {'sensor': self.name, 'event': event, 'pid': os.getpid(), 't': time.time(), **fields}
+        try:
+            self.sock.sendto(json.dumps(message).encode('utf-8'), self.path)
+            return True
+        except OSError:
+            # No listener (manager restarting) or its queue is full - drop it
+            return False
+
+    def ready(self, **fields):
+        """Send "ready" once; retried on later calls until the manager has it"""
+        if not self.ready_sent:
+            self.ready_sent = self.send('ready', **fields)
+
+    def heartbeat_due(self, now=None):
+        now = time.monotonic() if now is None else now
+        return now - self._last_heartbeat >= self.heartbeat_interval
+
+    def heartbeat(self, rows, now=None, **fields):
+        """Send counters; rows_per_s is worked out from the rows since the last heartbeat"""
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._last_heartbeat
+        rate = (rows - self._last_rows) / elapsed if elapsed > 0 else 0.0
+        self._last_heartbeat = now
+        self._last_rows = rows
+        return self.send('heartbeat', rows=rows, rows_per_s=round(rate, 2), **fields)
+
+    def close(self):
+        self.sock.close()
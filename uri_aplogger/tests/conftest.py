@@ -0,0 +1,10 @@
+# conftest.py
+"""
+The logger modules import each other by bare name (they run from uri_aplogger/),
+so the tests put that directory on sys.path the same way.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,86 @@
+# test_batch_reparse.py
+"""batch_reparse's whole-file parsers give the same rows as raw_capture.iter_parsed"""
+
+import json
+import os
+import random
+
+import pytest
+
+from batch_reparse import BATCH_PARSERS, _same, batch_rows, load_capture, slow_rows
+from raw_capture import RawCapture, read_header, replay_config
+from sensor_simulator import EMITTERS
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sensor_config.json')
+EPOCH0 = 1_700_000_000_000_000_000
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    # Replayed sensors create output/<name>/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    with open(CONFIG_PATH, 'r') as f:
+        return json.load(f)
+
+def device_lines(sensor_config, n):
+    """Banner, data lines and command chatter the simulator's device would send"""
+    emitter = EMITTERS[sensor_config['type']](sensor_config.get('column_names'))
+    lines = list(emitter.banner())
+    for i in range(n):
+        if sensor_config['type'] == 'MiniaethMA200':
+            lines += emitter.handle_command('dr')
+        else:
+            lines.append(emitter.line(emitter.t0 + i))
+        if i % 7 == 3:
+            lines += emitter.handle_command('PING') + ['']
+    return lines, emitter.line_ending
+
+def write_capture(path, sensor_name, sensor_config, records):
+    """A capture like the live sensor writes: one record per received chunk, ~0.3 s apart"""
+    transport = 'udp' if sensor_config['type'] == 'POPS' else 'serial'
+    capture = RawCapture(str(path), metadata={'sensor': sensor_name, 'type': sensor_config['type'],
+                                              'transport': transport}, buffer_bytes=256)
+    for i, chunk in enumerate(records):
+        t = EPOCH0 + i * 300_000_000
+        capture.write(chunk, t, t - EPOCH0 + 1000)
+    capture.close()
+
+def stream_records(lines, ending, rng):
+    """The lines as a byte stream cut at random places, ending on a partial line"""
+    data = (ending.join(lines) + ending + "1,2,partial").encode()
+    records, i = [], 0
+    while i < len(data):
+        k = rng.randint(1, 80)
+        records.append(data[i:i + k])
+        i += k
+    return records
+
+@pytest.mark.parametrize('sensor_name', ['ldd', 'cavity', 'pump', 'miniaeth', 'pops'])
+def test_batch_rows_match_iter_parsed(tmp_path, config, sensor_name):
+    rng = random.Random(sensor_name)
+    random.seed(sensor_name)  # the emitters' readings
+    sensor_config = replay_config(config, sensor_name)
+    assert sensor_config['type'] in BATCH_PARSERS
+
+    lines, ending = device_lines(sensor_config, 40)
+    if sensor_config['type'] in ('MiniaethMA200', 'POPS'):
+        # One reply line / datagram per record
+        records = [line.encode() + b"\n" for line in lines]
+    else:
+        records = stream_records(lines, ending, rng)
+    path = tmp_path / f'{sensor_name}_raw_test.bin'
+    write_capture(path, sensor_name, sensor_config, records)
+
+    header = read_header(path)
+    fast = batch_rows(path, sensor_config, header)
+    slow = slow_rows(path, sensor_config, header)
+    assert len(slow) >= 35
+    assert _same(fast, slow)
+
+def test_line_gets_the_rx_time_of_the_chunk_that_completes_it(tmp_path, config):
+    sensor_config = replay_config(config, 'ldd')
+    path = tmp_path / 'ldd_raw_split.bin'
+    write_capture(path, 'ldd', sensor_config, [b"1,2", b",3\n4,", b"5\n", b"6"])
+    lines, epochs, monos = load_capture(path)
+    assert lines == ["1,2,3", "4,5"]
+    assert (epochs - EPOCH0).tolist() == [300_000_000, 600_000_000]
+    assert monos.tolist() == [300_001_000, 600_001_000]
@@ -0,0 +1,85 @@
+# test_field_schema.py
+"""Schema types and the per-sensor row converter"""
+
+import json
+import os
+
+import pytest
+
+from field_schema import column_types, normalize_type, row_converter, type_kind
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sensor_config.json')
+
+@pytest.mark.parametrize('name, dtype', [
+    ('float', 'f8'), ('float64', 'f8'), ('float32', 'f4'), ('int', 'i8'), ('INT32', 'i4'),
+    ('str', 'S32'), ('str19', 'S19'), ('<u2', '<u2'),
+])
+def test_normalize_type(name, dtype):
+    assert normalize_type(name) == dtype
+
+def test_type_kind():
+    assert [type_kind(t) for t in ('f8', '<f4', 'i8', 'u2', 'S19', '|S32')] == ['f', 'f', 'i', 'i', 'S', 'S']
+
+def test_column_types_default_and_rx_columns():
+    columns = ['Timestamp', 'temp', 'status', 'rx_epoch_ns']
+    assert column_types(columns, {'*': 'float32', 'Timestamp': 'str19', 'status': 'int32'}) == ['S19', 'f4', 'i4', 'i8']
+    assert column_types(columns) == ['S32', 'S32', 'S32', 'i8']
+
+def test_no_schema_means_no_converter():
+    assert row_converter({'column_names': ['Timestamp', 'a']}) is None
+    assert row_converter({'schema': {'*': 'float64'}}) is None
+
+def test_converter_types_each_column():
+    convert = row_converter({
+        'column_names': ['Timestamp', 'temp', 'count', 'serial'],
+        'schema': {'*': 'float64', 'Timestamp': 'str19', 'count': 'int64', 'serial': 'str'},
+    })
+    row = convert(['2025-01-01 12:00:00', '21.5', '42', 'MA200-0420'])
+    assert row == ('2025-01-01 12:00:00', 21.5, 42, 'MA200-0420')
+    assert type(row[1]) is float and type(row[2]) is int
+
+def test_converter_turns_bad_fields_into_none():
+    convert = row_converter({'column_names': ['Timestamp', 'a', 'b', 'c'],
+                             'schema': {'*': 'float64', 'Timestamp': 'str19', 'b': 'int32'}})
+    assert convert(['t', '', 'x', 'nan?']) == ('t', None, None, None)
+    assert convert(['t', None, '3.0', '1e3']) == ('t', None, 3, 1000.0)
+    assert convert(['t', 4, 5.9, 7]) == ('t', 4.0, 5, 7.0)
+
+def test_converter_pads_short_rows_and_drops_extra_fields():
+    convert = row_converter({'column_names': ['Timestamp', 'a', 'b'], 'schema': {'*': 'float64', 'Timestamp': 'str19'}})
+    assert convert(['t', '1']) == ('t', 1.0, None)
+    assert convert(('t', '1', '2', '3', '4')) == ('t', 1.0, 2.0)
+    assert convert(['t', '1', '2']) == ('t', 1.0, 2.0)
+
+def test_single_column_converter():
+    convert = row_converter({'column_names': ['value'], 'schema': {'*': 'int64'}})
+    assert convert(['7', 'ignored']) == (7,)
+    assert convert([]) == (None,)
+
+def test_text_columns_are_passed_through():
+    convert = row_converter({'column_names': ['Timestamp', 'note'], 'schema': {'*': 'str'}})
+    assert convert(['t', 'OK GET']) == ('t', 'OK GET')
+    assert convert(['t', None]) == ('t', '')
+    assert convert(['t', 12]) == ('t', '12')
+
+def test_every_configured_schema_builds():
+    with open(CONFIG_PATH, 'r') as f:
+        sensors = json.load(f)['sensors']
+    for name, sensor_config in sensors.items():
+        if 'schema' in sensor_config:
+            assert row_converter(sensor_config) is not None, name
+
+def test_ma200_record_is_typed_by_position():
+    # column_names follow the device's record order, which starts with the serial number
+    from sensor_simulator import MA200Emitter
+    with open(CONFIG_PATH, 'r') as f:
+        ma200 = json.load(f)['sensors']['miniaeth']
+    emitter = MA200Emitter(ma200['column_names'])
+    record = emitter.handle_command('dr')[1].split(',')
+    assert len(record) == len(ma200['column_names']) - 1
+
+    row = dict(zip(ma200['column_names'], row_converter(ma200)(['2025-01-01 12:00:00'] + record)))
+    assert row['serial_number'] == 'MA200-0420'
+    assert row['datum_id'] == 1 and row['status'] == 0
+    assert isinstance(row['blue_BCc'], float) and isinstance(row['sample_temp'], float)
+    assert row['readable_status'] == ''
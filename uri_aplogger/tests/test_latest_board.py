@@ -0,0 +1,142 @@
+# test_latest_board.py
+"""Seqlock publish/read on the shared-memory latest-value board"""
+
+import math
+import os
+import threading
+import uuid
+
+import pytest
+
+from latest_board import BoardFollower, LatestBoard, SEQ, SLOT_HEADER_BYTES, numeric_row
+
+SLOTS = ['gps', 'pom', 'pops']
+WIDTH = 6
+
+@pytest.fixture
+def board_name():
+    name = f'apl_test_{uuid.uuid4().hex[:12]}'
+    yield name
+    # unlink() only needs the name, and is a no-op once the region is gone
+    board = LatestBoard.__new__(LatestBoard)
+    board.name = name
+    board.unlink()
+
+def board_config(name):
+    return {
+        'board': {'enabled': True, 'name': name, 'width': WIDTH},
+        'sensors': {slot: {'column_names': ['Timestamp', 'a']} for slot in SLOTS},
+    }
+
+def test_unwritten_slot_reads_none(board_name):
+    board = LatestBoard.open_layout(board_name, SLOTS, WIDTH, fresh=True)
+    assert board.read(board.slot_index('pom')) is None
+    assert board.read_all() == {}
+    board.close()
+
+def test_publish_then_read_from_another_mapping(board_name):
+    writer = LatestBoard.open_layout(board_name, SLOTS, WIDTH, fresh=True)
+    reader = LatestBoard.open_layout(board_name, SLOTS, WIDTH, create=False)
+    slot = writer.slot_index('pops')
+
+    writer.publish(slot, [1.0, 2.5, -3.0], epoch_ns=123, mono_ns=456)
+    snap = reader.read(slot)
+    assert snap['count'] == 1
+    assert snap['epoch_ns'] == 123 and snap['mono_ns'] == 456
+    assert snap['pid'] == os.getpid()
+    assert snap['values'] == [1.0, 2.5, -3.0]
+
+    writer.publish(slot, [7.0] * (WIDTH + 3), epoch_ns=124, mono_ns=457)
+    snap = reader.read(slot)
+    assert snap['count'] == 2
+    assert snap['values'] == [7.0] * WIDTH  # truncated to the board width
+
+    assert list(reader.read_all()) == ['pops']
+    reader.close()
+    writer.close()
+
+def test_shorter_row_does_not_leak_older_values(board_name):
+    board = LatestBoard.open_layout(board_name, SLOTS, WIDTH, fresh=True)
+    board.publish(0, [1.0] * WIDTH)
+    board.publish(0, [2.0, 3.0])
+    assert board.read(0)['values'] == [2.0, 3.0]
+    start = (board._slot_offset(0) + SLOT_HEADER_BYTES) // 8
+    assert all(math.isnan(v) for v in board._doubles[start + 2:start + WIDTH])
+    board.close()
+
+def test_reader_gives_up_on_a_slot_stuck_mid_write(board_name):
+    board = LatestBoard.open_layout(board_name, SLOTS, WIDTH, fresh=True)
+    board.publish(1, [1.0])
+    hdr = board._slot_offset(1) // 8
+    board._words[hdr + SEQ] += 1  # odd: a writer died halfway through
+    assert board.read(1, retries=5) is None
+    board._words[hdr + SEQ] += 1
+    assert board.read(1)['values'] == [1.0]
+    board.close()
+
+def test_concurrent_reader_never_sees_a_torn_row(board_name):
+    writer = LatestBoard.open_layout(board_name, SLOTS, WIDTH, fresh=True)
+    reader = LatestBoard.open_layout(board_name, SLOTS, WIDTH, create=False)
+    n_rows = 20000
+    done = threading.Event()
+
+    def publish():
+        # Every field of row i is i, and epoch_ns is i as well
+        for i in range(1, n_rows + 1):
+            writer.publish(0, [float(i)] * WIDTH, epoch_ns=i, mono_ns=i)
+        done.set()
+
+    thread = threading.Thread(target=publish)
+    thread.start()
+    seen = 0
+    last_count = 0
+    while not done.is_set() or seen == 0:
+        snap = reader.read(0, retries=10000)
+        if snap is None:
+            continue
+        assert snap['values'] == [float(snap['epoch_ns'])] * WIDTH
+        assert snap['count'] == snap['epoch_ns']
+        assert snap['count'] >= last_count
+        last_count = snap['count']
+        seen += 1
+    thread.join()
+
+    assert reader.read(0)['count'] == n_rows
+    reader.close()
+    writer.close()
+
+def test_attach_checks_layout(board_name):
+    LatestBoard.open_layout(board_name, SLOTS, WIDTH, fresh=True).close()
+    with pytest.raises(ValueError):
+        LatestBoard.open_layout(board_name, SLOTS, WIDTH + 1, create=False)
+
+def test_follower_reattaches_to_a_recreated_board(board_name):
+    config = board_config(board_name)
+    follower = BoardFollower(config, check_interval=1.0)
+    assert follower.get(now=0.0) is None
+
+    first = LatestBoard.open(config, fresh=True)
+    assert follower.get(now=0.5) is None  # not rechecked before check_interval
+    board = follower.get(now=1.0)
+    assert board is not None and follower.generation == first.generation
+    assert follower.get(now=2.0) is board  # same region, no reattach
+
+    first.publish(0, [1.0])
+    second = LatestBoard.open(config, fresh=True)
+    assert board.replaced()
+    second.publish(0, [2.0])
+    board = follower.get(now=3.0)
+    assert follower.generation == second.generation
+    assert board.read(0)['values'] == [2.0]
+
+    follower.close()
+    first.close()
+    second.close()
+
+def test_numeric_row_needs_a_schema_without_text_columns():
+    assert numeric_row({'column_names': ['Timestamp', 'a', 'b'], 'schema': {'*': 'float64', 'Timestamp': 'str19'}})
+    assert numeric_row({'column_names': ['Timestamp', 'n'], 'schema': {'*': 'int32'}})
+    assert not numeric_row({'column_names': ['Timestamp', 'a', 'date'],
+                            'schema': {'*': 'float64', 'date': 'str10'}})
+    assert not numeric_row({'column_names': ['Timestamp', 'a']})  # no schema: stored as text
+    assert not numeric_row({'column_names': ['Timestamp']})
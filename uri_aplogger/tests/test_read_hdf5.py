@@ -0,0 +1,54 @@
+# test_read_hdf5.py
+"""SpectraFile time windows, with and without a backwards clock step"""
+
+import logging
+
+import numpy as np
+
+from read_hdf5 import SpectraFile
+from spectra_store import SpectraWriter
+
+N_PIXELS = 16
+EPOCH0 = 1_700_000_000_000_000_000
+STEP_NS = 100_000_000
+
+def write_file(path, epoch_ns):
+    n = len(epoch_ns)
+    spectra = np.arange(n, dtype=np.float32)[:, None] + np.zeros(N_PIXELS, dtype=np.float32)
+    timestamps = np.datetime_as_string(epoch_ns.astype('datetime64[ns]'), unit='us')
+    writer = SpectraWriter(path, np.linspace(300.0, 800.0, N_PIXELS), chunk_rows=8)
+    writer.append(spectra, timestamps, epoch_ns)
+    writer.close()
+
+def test_monotonic_window_is_a_row_span(tmp_path, caplog):
+    path = tmp_path / 'mono.h5'
+    epoch_ns = EPOCH0 + np.arange(100, dtype=np.int64) * STEP_NS
+    write_file(path, epoch_ns)
+    with caplog.at_level(logging.WARNING), SpectraFile(path, block_bytes=1) as sf:
+        rows = sf.time_rows(int(epoch_ns[10]), int(epoch_ns[30]))
+        assert sf.monotonic
+        assert rows.tolist() == list(range(10, 30))
+        times, _, block = sf.window(int(epoch_ns[10]), int(epoch_ns[30]))
+        assert len(times) == 20 and block[:, 0].tolist() == list(range(10, 30))
+    assert not caplog.records
+
+def test_clock_step_falls_back_to_a_full_scan_and_warns(tmp_path, caplog):
+    path = tmp_path / 'step.h5'
+    # 60 spectra, then the clock jumps back 3 s and another 60 follow
+    first = EPOCH0 + np.arange(60, dtype=np.int64) * STEP_NS
+    second = first[-1] - 3_000_000_000 + np.arange(1, 61, dtype=np.int64) * STEP_NS
+    epoch_ns = np.concatenate([first, second])
+    write_file(path, epoch_ns)
+
+    lo, hi = int(epoch_ns[40]), int(epoch_ns[50])
+    with caplog.at_level(logging.WARNING, logger='read_hdf5'), SpectraFile(path, block_bytes=1) as sf:
+        rows = sf.time_rows(lo, hi)
+        assert not sf.monotonic
+        expected = np.flatnonzero((epoch_ns >= lo) & (epoch_ns < hi))
+        assert rows.tolist() == expected.tolist()
+        assert len(rows) > 10  # rows from both sides of the step
+
+        # Timestamp-string bounds select the same rows
+        ts = np.datetime_as_string(epoch_ns.astype('datetime64[ns]'), unit='us')
+        assert sf.time_rows(str(ts[40]), str(ts[50])).tolist() == expected.tolist()
+    assert any('clock stepped backwards' in r.getMessage() for r in caplog.records)
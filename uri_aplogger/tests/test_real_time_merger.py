@@ -0,0 +1,81 @@
+# test_real_time_merger.py
+"""Which sensors the merger reads from the latest-value board, and reattaching to a new board"""
+
+import json
+import uuid
+
+import pytest
+
+from latest_board import LatestBoard
+from real_time_merger import RealTimeMerger
+
+def write_config(tmp_path, board_name, merger=None):
+    config = {
+        'board': {'enabled': True, 'name': board_name, 'check_interval': 0},
+        'merger': merger or {},
+        'sensors': {
+            'trisonica': {'column_names': ['Timestamp', 'U', 'V'],
+                          'schema': {'*': 'float64', 'Timestamp': 'str19'}},
+            'imet': {'column_names': ['Timestamp', 'date', 'pressure'],
+                     'schema': {'*': 'float64', 'Timestamp': 'str19', 'date': 'str10'}},
+        },
+    }
+    path = tmp_path / 'sensor_config.json'
+    path.write_text(json.dumps(config))
+    return str(path), config
+
+@pytest.fixture
+def board_name(tmp_path, monkeypatch):
+    # The merger logs to merger.log and writes output/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    name = f'apl_test_{uuid.uuid4().hex[:12]}'
+    yield name
+    board = LatestBoard.__new__(LatestBoard)
+    board.name = name
+    board.unlink()
+
+def test_files_is_the_default_source(tmp_path, board_name):
+    config_file, config = write_config(tmp_path, board_name)
+    board = LatestBoard.open(config, fresh=True)
+    merger = RealTimeMerger(config_file=config_file, use_inotify=False)
+    assert merger.source == 'files'
+    assert merger.board is None
+    assert set(merger.sensor_files) == {'trisonica', 'imet'}
+    merger.tailer.close()
+    board.close()
+
+def test_auto_leaves_grid_mode_on_files(tmp_path, board_name):
+    config_file, config = write_config(tmp_path, board_name, {'source': 'auto', 'mode': 'grid'})
+    board = LatestBoard.open(config, fresh=True)
+    merger = RealTimeMerger(config_file=config_file, use_inotify=False)
+    assert merger.board is None
+    merger.tailer.close()
+    board.close()
+
+def test_board_source_skips_sensors_with_text_columns_and_reattaches(tmp_path, board_name):
+    config_file, config = write_config(tmp_path, board_name, {'source': 'board'})
+    first = LatestBoard.open(config, fresh=True)
+    merger = RealTimeMerger(config_file=config_file, use_inotify=False)
+    assert set(merger.board_slots) == {'trisonica'}
+    assert set(merger.sensor_files) == {'imet'}
+
+    first.publish(first.slot_index('trisonica'), [float('nan'), 1.5, -2.0])
+    rows = merger.read_board_rows()
+    assert rows['trisonica'][0][1:3] == ['1.5', '-2']
+    assert merger.read_board_rows() == {}  # nothing new
+
+    # runall restart: a fresh board whose counts start over
+    second = LatestBoard.open(config, fresh=True)
+    second.publish(second.slot_index('trisonica'), [float('nan'), 3.0, 4.0])
+    rows = merger.read_board_rows()
+    assert rows['trisonica'][0][1:3] == ['3', '4']
+
+    merger.tailer.close()
+    merger.board.close()
+    first.close()
+    second.close()
+
+def test_board_source_needs_the_board(tmp_path, board_name):
+    config_file, _ = write_config(tmp_path, board_name, {'source': 'board'})
+    with pytest.raises(FileNotFoundError):
+        RealTimeMerger(config_file=config_file, use_inotify=False)
@@ -0,0 +1,125 @@
+# test_sensor_writers.py
+"""Row writers: the threaded write-behind wrapper and the typed HDF5 table"""
+
+import csv
+import math
+import threading
+
+import pytest
+
+from sensor_writers import CSVRowWriter, HDF5RowWriter, ThreadedRowWriter
+
+class ListWriter:
+    """Stand-in for CSVRowWriter that records what the writer thread does"""
+
+    def __init__(self, fail_on=None):
+        self.rows = []
+        self.flushes = []
+        self.closed = False
+        self.fail_on = fail_on
+        self.written = threading.Event()
+
+    @property
+    def rows_written(self):
+        return len(self.rows)
+
+    def writerow(self, row):
+        if row == self.fail_on:
+            raise ValueError('bad row')
+        self.rows.append(row)
+        self.written.set()
+
+    def maybe_flush(self, now=None):
+        return False
+
+    def flush(self, sync=False, now=None):
+        self.flushes.append(sync)
+
+    def close(self):
+        self.closed = True
+
+def test_close_drains_every_row_in_order(tmp_path):
+    path = tmp_path / 'rows.csv'
+    writer = ThreadedRowWriter(CSVRowWriter(str(path), ['Timestamp', 'value']), flush_interval=60.0)
+    for i in range(5000):
+        writer.writerow([f't{i}', i])
+    writer.close()
+    writer.close()  # second close is a no-op
+
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['Timestamp', 'value']
+    assert rows[1:] == [[f't{i}', str(i)] for i in range(5000)]
+    assert writer.stats()['rows_written'] == writer.rows_queued == 5000
+
+def test_row_reaches_the_writer_without_waiting_for_flush_interval():
+    inner = ListWriter()
+    writer = ThreadedRowWriter(inner, flush_interval=60.0)
+    try:
+        for i in range(200):
+            inner.written.clear()
+            writer.writerow([i])
+            assert inner.written.wait(5.0)
+        assert inner.rows == [[i] for i in range(200)]
+    finally:
+        writer.close()
+
+def test_full_queue_drops_rows_instead_of_blocking():
+    inner = ListWriter()
+    writer = ThreadedRowWriter(inner, max_queue_rows=3, flush_interval=60.0)
+    writer._queue.extend([[0]] * 3)  # writer thread behind
+    writer.writerow([1])
+    assert writer.rows_dropped == 1
+    writer.close()
+    assert inner.closed
+
+def test_flush_requests_and_write_errors_go_through_the_thread():
+    inner = ListWriter(fail_on=['bad'])
+    writer = ThreadedRowWriter(inner, flush_interval=60.0)
+    writer.writerow(['a'])
+    writer.writerow(['bad'])
+    writer.flush()
+    writer.flush(sync=True)
+    writer.writerow(['b'])
+    writer.close()
+    assert inner.rows == [['a'], ['b']]
+    assert inner.flushes == [False, True]
+    assert writer.write_errors == 1
+
+def test_hdf5_empty_text_fields_are_stored_empty(tmp_path):
+    h5py = pytest.importorskip('h5py')
+    path = tmp_path / 'rows.h5'
+    writer = HDF5RowWriter(str(path), ['Timestamp', 'value', 'note'],
+                           schema={'*': 'float64', 'Timestamp': 'str19', 'note': 'str'})
+    writer.writerow(('2025-01-01 12:00:00', None, None))
+    writer.writerow(('2025-01-01 12:00:01', 1.5, 'OK'))
+    writer.close()
+    with h5py.File(path, 'r') as f:
+        rows = f['rows'][()]
+    assert rows['note'].tolist() == [b'', b'OK']
+    assert math.isnan(rows['value'][0]) and rows['value'][1] == 1.5
+
+def test_hdf5_append_keeps_earlier_rows(tmp_path):
+    h5py = pytest.importorskip('h5py')
+    path = tmp_path / 'pops.h5'
+    columns, schema = ['Timestamp', 'value'], {'*': 'float64', 'Timestamp': 'str19'}
+    for i in range(3):
+        writer = HDF5RowWriter(str(path), columns, schema=schema, append=True)
+        writer.writerow((f't{i}', float(i)))
+        writer.close()
+    with h5py.File(path, 'r') as f:
+        assert f['rows']['value'].tolist() == [0.0, 1.0, 2.0]
+
+    # Without append the file starts over
+    HDF5RowWriter(str(path), columns, schema=schema).close()
+    with h5py.File(path, 'r') as f:
+        assert f['rows'].shape == (0,)
+
+def test_hdf5_append_rejects_a_different_layout(tmp_path):
+    pytest.importorskip('h5py')
+    path = tmp_path / 'pops.h5'
+    HDF5RowWriter(str(path), ['Timestamp', 'value'], schema={'*': 'float64'}).close()
+    with pytest.raises(ValueError):
+        HDF5RowWriter(str(path), ['Timestamp', 'value', 'extra'], schema={'*': 'float64'}, append=True)
+    # The file is left as it was and can still be appended to with the old layout
+    HDF5RowWriter(str(path), ['Timestamp', 'value'], schema={'*': 'float64'}, append=True).close()
@@ -0,0 +1,166 @@
+# test_spectra_store.py
+"""SpectraWriter: chunk-aligned growth, live reads, trim on close, storage profile round-trips"""
+
+import h5py
+import numpy as np
+import pytest
+
+from spectra_store import SpectraWriter, open_live, refresh_live, valid_rows, intensity_decoder
+
+N_PIXELS = 32
+
+def make_block(start, k):
+    """k spectra of whole counts, row i filled from i, with matching timestamps and epoch_ns"""
+    rows = np.arange(start, start + k, dtype=np.float32)
+    intensities = rows[:, None] * 10.0 + np.arange(N_PIXELS, dtype=np.float32)[None, :]
+    epoch_ns = 1_700_000_000_000_000_000 + np.arange(start, start + k, dtype=np.int64) * 100_000_000
+    timestamps = np.datetime_as_string(epoch_ns.astype('datetime64[ns]'), unit='us')
+    return intensities, timestamps, epoch_ns
+
+@pytest.fixture
+def wavelengths():
+    return np.linspace(200.0, 1000.0, N_PIXELS)
+
+def test_grows_to_chunk_boundaries(tmp_path, wavelengths):
+    writer = SpectraWriter(tmp_path / 'grow.h5', wavelengths, chunk_rows=4, grow_chunks=2)
+    assert writer.capacity == 0
+
+    writer.append(*make_block(0, 3))
+    assert (writer.n, writer.capacity) == (3, 8)
+    writer.append(*make_block(3, 5))
+    assert (writer.n, writer.capacity) == (8, 8)
+    writer.append(*make_block(8, 1))
+    assert (writer.n, writer.capacity) == (9, 16)
+    writer.append(*make_block(9, 20))
+    assert (writer.n, writer.capacity) == (29, 32)
+    assert writer.intensities.shape == (32, N_PIXELS)
+    assert writer.timestamps.shape == writer.epoch_ns.shape == (32,)
+    assert writer.append(*make_block(29, 0)) == 0
+    writer.close()
+
+def test_live_reader_sees_rows_after_flush(tmp_path, wavelengths):
+    path = tmp_path / 'live.h5'
+    writer = SpectraWriter(path, wavelengths, chunk_rows=4, grow_chunks=2)
+    writer.append(*make_block(0, 5))
+
+    with open_live(path) as f:
+        assert valid_rows(f) == 0
+        writer.flush()
+        refresh_live(f)
+        assert valid_rows(f) == 5
+        assert f['intensities'].shape[0] == 8  # padding past n_spectra
+
+        writer.append(*make_block(5, 2))
+        writer.flush()
+        refresh_live(f)
+        n = valid_rows(f)
+        assert n == 7
+        np.testing.assert_array_equal(f['intensities'][n - 1], make_block(6, 1)[0][0])
+    writer.close()
+
+def test_maybe_flush_follows_the_interval(tmp_path, wavelengths):
+    writer = SpectraWriter(tmp_path / 'flush.h5', wavelengths, flush_interval=10.0)
+    start = writer._last_flush
+    assert not writer.maybe_flush(now=start + 5.0)
+    assert writer.maybe_flush(now=start + 10.0)
+    assert writer.flush_count == 1
+    writer.close()
+
+def test_close_trims_padding_and_stamps_totals(tmp_path, wavelengths):
+    path = tmp_path / 'trim.h5'
+    writer = SpectraWriter(path, wavelengths, chunk_rows=4, grow_chunks=4, attrs={'integration_time_us': 100000})
+    intensities, timestamps, epoch_ns = make_block(0, 11)
+    writer.append(intensities[:6], timestamps[:6], epoch_ns[:6])
+    writer.append(intensities[6:], timestamps[6:], epoch_ns[6:])
+    writer.close()
+    writer.close()  # second close is a no-op
+
+    with h5py.File(path, 'r') as f:
+        assert f.attrs['total_spectra'] == 11
+        assert f.attrs['integration_time_us'] == 100000
+        assert f['intensities'].shape == (11, N_PIXELS)
+        assert f['timestamps'].shape == f['epoch_ns'].shape == (11,)
+        assert valid_rows(f) == 11
+        np.testing.assert_array_equal(f['wavelengths'][()], wavelengths)
+        np.testing.assert_array_equal(intensity_decoder(f)(f['intensities'][()]), intensities)
+        np.testing.assert_array_equal(f['epoch_ns'][()], epoch_ns)
+        assert [t.decode() for t in f['timestamps'][()]] == list(timestamps)
+
+def test_empty_file_closes_cleanly(tmp_path, wavelengths):
+    path = tmp_path / 'empty.h5'
+    SpectraWriter(path, wavelengths).close()
+    with h5py.File(path, 'r') as f:
+        assert f.attrs['total_spectra'] == 0
+        assert f['intensities'].shape == (0, N_PIXELS)
+
+def bright_spectra(n, seed=0):
+    """Whole counts from 0 to the 16-bit ceiling, like intensities() without nonlinearity correction"""
+    rng = np.random.default_rng(seed)
+    spectra = rng.integers(900, 1200, size=(n, N_PIXELS)).astype(np.float32)
+    spectra[::3, 5] = 65535.0
+    spectra[1, 7] = 0.0
+    return spectra
+
+@pytest.mark.parametrize('storage, dtype', [('float32', 'float32'), ('counts', 'uint16'), ('dark_delta', 'int32')])
+def test_storage_profiles_round_trip(tmp_path, wavelengths, storage, dtype):
+    path = tmp_path / f'{storage}.h5'
+    spectra = bright_spectra(10)
+    dark = 1000.0 + np.sin(np.arange(N_PIXELS)) * 20.3  # not whole counts; stored rounded
+    _, timestamps, epoch_ns = make_block(0, len(spectra))
+
+    writer = SpectraWriter(path, wavelengths, storage=storage, dark=dark, compression='lzf')
+    writer.append(spectra, timestamps, epoch_ns)
+    writer.close()
+    assert writer.clipped == 0
+
+    with h5py.File(path, 'r') as f:
+        dset = f['intensities']
+        assert dset.dtype == np.dtype(dtype)
+        assert dset.attrs['storage'] == storage
+        assert dset.attrs['clipped_values'] == 0
+        assert ('dark_reference' in f) == (storage == 'dark_delta')
+        decode = intensity_decoder(f)
+        np.testing.assert_array_equal(decode(dset[()]), spectra)
+
+        # A pixel subset decodes against the same dark pixels
+        pixels = np.array([0, 5, 7, 31])
+        np.testing.assert_array_equal(decode(dset[:, pixels], pixels=pixels), spectra[:, pixels])
+        np.testing.assert_array_equal(decode(dset[2:4, 3:9], pixels=slice(3, 9)), spectra[2:4, 3:9])
+
+def test_dark_delta_stores_small_residuals(tmp_path, wavelengths):
+    dark = np.full(N_PIXELS, 1000.0)
+    writer = SpectraWriter(tmp_path / 'delta.h5', wavelengths, storage='dark_delta', dark=dark)
+    np.testing.assert_array_equal(writer.encode(np.full((2, N_PIXELS), 1003.0)), np.full((2, N_PIXELS), 3))
+    writer.close()
+
+def test_narrow_dtype_clips_and_counts(tmp_path, wavelengths):
+    path = tmp_path / 'int16.h5'
+    spectra = bright_spectra(9)
+    dark = np.full(N_PIXELS, 1000.0)
+    _, timestamps, epoch_ns = make_block(0, len(spectra))
+
+    writer = SpectraWriter(path, wavelengths, storage='dark_delta', dtype='int16', dark=dark)
+    writer.append(spectra, timestamps, epoch_ns)
+    writer.close()
+    assert writer.clipped == 3  # the saturated pixel in rows 0, 3, 6
+
+    with h5py.File(path, 'r') as f:
+        assert f['intensities'].attrs['clipped_values'] == 3
+        decoded = intensity_decoder(f)(f['intensities'][()])
+    np.testing.assert_array_equal(decoded[::3, 5], np.full(3, 1000.0 + 32767.0))
+    mask = np.ones_like(spectra, dtype=bool)
+    mask[::3, 5] = False
+    np.testing.assert_array_equal(decoded[mask], spectra[mask])
+
+def test_counts_are_rounded_not_truncated(tmp_path, wavelengths):
+    writer = SpectraWriter(tmp_path / 'round.h5', wavelengths, storage='counts')
+    encoded = writer.encode(np.full((1, N_PIXELS), 999.7, dtype=np.float32))
+    assert encoded.dtype == np.uint16
+    assert (encoded == 1000).all()
+    writer.close()
+
+def test_bad_storage_settings_are_rejected(tmp_path, wavelengths):
+    with pytest.raises(ValueError):
+        SpectraWriter(tmp_path / 'bad.h5', wavelengths, storage='float16')
+    with pytest.raises(ValueError):
+        SpectraWriter(tmp_path / 'nodark.h5', wavelengths, storage='dark_delta')
@@ -0,0 +1,55 @@
+# test_split_lines.py
+"""GenericSensor.split_lines: lines split across chunks, partial lines, runaway input"""
+
+import json
+import os
+
+import pytest
+
+from raw_capture import replay_config, replay_sensor
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sensor_config.json')
+
+@pytest.fixture
+def sensor(tmp_path, monkeypatch):
+    # Sensors create output/<name>/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    with open(CONFIG_PATH, 'r') as f:
+        config = json.load(f)
+    sensor_config = replay_config(config, 'ldd')
+    sensor_config['max_line_bytes'] = 64
+    return replay_sensor(sensor_config['type'], 'ldd', sensor_config)
+
+def test_complete_lines(sensor):
+    assert sensor.split_lines(b"a,1\r\nb,2\n") == ["a,1", "b,2"]
+    assert sensor._rx_buf == b""
+
+def test_partial_line_is_kept_for_the_next_chunk(sensor):
+    assert sensor.split_lines(b"a,1\nb,") == ["a,1"]
+    assert sensor._rx_buf == b"b,"
+    assert sensor.split_lines(b"2") == []
+    assert sensor.split_lines(b"\r") == []
+    assert sensor.split_lines(b"\nc,3\n") == ["b,2", "c,3"]
+    assert sensor._rx_buf == b""
+
+def test_byte_at_a_time_matches_one_chunk(sensor):
+    data = b"IDENT LDD\r\n1,2,3\r\n\r\n4,5,6\r\n7,8"
+    lines = []
+    for i in range(len(data)):
+        lines += sensor.split_lines(data[i:i + 1])
+    assert lines == ["IDENT LDD", "1,2,3", "4,5,6"]
+    assert sensor._rx_buf == b"7,8"
+
+def test_blank_lines_are_dropped(sensor):
+    assert sensor.split_lines(b"\n\r\n  \nx\n") == ["x"]
+
+def test_undecodable_bytes_are_ignored(sensor):
+    assert sensor.split_lines(b"1,\xff2\n") == ["1,2"]
+
+def test_runaway_input_without_line_ending_is_discarded(sensor):
+    assert sensor.split_lines(b"x" * 60) == []
+    assert sensor._rx_buf == b"x" * 60
+    assert sensor.split_lines(b"x" * 10) == []
+    assert sensor._rx_buf == b""
+    # Back in step once the next line ending arrives
+    assert sensor.split_lines(b"tail\n1,2\n") == ["tail", "1,2"]
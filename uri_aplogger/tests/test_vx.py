@@ -0,0 +1,65 @@
+# test_vx.py
+"""vx health board from the latest-value board, and from sensor CSVs when the board is off"""
+
+import os
+import time
+import uuid
+
+import pytest
+
+from latest_board import LatestBoard
+from vx import HealthBoard
+
+def health_config(board=None):
+    return {
+        'board': board or {'enabled': False},
+        'health': {'interval': 1.0, 'rate_window': 10, 'stale_after': {'*': 6}},
+        'sensors': {
+            'imet': {'column_names': ['Timestamp', 'a']},
+            'pom': {'column_names': ['Timestamp', 'a']},
+            'ldd': {'enabled': False, 'column_names': ['Timestamp', 'a']},
+        },
+    }
+
+def test_files_fallback_when_the_board_is_disabled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('output/imet')
+    path = 'output/imet/imet_data_20250101_120000.csv'
+    with open(path, 'w') as f:
+        f.write('Timestamp,a\n2025-01-01 12:00:00,1\n')
+
+    health = HealthBoard(health_config())
+    try:
+        assert health.source == 'files'
+        results = {name: (state, age) for name, state, _, age in health.check()}
+        assert results['imet'][0] == 'V' and results['imet'][1] < 6
+        assert results['pom'] == ('X', None)  # no file yet
+        assert results['ldd'] == ('-', None)
+
+        # An old file is stale
+        old = time.time() - 60
+        os.utime(path, (old, old))
+        with open(path, 'a') as f:
+            f.write('2025-01-01 12:00:01,2\n')
+        os.utime(path, (old, old))
+        results = {name: (state, age) for name, state, _, age in health.check()}
+        assert results['imet'][0] == 'X' and results['imet'][1] >= 59
+        assert health.row_counts['imet'] == 2
+    finally:
+        health.close()
+
+def test_board_source(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    name = f'apl_test_{uuid.uuid4().hex[:12]}'
+    config = health_config({'enabled': True, 'name': name})
+    board = LatestBoard.open(config, fresh=True)
+    health = HealthBoard(config)
+    try:
+        assert health.source == 'board'
+        board.publish(board.slot_index('imet'), [1.0])
+        results = {n: state for n, state, _, _ in health.check()}
+        assert results == {'imet': 'V', 'pom': 'X', 'ldd': '-'}
+    finally:
+        health.close()
+        board.close()
+        board.unlink()
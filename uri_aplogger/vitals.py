@@ -14,17 +14,23 @@ from pathlib import Path
 import threading
 import argparse
 
+from latest_board import BoardFollower, board_enabled, publishes_to_board, row_from_snapshot
+from field_schema import RX_TIME_COLUMNS, output_columns
+
 class VitalsExporter:
-    def __init__(self, config_file='sensor_config.json', output_interval=1.0):
+    def __init__(self, config_file='sensor_config.json', output_interval=1.0, source='auto'):
         """
         Initialize the vitals exporter
         
         Args:
             config_file: Path to sensor configuration file
             output_interval: How often to output vitals data (seconds)
+            source: 'board' (shared-memory latest values), 'files' (tail sensor CSVs)
+                    or 'auto' (board when enabled and running, files otherwise)
         """
         self.config = self.load_config(config_file)
         self.output_interval = output_interval
+        self.source = source
         self.running = True
         
         # Define vital columns for each sensor (most important data only)
@@ -42,8 +48,8 @@ class VitalsExporter:
                 'aliases': ['Tri_Wind_U', 'Tri_Wind_V', 'Tri_Wind_W']
             },
             'spectro': {
-                'columns': ['peak_wavelength', 'max_intensity'],
-                'aliases': ['Spectro_Peak_nm', 'Spectro_MaxIntensity']
+                'columns': ['peak_wavelength', 'max_intensity', 'centroid_wavelength'],
+                'aliases': ['Spectro_Peak_nm', 'Spectro_MaxIntensity', 'Spectro_Centroid_nm']
             },
             'partector2pro': {
                 'columns': ['number_1_cm3', 'battery_voltage_V'],
@@ -63,10 +69,24 @@ class VitalsExporter:
             }
         }
         
+        # Spectrometer band integrals follow the "bands" configured for it
+        for band in self.config.get('sensors', {}).get('spectro', {}).get('bands', {}):
+            self.vital_columns['spectro']['columns'].append(f'band_{band}')
+            self.vital_columns['spectro']['aliases'].append(f'Spectro_Band_{band}')
+
         # File tracking for each sensor
         self.sensor_files = {}
         self.sensor_positions = {}
         self.latest_data = {}
+        # rx_epoch_ns of the sample behind latest_data (0 if the sensor doesn't stamp rows)
+        self.latest_rx_ns = {}
+
+        # Sensors read from the shared-memory board instead: name -> slot, last seen count.
+        # self.board is a BoardFollower, so a runall restart's fresh board is picked up.
+        self.board = None
+        self.board_generation = None
+        self.board_slots = {}
+        self.board_counts = {}
         
         # Set up vitals output file
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -97,10 +117,34 @@ class VitalsExporter:
             self.logger.error(f"Error loading config: {e}")
             return {'sensors': {}}
     
+    def setup_board(self):
+        """Follow the latest-value board (None if not in use)"""
+        if self.source == 'files':
+            return None
+        if self.source == 'auto' and not board_enabled(self.config):
+            return None
+        follower = BoardFollower(self.config, logger=self.logger)
+        if follower.get() is None:
+            if self.source == 'board':
+                raise FileNotFoundError("Latest-value board is not available")
+            self.logger.warning("Latest-value board not available, reading sensor files")
+            return None
+        self.board_generation = follower.generation
+        return follower
+
     def initialize_sensor_tracking(self):
         """Initialize tracking for all enabled sensors"""
+        self.board = self.setup_board()
         for sensor_name, sensor_config in self.config['sensors'].items():
             if sensor_config.get('enabled', True) and sensor_name in self.vital_columns:
+                self.latest_data[sensor_name] = {}
+
+                if self.board and publishes_to_board(sensor_config):
+                    self.board_slots[sensor_name] = self.board.board.slot_index(sensor_name)
+                    self.board_counts[sensor_name] = 0
+                    self.logger.info(f"Tracking vitals from {sensor_name} via shared-memory board")
+                    continue
+
                 # Determine file pattern based on sensor type
                 if sensor_name == 'spectro':
                     pattern = sensor_config.get('output_file_pattern', 'output/spectro/spectro_data_*.csv')
@@ -108,7 +152,6 @@ class VitalsExporter:
                     pattern = f'output/{sensor_name}/{sensor_name}_data_*.csv'
                 
                 self.sensor_files[sensor_name] = pattern
-                self.latest_data[sensor_name] = {}
                 self.logger.info(f"Tracking vitals from {sensor_name} with pattern: {pattern}")
     
     def find_latest_file(self, pattern):
@@ -201,8 +244,38 @@ class VitalsExporter:
 
         return vitals
     
+    def row_rx_ns(self, sensor_name, row):
+        """rx_epoch_ns of a file row, 0 if the sensor doesn't write it"""
+        columns = output_columns(self.config['sensors'][sensor_name])
+        try:
+            return int(row[columns.index(RX_TIME_COLUMNS[0])])
+        except (ValueError, IndexError):
+            return 0
+
+    def update_board_data(self):
+        """Latest row of each board sensor - a slot copy, no file I/O or CSV parsing"""
+        board = self.board.get()
+        if board is None:
+            return
+        if self.board_generation != self.board.generation:
+            # Recreated by a runall restart - slot counts start over
+            self.board_generation = self.board.generation
+            self.board_counts = dict.fromkeys(self.board_counts, 0)
+        for sensor_name, slot in self.board_slots.items():
+            snapshot = board.read(slot)
+            if not snapshot or snapshot['count'] == self.board_counts[sensor_name]:
+                continue
+            self.board_counts[sensor_name] = snapshot['count']
+            vitals = self.extract_vitals(sensor_name, row_from_snapshot(snapshot, with_timestamp=False))
+            if vitals:
+                self.latest_data[sensor_name] = vitals
+                self.latest_rx_ns[sensor_name] = snapshot['epoch_ns']
+
     def update_sensor_data(self):
         """Update vitals data from all sensors"""
+        if self.board:
+            self.update_board_data()
+
         for sensor_name, pattern in self.sensor_files.items():
             try:
                 # Find the latest file
@@ -221,10 +294,11 @@ class VitalsExporter:
                         if vitals:
                             # Update latest data for this sensor
                             self.latest_data[sensor_name] = vitals
+                            self.latest_rx_ns[sensor_name] = self.row_rx_ns(sensor_name, row)
                             
                             # Log first data point
                             if len(new_lines) == 1:
-                                self.logger.debug(f"Updated vitals from {sensor_name}: {list(vitals.keys())}")
+                                self.logger.debug("Updated vitals from %s: %s", sensor_name, list(vitals))
                 
             except Exception as e:
                 self.logger.error(f"Error updating {sensor_name}: {e}")
@@ -256,7 +330,7 @@ class VitalsExporter:
         headers = ['Timestamp']
 
         for sensor_name, vital_def in self.vital_columns.items():
-            if sensor_name in self.sensor_files:
+            if sensor_name in self.latest_data:
                 vital_cols = vital_def['columns']
 
                 for i, col in enumerate(vital_cols):
@@ -322,12 +396,16 @@ class VitalsExporter:
         self.logger.info("Tracking vital parameters:")
         
         for sensor_name, vital_def in self.vital_columns.items():
-            if sensor_name in self.sensor_files:
+            if sensor_name in self.latest_data:
                 vital_list = vital_def['columns']
                 self.logger.info(f"  {sensor_name}: {', '.join(vital_list)}")
         
         # Start the main write loop
-        self.write_vitals_data()
+        try:
+            self.write_vitals_data()
+        finally:
+            if self.board:
+                self.board.close()
         
         self.logger.info("Vitals exporter stopped")
 
@@ -336,10 +414,12 @@ def main():
     parser.add_argument('--config', default='sensor_config.json', help='Path to sensor configuration file')
     parser.add_argument('--interval', type=float, default=1.0, help='Export interval in seconds')
     parser.add_argument('--output', help='Custom output file path')
+    parser.add_argument('--source', choices=['auto', 'board', 'files'], default='auto',
+                        help='Read latest values from the shared-memory board or by tailing sensor files')
     
     args = parser.parse_args()
     
-    exporter = VitalsExporter(config_file=args.config, output_interval=args.interval)
+    exporter = VitalsExporter(config_file=args.config, output_interval=args.interval, source=args.source)
     
     if args.output:
         exporter.vitals_file = args.output
@@ -1,65 +1,221 @@
-import csv
-import time
+# vx.py
+"""
+Health board - is every sensor live or dead? (V/X)
+
+Liveness is read from the shared-memory latest-value board (latest_board.py)
+instead of globbing and stat()ing output/: every sensor's slot carries a row
+count and the receive time of its newest row, so one pass over the board gives
+the data rate and staleness of every sensor in sensor_config.json. The cost per
+check is the same on the first day of a campaign and the last. When runall.py
+restarts and recreates the board, vx reattaches to the new one by itself.
+
+With the board disabled ("board": {"enabled": false}, or "source": "files" in the
+health block) vx follows each sensor's newest CSV with file_tail.FileTailer
+instead: rows appended give the rate and the active file's mtime the age.
+
+Status goes to output/minimal_status_<timestamp>.csv through one buffered handle:
+
+    timestamp, <sensor>, <sensor>_rate, <sensor>_age, ...
+
+<sensor> is V when its newest row is younger than stale_after seconds and it
+wrote at least min_rate rows/s over the last rate_window seconds, X otherwise
+(- when disabled in config). _rate is rows/s, _age seconds since the newest row.
+
+Thresholds are looked up by sensor name, then "*":
+    "health": {
+      "source": "auto",
+      "interval": 1.0,
+      "rate_window": 10,
+      "flush_interval": 5,
+      "stale_after": {"*": 6, "pom": 15, "partector2pro": 8},
+      "min_rate": {"*": 0}
+    }
+"""
+
 import os
-import glob
+import json
+import time
+import logging
+import argparse
+from collections import deque
 from datetime import datetime
+from pathlib import Path
+
+from file_tail import FileTailer
+from latest_board import BoardFollower, board_enabled
+from sensor_writers import CSVRowWriter
+
+DEFAULT_STALE_AFTER = 6.0
+
+logger = logging.getLogger('vx')
+
+def lookup(table, sensor_name, default):
+    """Per-sensor threshold from a {"name": x, "*": y} table (or a plain number)"""
+    if isinstance(table, dict):
+        return table.get(sensor_name, table.get('*', default))
+    return default if table is None else table
+
+class HealthBoard:
+    """Per-sensor V/X, rows/s and staleness from the latest-value board"""
+
+    def __init__(self, config):
+        self.config = config
+        health = config.get('health', {})
+        self.interval = float(health.get('interval', 1.0))
+        self.rate_window = float(health.get('rate_window', 10))
+
+        sensors = config.get('sensors', {})
+        self.sensors = list(sensors)
+        self.enabled = {name: cfg.get('enabled', True) for name, cfg in sensors.items()}
+        self.stale_after = {name: float(lookup(health.get('stale_after'), name, DEFAULT_STALE_AFTER))
+                            for name in self.sensors}
+        self.min_rate = {name: float(lookup(health.get('min_rate'), name, 0)) for name in self.sensors}
+
+        # (monotonic s, slot count) samples per sensor, for the windowed rate
+        self.history = {name: deque() for name in self.sensors}
 
-def check_sensor(sensor_name, timeout=5):
-    """Check if sensor is alive based on file modification time."""
-    pattern = f'output/{sensor_name}/{sensor_name}_data_*.csv'
-    files = glob.glob(pattern)
-    
-    if not files:
-        return 'X'
-    
-    latest_file = max(files, key=os.path.getmtime)
-    file_age = time.time() - os.path.getmtime(latest_file)
-    
-    return 'V' if file_age < timeout else 'X'
+        source = health.get('source', 'auto')
+        if source == 'auto':
+            source = 'board' if board_enabled(config) else 'files'
+        self.source = source
+
+        # Attaches once runall.py creates the board, reattaches when a restart recreates it
+        self.follower = BoardFollower(config, logger=logger) if source == 'board' else None
+        self.generation = None
+        self.slots = {}
+
+        # Files: rows read so far and the active file's mtime per sensor
+        self.tailer = None
+        self.row_counts = {}
+        self.mtimes = {}
+        if source == 'files':
+            self.tailer = FileTailer(logger=logger)
+            for name in self.sensors:
+                if self.enabled[name]:
+                    self.tailer.add(name, sensor_file_pattern(name, sensors[name]))
+                    self.row_counts[name] = 0
+
+    def attach(self, now):
+        """The current board (None until it exists); a new one resets slots and rate history"""
+        board = self.follower.get(now)
+        if board is not None and self.follower.generation != self.generation:
+            self.generation = self.follower.generation
+            self.slots = {name: board.slot_index(name) for name in self.sensors}
+            for history in self.history.values():
+                history.clear()
+        return board
+
+    def rate(self, name, now, count):
+        """Rows/s over the last rate_window seconds"""
+        history = self.history[name]
+        history.append((now, count))
+        while len(history) > 1 and history[1][0] <= now - self.rate_window:
+            history.popleft()
+        t0, c0 = history[0]
+        return (count - c0) / (now - t0) if now > t0 else 0.0
+
+    def board_samples(self, now, now_ns):
+        """{sensor: (row count, age s)} for every slot that has been written"""
+        board = self.attach(now)
+        samples = {}
+        if board is None:
+            return samples
+        for name, slot in self.slots.items():
+            snapshot = board.read(slot)
+            if snapshot is not None:
+                samples[name] = (snapshot['count'], (now_ns - snapshot['mono_ns']) / 1e9)
+        return samples
+
+    def file_samples(self):
+        """{sensor: (rows read, age s)} for every sensor with a CSV, from its newest file"""
+        for name, rows in self.tailer.read_new_rows().items():
+            self.row_counts[name] += len(rows)
+            try:
+                self.mtimes[name] = os.path.getmtime(self.tailer.current_file(name))
+            except (OSError, TypeError):
+                pass
+        wall = time.time()
+        return {name: (self.row_counts[name], max(0.0, wall - mtime)) for name, mtime in self.mtimes.items()}
+
+    def check(self):
+        """[(sensor, 'V'/'X'/'-', rows/s, age s or None)] for every sensor in config"""
+        now_ns = time.monotonic_ns()
+        now = now_ns / 1e9
+        samples = self.file_samples() if self.tailer else self.board_samples(now, now_ns)
+
+        results = []
+        for name in self.sensors:
+            if not self.enabled[name]:
+                results.append((name, '-', None, None))
+                continue
+            sample = samples.get(name)
+            if sample is None:
+                results.append((name, 'X', 0.0, None))
+                continue
+            count, age = sample
+            rate = self.rate(name, now, count)
+            live = age < self.stale_after[name] and rate >= self.min_rate[name]
+            results.append((name, 'V' if live else 'X', rate, age))
+        return results
+
+    def close(self):
+        if self.follower:
+            self.follower.close()
+        if self.tailer:
+            self.tailer.close()
+
+def sensor_file_pattern(sensor_name, sensor_config):
+    """Glob for a sensor's CSVs (same patterns as vitals.py and the merger)"""
+    if sensor_name == 'spectro':
+        return sensor_config.get('output_file_pattern', 'output/spectro/spectro_data_*.csv')
+    return f'output/{sensor_name}/{sensor_name}_data_*.csv'
+
+def status_columns(sensors):
+    columns = ['timestamp']
+    for name in sensors:
+        columns += [name, f'{name}_rate', f'{name}_age']
+    return columns
+
+def status_row(results):
+    row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
+    for _, state, rate, age in results:
+        row += [state,
+                '' if rate is None else f"{rate:.2f}",
+                '' if age is None else f"{age:.1f}"]
+    return row
 
 def main():
-    # Sensor list and timeouts (POM gets 15s, others 6s)
-    sensors = {
-        'imet': 6,
-        'pom': 15,
-        'trisonica': 6,
-        'spectro': 6,
-        'partector2pro': 8
-    }
-    
+    parser = argparse.ArgumentParser(description='Sensor health board (V/X) from the latest-value board')
+    parser.add_argument('--config', default='sensor_config.json', help='Path to sensor configuration file')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - vx - %(levelname)s - %(message)s')
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    health = HealthBoard(config)
+    if health.source == 'files':
+        logger.info("Latest-value board not in use, following the sensor CSV files")
+
     # Create output file
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     output_file = f'output/minimal_status_{timestamp}.csv'
-    
-    os.makedirs('output', exist_ok=True)
-    
-    # Write header
-    with open(output_file, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['timestamp'] + list(sensors.keys()))
-    
-    # Main loop
+    Path('output').mkdir(exist_ok=True)
+    writer = CSVRowWriter(output_file, status_columns(health.sensors), flush_rows=1 << 30,
+                          flush_interval=config.get('health', {}).get('flush_interval', 5))
+
+    # Main loop - fixed cadence, the check itself takes microseconds
+    next_check = time.monotonic()
     try:
         while True:
-            # Get current timestamp
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Check each sensor
-            status_row = [current_time]
-            for sensor, timeout in sensors.items():
-                status = check_sensor(sensor, timeout)
-                status_row.append(status)
-            
-            # Write to file
-            with open(output_file, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(status_row)
-            
-            # Wait 1 second
-            time.sleep(1)
-            
+            writer.writerow(status_row(health.check()))
+            next_check += health.interval
+            time.sleep(max(0.0, next_check - time.monotonic()))
+
     except KeyboardInterrupt:
-        print("\nStopped.")
+        logger.info("Stopped.")
+    finally:
+        writer.close()
+        health.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()